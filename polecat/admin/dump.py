@@ -1,28 +1,114 @@
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psycopg2
 import ujson as json
 
+from ..db.connection import cursor, manager, transaction
 from ..db.query import Q
 
 from .command import Command
 
+MANIFEST = 'manifest.json'
+
+# Bumped whenever the layout of a dump changes.
+FORMAT_VERSION = 1
+
 
 class Dump(Command):
+    """ Dump each table to a compressed file of newline delimited JSON
+    rows, alongside a manifest. Tables are dumped in parallel, all from
+    the same snapshot of the database.
+    """
+
     def get_params(self):
         return (
+            self.Argument(('output',)),
             self.Option(('--ignore-model',), multiple=True),
+            self.Option(('--jobs', '-j'), type=int, default=os.cpu_count())
         )
 
-    def run(self, ignore_model=None):
+    def run(self, output, ignore_model=None, jobs=None):
         from ..project.project import get_active_project
         ignore_models = ignore_model or []
         project = get_active_project()
-        schema = project.schema
-        tables = {}
-        for table in schema.tables:
-            if table.name in ignore_models:
-                continue
-            all_rows = list(
-                Q(table)
-                .select()
-            )
-            tables[table.name] = all_rows
-        print(json.dumps(tables, indent=2))
+        tables = [
+            table
+            for table in project.schema.tables
+            if table.name not in ignore_models
+        ]
+        os.makedirs(output, exist_ok=True)
+        # A separate connection holds the snapshot open until every
+        # table has been dumped.
+        snapshot_conn = psycopg2.connect(manager.get_url())
+        try:
+            snapshot_conn.set_session(isolation_level='REPEATABLE READ')
+            with snapshot_conn.cursor() as curs:
+                curs.execute('SELECT pg_export_snapshot()')
+                snapshot = curs.fetchone()[0]
+            counts = self.dump_tables(tables, output, snapshot, jobs or 1)
+        finally:
+            snapshot_conn.close()
+        with open(os.path.join(output, MANIFEST), 'w') as f:
+            json.dump({
+                'version': FORMAT_VERSION,
+                'tables': [
+                    {
+                        'name': table.name,
+                        'file': get_table_file(table.name),
+                        'rows': counts[table.name]
+                    }
+                    for table in tables
+                ]
+            }, f, indent=2)
+
+    def dump_tables(self, tables, output, snapshot, jobs):
+        counts = {}
+        if jobs == 1 or len(tables) < 2:
+            for table in tables:
+                counts[table.name] = dump_table(table.name, output, snapshot)
+                self.report(table.name, counts, tables)
+            return counts
+        # Forked workers must not inherit pooled connections.
+        manager.close_all_connections()
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tables))) as executor:
+            futures = {
+                executor.submit(dump_table, table.name, output, snapshot): table.name
+                for table in tables
+            }
+            for future in as_completed(futures):
+                counts[futures[future]] = future.result()
+                self.report(futures[future], counts, tables)
+        return counts
+
+    def report(self, name, counts, tables):
+        print(
+            f'Dumped {counts[name]} row(s) for table {name}'
+            f' ({len(counts)}/{len(tables)})'
+        )
+
+
+def get_table_file(name):
+    return f'{name}.ndjson.gz'
+
+
+def dump_table(name, output, snapshot):
+    from ..project.project import get_active_project
+    table = get_active_project().schema.get_table_by_name(name)
+    query = Q(table).select()
+    if table.has_column('id'):
+        # Parents of self-referencing rows tend to come first.
+        query = query.order(('id',))
+    count = 0
+    path = os.path.join(output, get_table_file(name))
+    with cursor() as curs:
+        with transaction(curs):
+            curs.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+            curs.execute('SET TRANSACTION SNAPSHOT %s', (snapshot,))
+            with gzip.open(path, 'wt', compresslevel=6) as f:
+                for row in query.stream():
+                    f.write(json.dumps(row))
+                    f.write('\n')
+                    count += 1
+    return count
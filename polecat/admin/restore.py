@@ -1,35 +1,137 @@
+import gzip
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import ujson as json
 
-from ..db.decorators import dbcursor
+from ..core.config import default_config
+from ..db.connection import cursor, manager, transaction
 from ..db.query import Q
 
 from .command import Command
+from .dump import MANIFEST
 
 
 class Restore(Command):
+    """ Restore a dump made by the dump command. Tables are loaded in
+    parallel, each only once the tables it refers to are loaded.
+    """
+
     def get_params(self):
         return (
             self.Argument(('dump-file',)),
+            self.Option(('--jobs', '-j'), type=int, default=os.cpu_count())
         )
 
-    @dbcursor
-    def run(self, dump_file, cursor=None):
+    def run(self, dump_file, jobs=None):
         from ..project.project import get_active_project
-        project = get_active_project()
-        schema = project.schema
+        schema = get_active_project().schema
+        if not os.path.isdir(dump_file):
+            self.restore_document(schema, dump_file)
+            return
+        with open(os.path.join(dump_file, MANIFEST)) as f:
+            manifest = json.load(f)
+        files = {
+            entry['name']: os.path.join(dump_file, entry['file'])
+            for entry in manifest['tables']
+        }
+        self.total = sum(entry['rows'] for entry in manifest['tables'])
+        self.restored = 0
+        tables = [t for t in schema.tables if t.name in files]
+        self.restore_tables(tables, files, jobs or 1)
+
+    def restore_document(self, schema, dump_file):
+        # Dumps from before the manifest were a single JSON document.
         with open(dump_file, 'r') as f:
-            tables = json.loads(f.read())
+            tables = json.load(f)
+        self.total = sum(len(rows) for rows in tables.values())
+        self.restored = 0
         for table in schema.tables:
-            all_rows = tables.get(table.name)
-            if all_rows:
-                for row in all_rows:
-                    (
-                        Q(table)
-                        .insert(**row)
-                        .execute()
-                    )
-                    cursor.execute(
-                        f"SELECT setval('{table.name}_id_seq',"
-                        f"(SELECT MAX(id) FROM {table.name}))"
-                    )
-                print(f'Restored {len(all_rows)} row(s) for table {table.name}')
+            rows = tables.get(table.name)
+            if rows:
+                self.report(table.name, restore_rows(table, rows))
+
+    def restore_tables(self, tables, files, jobs):
+        pending = get_dependencies(tables)
+        if jobs == 1:
+            while pending:
+                name = get_ready(pending, ())[0]
+                del pending[name]
+                self.report(name, restore_table(name, files[name]))
+                mark_restored(pending, name)
+            return
+        # Forked workers must not inherit pooled connections.
+        manager.close_all_connections()
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            running = {}
+            while pending or running:
+                for name in get_ready(pending, set(running.values())):
+                    del pending[name]
+                    future = executor.submit(restore_table, name, files[name])
+                    running[future] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self.report(name, future.result())
+                    mark_restored(pending, name)
+
+    def report(self, name, count):
+        self.restored += count
+        print(
+            f'Restored {count} row(s) for table {name}'
+            f' ({self.restored}/{self.total} rows)'
+        )
+
+
+def get_dependencies(tables):
+    """ Map each table name to the names of the other tables it refers
+    to, in schema order.
+    """
+    names = {table.name for table in tables}
+    return {
+        table.name: {
+            dependency.name
+            for column in table.columns
+            for dependency in column.dependencies
+            if dependency.name in names and dependency.name != table.name
+        }
+        for table in tables
+    }
+
+
+def get_ready(pending, running):
+    ready = [name for name, dependencies in pending.items() if not dependencies]
+    if not ready and not running:
+        # Tables referring to each other can't all go first, so take
+        # them in schema order.
+        ready = list(pending.keys())[:1]
+    return ready
+
+
+def mark_restored(pending, name):
+    for dependencies in pending.values():
+        dependencies.discard(name)
+
+
+def restore_table(name, path):
+    from ..project.project import get_active_project
+    table = get_active_project().schema.get_table_by_name(name)
+    with gzip.open(path, 'rt') as f:
+        return restore_rows(table, (json.loads(line) for line in f))
+
+
+def restore_rows(table, rows):
+    # Each table is restored all or nothing.
+    with cursor() as curs:
+        with transaction(curs):
+            query = Q(table).bulk_insert(
+                rows,
+                batch_size=default_config.db_bulk_batch_size
+            )
+            query.execute(cursor=curs)
+            if len(query) and table.has_column('id'):
+                curs.execute(
+                    f"SELECT setval('{table.name}_id_seq',"
+                    f"(SELECT MAX(id) FROM {table.name}))"
+                )
+    return len(query)
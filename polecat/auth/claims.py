@@ -0,0 +1,113 @@
+import hashlib
+import hmac
+import threading
+import time
+
+from polecat.core.config import default_config
+
+from ..utils.lru import LRU
+
+
+class Claims:
+    """ The verified claims of a token, along with the session
+    variables set from them.
+    """
+    def __init__(self, claims, role=None):
+        self.claims = claims
+        self.variables = {
+            f'claims.{key}': value
+            for key, value in claims.items()
+        }
+        self.role = role
+        self.expires = claims.get('exp')
+
+    def has_expired(self, now=None):
+        return (
+            self.expires is not None and
+            (now or time.time()) >= self.expires
+        )
+
+
+class ClaimsCache:
+    """ A least-recently-used cache of verified tokens, so a token
+    reused across requests is only verified once. Entries are dropped
+    when their token expires or is revoked.
+
+    Tokens revoked with `revoke` are remembered until they expire.
+    `is_revoked`, if given, is called with the claims of a token each
+    time it's used, to reject tokens revoked elsewhere.
+    """
+    def __init__(self, max_size=None, is_revoked=None):
+        self._max_size = max_size
+        self.is_revoked = is_revoked
+        self.entries = LRU(lambda: self.max_size)
+        # The expiry of each revoked token, by key.
+        self.revoked = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return default_config.jwt_claims_cache_size
+
+    def get(self, token):
+        key = get_token_key(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.has_expired():
+            self.entries.pop(key)
+            return None
+        if self.is_revoked and self.is_revoked(entry.claims):
+            self.entries.pop(key)
+            return None
+        return entry
+
+    def set(self, token, entry):
+        self.entries.set(get_token_key(token), entry)
+
+    def revoke(self, token, expires=None):
+        """ Reject `token` until `expires`, or for good if it never
+        expires.
+        """
+        key = get_token_key(token)
+        self.entries.pop(key)
+        now = time.time()
+        with self.lock:
+            self.revoked = {
+                k: e for k, e in self.revoked.items()
+                if e is None or e > now
+            }
+            self.revoked[key] = expires
+
+    def has_revoked(self, token, now=None):
+        if not self.revoked:
+            return False
+        key = get_token_key(token)
+        with self.lock:
+            if key not in self.revoked:
+                return False
+            expires = self.revoked[key]
+            if expires is not None and (now or time.time()) >= expires:
+                # Expired tokens are rejected anyway.
+                del self.revoked[key]
+                return False
+            return True
+
+    def clear(self):
+        """ Drop every cached token. Revoked tokens stay revoked.
+        """
+        self.entries.clear()
+
+
+def get_token_key(token):
+    # Keyed on the secret too, so changing it empties the cache.
+    if isinstance(token, str):
+        token = token.encode()
+    return hmac.new(
+        default_config.jwt_secret.encode(), token, hashlib.sha256
+    ).digest()
@@ -1,46 +1,86 @@
 import re
 
-from jwt import decode
+from jwt import InvalidTokenError, decode
 from polecat.core.config import default_config
 from polecat.model import default_blueprint
 
+from .claims import Claims, ClaimsCache
+
 __all__ = ('JWTMiddleware', 'RoleMiddleware')
 
 
 class JWTMiddleware:
     bearer_prog = re.compile(r'bearer\s+(\S+)', re.I)
 
+    def __init__(self, claims_cache=None):
+        if claims_cache is None:
+            claims_cache = ClaimsCache()
+        self.claims_cache = claims_cache
+
     def run(self, event):
-        claims = None
+        entry = None
         jwt = event.get_authorization_header()
         if jwt:
             match = self.bearer_prog.match(jwt)
             if match:
-                jwt = match.group(1)
-                claims = decode(
-                    jwt,
-                    default_config.jwt_secret,
-                    algorithms=('HS256',)
-                )
-        event.claims = claims
-        for key, value in (claims or {}).items():
-            event.session.variables[f'claims.{key}'] = value
+                entry = self.get_claims(match.group(1))
+        event.claims = dict(entry.claims) if entry else None
+        if entry:
+            event.session.variables.update(entry.variables)
+        return entry
+
+    def get_claims(self, jwt):
+        if self.claims_cache.has_revoked(jwt):
+            raise InvalidTokenError('Token has been revoked')
+        entry = self.claims_cache.get(jwt)
+        if entry is None:
+            claims = decode(
+                jwt,
+                default_config.jwt_secret,
+                algorithms=('HS256',)
+            )
+            is_revoked = self.claims_cache.is_revoked
+            if is_revoked and is_revoked(claims):
+                raise InvalidTokenError('Token has been revoked')
+            entry = Claims(claims, self.get_role(claims))
+            self.claims_cache.set(jwt, entry)
+        return entry
+
+    def get_role(self, claims):
+        return None
+
+    def revoke(self, jwt):
+        """ Reject `jwt` from now on, until it expires.
+        """
+        try:
+            claims = decode(
+                jwt,
+                default_config.jwt_secret,
+                algorithms=('HS256',)
+            )
+        except InvalidTokenError:
+            # It's rejected anyway.
+            return
+        self.claims_cache.revoke(jwt, claims.get('exp'))
 
 
 class RoleMiddleware(JWTMiddleware):
-    def __init__(self, default_role=None):
-        super().__init__()
+    def __init__(self, default_role=None, claims_cache=None):
+        super().__init__(claims_cache)
         self.default_role = default_role
 
     def run(self, event):
-        super().run(event)
+        entry = super().run(event)
         role = self.default_role
-        claims = event.claims
-        if claims and 'role' in claims:
-            role = default_blueprint.roles[claims['role']]
+        if entry and entry.role:
+            role = entry.role
         if role is None:
             # TODO: Better exception.
             raise Exception('No role specified')
         # TODO: Need both of these? Probs not.
         event.role = role
         event.session.role = role.Meta.dbrole if role else None
+
+    def get_role(self, claims):
+        if 'role' in claims:
+            return default_blueprint.roles[claims['role']]
@@ -7,7 +7,70 @@ class RootConfig(Config):
     debug = (bool, False)
     log_sql = (bool, False)
     jwt_secret = str
+    # Number of verified JWTs to keep the claims of. Zero disables
+    # caching, verifying the token on every request.
+    jwt_claims_cache_size = (int, 1024)
     database_url = str
+    # Connection pooling, per database URL. Times are in seconds,
+    # and a zero max age or idle time disables that limit.
+    db_pool_min_size = (int, 1)
+    db_pool_max_size = (int, 10)
+    db_pool_timeout = (int, 30)
+    db_pool_max_age = (int, 0)
+    db_pool_max_idle = (int, 300)
+    db_pool_ping_after = (int, 5)
+    # Comma separated URLs of read replicas. Queries that only read
+    # are spread across them, by "round_robin" or by
+    # "least_connections".
+    db_replica_urls = (str, None)
+    db_replica_policy = (str, 'round_robin')
+    # Resolve API queries through the asyncio database path.
+    db_async = (bool, False)
+    # Run each API request on one connection, in one transaction,
+    # setting up its session once.
+    db_unit_of_work = (bool, False)
+    # Otherwise, run GraphQL requests in a pool of this many threads
+    # so the event loop keeps serving while they block. Zero runs
+    # them on the event loop.
+    graphql_threads = (int, 0)
+    # Number of parsed and validated GraphQL documents to keep, which
+    # also bounds the automatic persisted queries registered.
+    graphql_document_cache_size = (int, 256)
+    # A JSON file of persisted queries, either a list of queries or a
+    # map from their SHA-256 hashes, and whether to run only those.
+    graphql_persisted_queries = (str, None)
+    graphql_persisted_only = (bool, False)
+    # Fetch the model queries among the root fields of an operation
+    # with a single statement.
+    graphql_merge_root_fields = (bool, False)
+    # Pass the JSON built by Postgres straight through to the response
+    # for query operations with nothing resolved in Python.
+    graphql_raw_json = (bool, False)
+    # Number of API responses to cache, per request and session, until
+    # a table they were read from is written to. Zero disables the
+    # cache. Responses are also dropped after the time to live, in
+    # seconds, unless it's zero.
+    response_cache_size = (int, 0)
+    response_cache_ttl = (int, 60)
+    # A channel to notify other processes of the tables written to
+    # on, and listen for their writes on, keeping caches in step.
+    db_notify_channel = (str, None)
+    # Rewrite the SQL built for queries into simpler SQL, flattening
+    # nested subqueries.
+    db_optimize_sql = (bool, True)
+    # Number of compiled query shapes to keep. Zero disables caching.
+    db_sql_cache_size = (int, 512)
+    # Prepare a cached query on each connection once it's been run
+    # this many times. Zero disables prepared statements.
+    db_prepare_threshold = (int, 0)
+    # Rows fetched per round trip when streaming results, and whether
+    # API list queries that may return more are streamed.
+    db_stream_batch_size = (int, 1000)
+    db_stream_api_results = (bool, False)
+    # Rows sent per statement by batched bulk inserts, and the batch
+    # size from which COPY is used instead. Zero disables COPY.
+    db_bulk_batch_size = (int, 10000)
+    db_bulk_copy_threshold = (int, 1000)
 
 
 def mount_config(config, path):
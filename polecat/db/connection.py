@@ -1,8 +1,20 @@
+import asyncio
 import os
-from contextlib import contextmanager
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from itertools import count
 from urllib.parse import urlparse
 
-import psycopg2
+from polecat.core.config import default_config
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .pool import AsyncConnectionPool, AsyncCursor, ConnectionPool
+
+
+class WriteScope:
+    def __init__(self):
+        self.written = False
 
 
 class ConnectionManager:
@@ -14,10 +26,24 @@ class ConnectionManager:
             for x in [os.environ.get('DATABASE_URL')]
             if x is not None
         ]
-        self.connections = {}
-        # TODO: I don't think I need current cursor... it creates
-        # strange behavior.
-        self.current_cursor = {}
+        self.pools = {}
+        self.async_pools = {}
+        self.lock = threading.Lock()
+        # Connections checked out by the current thread, keyed by
+        # URL. Nested checkouts on the same thread share the
+        # connection, so helpers decorated with `dbcursor` see the same
+        # session as their caller.
+        self.local = threading.local()
+        # The asyncio equivalent, scoped to the current task. This is
+        # only ever replaced, never mutated, so tasks spawned from
+        # within a checkout don't share its connection.
+        self.async_checkouts = ContextVar('async_checkouts', default={})
+        self.cursor_counter = count()
+        self.listeners = {}
+        self.replica_counter = count()
+        # Set once the current request writes, so that its reads go
+        # to the primary from then on.
+        self.writes = ContextVar('writes', default=None)
 
     def get_url(self, url=None):
         try:
@@ -26,65 +52,251 @@ class ConnectionManager:
             # TODO: Better exception.
             raise Exception('No database url specified')
 
-    # TODO: autocommit really doesn't make sense here for the
-    # manager. It needs to be in the __init__ method, as the
-    # connection gets retained across calls.
+    def get_pool(self, url=None):
+        url = self.get_url(url)
+        with self.lock:
+            pool = self.pools.get(url)
+            # Pools opened before a fork can't be shared with the
+            # child, so just forget about them.
+            if pool is None or pool.closed or pool.pid != os.getpid():
+                pool = self.create_pool(url)
+                pool.fill()
+                self.pools[url] = pool
+        return pool
+
+    def get_async_pool(self, url=None):
+        url = self.get_url(url)
+        loop = asyncio.get_event_loop()
+        pool = self.async_pools.get(url)
+        if pool is None or pool.closed or pool.loop is not loop:
+            if pool is not None:
+                pool.close()
+            pool = self.create_pool(url, pool_class=AsyncConnectionPool)
+            self.async_pools[url] = pool
+        return pool
+
+    def get_replica_urls(self):
+        urls = default_config.db_replica_urls
+        if not urls:
+            return ()
+        return tuple(u.strip() for u in urls.split(',') if u.strip())
+
+    def get_read_url(self, is_async=False):
+        """ The URL to run a query that only reads on. This is one of
+        the replicas, unless there are none, or the caller needs to see
+        writes to the primary, in which case it's None.
+        """
+        replicas = self.get_replica_urls()
+        if not replicas or self.has_written():
+            return None
+        primary = self.get_url()
+        if is_async:
+            conn = self.async_checkouts.get().get(primary)
+        else:
+            checkout = self.get_checkouts().get(primary)
+            conn = checkout[0] if checkout else None
+        if conn is not None and (
+            getattr(conn, 'unit', None) is not None or
+            conn.get_transaction_status() != TRANSACTION_STATUS_IDLE
+        ):
+            # Reads within a transaction belong to it.
+            return None
+        return self.choose_replica(replicas, is_async)
+
+    def choose_replica(self, replicas, is_async=False):
+        if default_config.db_replica_policy == 'least_connections':
+            pools = self.async_pools if is_async else self.pools
+            return min(
+                replicas,
+                key=lambda u: len(pools[u].in_use) if u in pools else 0
+            )
+        return replicas[next(self.replica_counter) % len(replicas)]
+
+    @contextmanager
+    def read_your_writes(self):
+        """ Scope reading from the primary after a write to within,
+        such as a single request.
+        """
+        token = self.writes.set(WriteScope())
+        try:
+            yield
+        finally:
+            self.writes.reset(token)
+
+    def mark_written(self):
+        scope = self.writes.get()
+        if scope is not None:
+            scope.written = True
+
+    def has_written(self):
+        scope = self.writes.get()
+        return scope is not None and scope.written
+
+    def create_pool(self, url, pool_class=ConnectionPool):
+        return pool_class(
+            url,
+            min_size=default_config.db_pool_min_size,
+            max_size=default_config.db_pool_max_size,
+            timeout=default_config.db_pool_timeout,
+            max_age=default_config.db_pool_max_age or None,
+            max_idle=default_config.db_pool_max_idle or None,
+            ping_after=default_config.db_pool_ping_after
+        )
+
+    def get_checkouts(self):
+        local = self.local
+        # Connections checked out before a fork belong to the parent.
+        if getattr(local, 'pid', None) != os.getpid():
+            local.checkouts = {}
+            local.pid = os.getpid()
+        return local.checkouts
+
     @contextmanager
     def connection(self, url=None, autocommit=True):
         url = self.get_url(url)
-        conn = self.connections.get(url)
-        if not conn:
-            conn = self.open_connection(url, autocommit=autocommit)
+        checkouts = self.get_checkouts()
+        checkout = checkouts.get(url)
+        if checkout:
+            # Already have a connection on this thread; transaction
+            # control belongs to the outermost checkout.
+            checkout[1] += 1
+            try:
+                yield checkout[0]
+            finally:
+                checkout[1] -= 1
+            return
+        pool = self.get_pool(url)
+        conn = pool.getconn()
+        checkouts[url] = [conn, 1]
         try:
+            if not autocommit:
+                conn.autocommit = False
             yield conn
             if not autocommit:
                 conn.commit()
         except Exception:
             # TODO: Do I really need this?
-            conn.rollback()
+            if not conn.closed:
+                conn.rollback()
             raise
+        finally:
+            del checkouts[url]
+            pool.putconn(conn)
 
     @contextmanager
     def cursor(self, url=None, cursor=None, autocommit=True):
-        # TODO: This conditional is ugly.
         if cursor:
             yield cursor
-        url = self.get_url(url)
-        # curs = self.current_cursor.get(url)
-        # if curs:
-        #     yield curs
-        # else:
+            return
         with self.connection(url, autocommit=autocommit) as conn:
             curs = conn.cursor()
-            # self.current_cursor[url] = curs
             try:
                 yield curs
             finally:
                 curs.close()
-                # del self.current_cursor[url]
 
-    def open_connection(self, url, autocommit=True):
+    @contextmanager
+    def named_cursor(self, url=None, itersize=None):
+        """ Check out a server-side cursor, fetching `itersize` rows
+        at a time. Server-side cursors only exist within a
+        transaction, so one is begun if need be.
+        """
+        with self.connection(url) as conn:
+            begin = (
+                conn.autocommit and
+                conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+            )
+            if begin:
+                conn.autocommit = False
+            try:
+                curs = conn.cursor(
+                    name=f'polecat_cursor_{next(self.cursor_counter)}',
+                    withhold=conn.autocommit
+                )
+                if itersize:
+                    curs.itersize = itersize
+                try:
+                    yield curs
+                finally:
+                    curs.close()
+                if begin:
+                    conn.commit()
+            except BaseException:
+                if begin and not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if begin and not conn.closed:
+                    conn.autocommit = True
+
+    @asynccontextmanager
+    async def async_connection(self, url=None):
+        url = self.get_url(url)
+        checkouts = self.async_checkouts.get()
+        conn = checkouts.get(url)
+        if conn is not None:
+            yield conn
+            return
+        pool = self.get_async_pool(url)
+        conn = await pool.getconn()
+        token = self.async_checkouts.set({**checkouts, url: conn})
+        try:
+            yield conn
+        finally:
+            self.async_checkouts.reset(token)
+            await pool.putconn(conn)
+
+    @asynccontextmanager
+    async def async_cursor(self, url=None, cursor=None):
+        if cursor:
+            yield cursor
+            return
+        async with self.async_connection(url) as conn:
+            curs = AsyncCursor(conn.cursor())
+            try:
+                yield curs
+            finally:
+                curs.close()
+
+    def listen(self, channel, callback, url=None):
+        """ Call `callback` with the payload of each notification on
+        `channel`, from a background thread with its own connection.
+        Listening again on the same channel has no effect.
+        """
+        from .notify import Listener
         url = self.get_url(url)
-        conn = psycopg2.connect(url)
-        if autocommit:
-            conn.autocommit = True
-        self.connections[url] = conn
-        return conn
+        listener = self.listeners.get((url, channel))
+        if listener is not None and listener.is_alive():
+            return listener
+        with self.lock:
+            listener = self.listeners.get((url, channel))
+            if listener is None or not listener.is_alive():
+                listener = Listener(url, channel, callback).start()
+                self.listeners[(url, channel)] = listener
+        return listener
 
     def close_all_connections(self):
-        all_urls = list(self.connections.keys())
+        all_urls = (
+            set(self.pools.keys()) | set(self.async_pools.keys()) |
+            {url for url, _ in self.listeners}
+        )
         for url in all_urls:
             self.close_connection(url)
 
     def close_connection(self, url):
-        try:
-            self.connections[url].close()
-        except KeyError:
-            pass
-        try:
-            del self.connections[url]
-        except KeyError:
-            pass
+        with self.lock:
+            pool = self.pools.pop(url, None)
+            async_pool = self.async_pools.pop(url, None)
+            listeners = [
+                self.listeners.pop(key)
+                for key in list(self.listeners)
+                if key[0] == url
+            ]
+        for p in (pool, async_pool):
+            if p is not None:
+                p.close()
+        for listener in listeners:
+            listener.stop()
 
     @contextmanager
     def push_url(self, url):
@@ -114,6 +326,9 @@ class ConnectionManager:
 manager = ConnectionManager()
 connection = manager.connection
 cursor = manager.cursor
+named_cursor = manager.named_cursor
+async_connection = manager.async_connection
+async_cursor = manager.async_cursor
 
 
 @contextmanager
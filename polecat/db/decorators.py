@@ -15,3 +15,15 @@ def dbcursor(func, autocommit=True):
             # TODO: Make sure autocommit matches?
             return func(*args, cursor=cursor, **kwargs)
     return inner
+
+
+@decorator_with_args
+def async_dbcursor(func):
+    @wraps(func)
+    async def inner(*args, cursor=None, **kwargs):
+        if cursor is None:
+            async with connection.async_cursor() as curs:
+                return await func(*args, cursor=curs, **kwargs)
+        else:
+            return await func(*args, cursor=cursor, **kwargs)
+    return inner
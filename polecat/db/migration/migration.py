@@ -7,6 +7,7 @@ from polecat.db.schema import Schema
 from ...utils import indent
 from ..connection import transaction
 from ..decorators import dbcursor
+from ..sql import prepare
 from .utils import project_migrations_path
 
 migration_template = '''from polecat.db.migration import migration, operation
@@ -84,6 +85,8 @@ class Migration:
                         '  VALUES(%s, %s, now());'
                     )
                     cursor.execute(sql, (self.app.name if self.app else None, self.name))
+            if not is_applied and not schema_only:
+                prepare.invalidate()
 
     @dbcursor
     def forward_post_ops(self, cursor=None):
@@ -0,0 +1,163 @@
+import logging
+import os
+import select
+import threading
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+import psycopg2
+import ujson as json
+from psycopg2.sql import SQL, Identifier
+
+from polecat.core.config import default_config
+
+from . import tracking
+from .pool import AsyncCursor
+
+logger = logging.getLogger(__name__)
+
+# Tells this process's own notifications apart from those of others,
+# even those forked from it.
+NODE = uuid.uuid4().hex
+
+NOTIFY_SQL = 'SELECT pg_notify(%s, %s)'
+
+
+class Listener:
+    """ Listen for notifications on `channel` over a dedicated
+    connection, calling `callback` with the payload of each from a
+    background thread. Lost connections are reopened, calling
+    `callback` with None, as notifications may have been missed.
+    """
+    def __init__(self, url, channel, callback, timeout=5, retry_delay=1):
+        self.url = url
+        self.channel = channel
+        self.callback = callback
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.pid = os.getpid()
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.wakeup = os.pipe()
+        self.thread = threading.Thread(
+            target=self.run,
+            name=f'polecat-listener-{channel}',
+            daemon=True
+        )
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        if self.is_alive():
+            # Wake the thread from waiting on the connection.
+            os.write(self.wakeup[1], b'\0')
+            self.thread.join(timeout)
+
+    def is_alive(self):
+        # Threads don't survive a fork.
+        return self.pid == os.getpid() and self.thread.is_alive()
+
+    def run(self):
+        connected = False
+        while not self.stopped.is_set():
+            try:
+                connection = psycopg2.connect(self.url)
+            except psycopg2.Error:
+                logger.warning('Listener: failed to connect', exc_info=True)
+                self.stopped.wait(self.retry_delay)
+                continue
+            try:
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        SQL('LISTEN {}').format(Identifier(self.channel))
+                    )
+                if connected:
+                    self.dispatch(None)
+                connected = True
+                self.ready.set()
+                self.listen(connection)
+            except psycopg2.Error:
+                logger.warning('Listener: connection lost', exc_info=True)
+                self.stopped.wait(self.retry_delay)
+            finally:
+                connection.close()
+        for fd in self.wakeup:
+            os.close(fd)
+
+    def listen(self, connection):
+        while not self.stopped.is_set():
+            readable = select.select(
+                [connection, self.wakeup[0]], [], [], self.timeout
+            )[0]
+            if connection not in readable:
+                continue
+            connection.poll()
+            while connection.notifies:
+                self.dispatch(connection.notifies.pop(0).payload)
+
+    def dispatch(self, payload):
+        try:
+            self.callback(payload)
+        except Exception:
+            logger.exception('Listener: callback failed')
+
+
+def get_origin():
+    return f'{NODE}.{os.getpid()}'
+
+
+def get_payload(tables):
+    return json.dumps({'origin': get_origin(), 'tables': sorted(tables)})
+
+
+def handle_notification(payload):
+    """ Invalidate the tables written by another process. A None
+    payload invalidates everything.
+    """
+    if payload is None:
+        tracking.invalidate(None)
+        return
+    data = json.loads(payload)
+    if data.get('origin') != get_origin():
+        tracking.invalidate(data['tables'])
+
+
+@contextmanager
+def publishing(cursor):
+    """ Notify other processes of the tables written by the queries
+    run within, once the writes are committed.
+    """
+    channel = default_config.db_notify_channel
+    if not channel:
+        yield
+        return
+    with tracking.record_tables() as recorder:
+        yield
+    if recorder.written_tables:
+        # Leave the results of the caller's cursor alone.
+        with cursor.connection.cursor() as notify_cursor:
+            notify_cursor.execute(
+                NOTIFY_SQL, (channel, get_payload(recorder.written_tables))
+            )
+
+
+@asynccontextmanager
+async def async_publishing(cursor):
+    channel = default_config.db_notify_channel
+    if not channel:
+        yield
+        return
+    with tracking.record_tables() as recorder:
+        yield
+    if recorder.written_tables:
+        notify_cursor = AsyncCursor(cursor.connection.cursor())
+        try:
+            await notify_cursor.execute(
+                NOTIFY_SQL, (channel, get_payload(recorder.written_tables))
+            )
+        finally:
+            notify_cursor.close()
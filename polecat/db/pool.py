@@ -0,0 +1,474 @@
+import asyncio
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extensions import (POLL_OK, POLL_READ, POLL_WRITE,
+                                 TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+
+class PoolError(Exception):
+    pass
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class PoolClosed(PoolError):
+    pass
+
+
+class Connection(psycopg2.extensions.connection):
+    """ A psycopg2 connection that keeps track of the statements
+    prepared on it, with their SQL cache entries, and the unit of work
+    it's running.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+        self.prepared_generation = 0
+        self.unit = None
+
+
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def age(self, now=None):
+        return (now or time.monotonic()) - self.created
+
+    def idle_time(self, now=None):
+        return (now or time.monotonic()) - self.last_used
+
+
+class BasePool:
+    def __init__(self, url, min_size=1, max_size=10, timeout=30,
+                 max_age=None, max_idle=None, ping_after=5):
+        if max_size < 1:
+            raise ValueError('Pool max_size must be at least 1')
+        if min_size > max_size:
+            raise ValueError('Pool min_size cannot exceed max_size')
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+        self.closed = False
+        self.idle = []
+        self.in_use = {}
+        self.pending = 0
+
+    def __len__(self):
+        return len(self.idle) + len(self.in_use) + self.pending
+
+    @property
+    def size(self):
+        return len(self)
+
+    def get_deadline(self, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        return time.monotonic() + timeout if timeout else None
+
+    def pop_idle(self):
+        while self.idle:
+            pooled = self.idle.pop()
+            if self.is_expired(pooled):
+                self.discard(pooled)
+                continue
+            return pooled
+
+    def push_idle(self, pooled):
+        pooled.last_used = time.monotonic()
+        self.idle.append(pooled)
+
+    def is_expired(self, pooled):
+        return self.max_age is not None and pooled.age() >= self.max_age
+
+    def discard(self, pooled):
+        try:
+            pooled.connection.close()
+        except psycopg2.Error:
+            pass
+
+    def reap_idle(self):
+        # Callers must hold the pool's lock.
+        now = time.monotonic()
+        total = len(self)
+        keep = []
+        # Least recently used connections are at the front.
+        for pooled in self.idle:
+            if self.is_expired(pooled):
+                expired = True
+            elif self.max_idle is not None and total > self.min_size:
+                expired = pooled.idle_time(now) >= self.max_idle
+            else:
+                expired = False
+            if expired:
+                self.discard(pooled)
+                total -= 1
+            else:
+                keep.append(pooled)
+        self.idle = keep
+
+    def check_timeout(self, deadline):
+        remaining = deadline - time.monotonic() if deadline else None
+        if remaining is not None and remaining <= 0:
+            raise PoolTimeout(
+                f'Timed out waiting for a connection to {self.url}'
+            )
+        return remaining
+
+    def reserve_missing(self):
+        # Callers must hold the pool's lock.
+        needed = 0 if self.closed else max(self.min_size - len(self), 0)
+        self.pending += needed
+        return needed
+
+    def add_idle(self, pooled):
+        # Callers must hold the pool's lock.
+        if self.closed:
+            self.discard(pooled)
+        else:
+            self.push_idle(pooled)
+
+    def close_idle(self):
+        self.closed = True
+        for pooled in self.idle:
+            self.discard(pooled)
+        self.idle = []
+
+
+class ConnectionPool(BasePool):
+    """ A bounded, thread-safe pool of psycopg2 connections to a
+    single database URL.
+
+    Idle connections are handed out last-in first-out, so a lightly
+    loaded process keeps reusing the same few connections while the
+    rest age out and are reaped. Connections are always returned to
+    the pool in autocommit mode.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = threading.Condition()
+
+    def getconn(self, timeout=None):
+        deadline = self.get_deadline(timeout)
+        while True:
+            pooled = self.reserve(deadline)
+            try:
+                if pooled is None:
+                    pooled = self.open()
+                elif not self.check(pooled):
+                    self.discard(pooled)
+                    pooled = None
+            except BaseException:
+                self.unreserve()
+                raise
+            if pooled is None:
+                self.unreserve()
+                continue
+            with self.condition:
+                self.pending -= 1
+                self.in_use[id(pooled.connection)] = pooled
+            return pooled.connection
+
+    def putconn(self, connection, close=False):
+        with self.condition:
+            pooled = self.in_use.pop(id(connection), None)
+            if pooled is None:
+                raise PoolError('Connection does not belong to this pool')
+            if close or self.closed or not self.reset(pooled) or self.is_expired(pooled):
+                self.discard(pooled)
+            else:
+                self.push_idle(pooled)
+            self.reap_idle()
+            self.condition.notify()
+        self.top_up()
+
+    def reserve(self, deadline=None):
+        # Reserve a slot in the pool, returning either an idle
+        # connection, or None if a new connection should be
+        # opened. Connecting and health checks happen outside of the
+        # lock so other threads aren't held up.
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise PoolClosed(f'Pool for {self.url} is closed')
+                pooled = self.pop_idle()
+                if pooled or len(self) < self.max_size:
+                    self.pending += 1
+                    return pooled
+                self.condition.wait(self.check_timeout(deadline))
+
+    def unreserve(self, count=1):
+        with self.condition:
+            self.pending -= count
+            self.condition.notify_all()
+
+    def open(self):
+        connection = psycopg2.connect(self.url, connection_factory=Connection)
+        connection.autocommit = True
+        return PooledConnection(connection)
+
+    def check(self, pooled):
+        connection = pooled.connection
+        if connection.closed:
+            return False
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            return False
+        if self.ping_after is not None and pooled.idle_time() >= self.ping_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except psycopg2.Error:
+                return False
+        return True
+
+    def reset(self, pooled):
+        connection = pooled.connection
+        if connection.closed:
+            return False
+        status = connection.get_transaction_status()
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            if status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            if not connection.autocommit:
+                connection.autocommit = True
+        except psycopg2.Error:
+            return False
+        return True
+
+    def reap(self):
+        """ Close idle connections that have outlived `max_age`, or
+        that have been idle longer than `max_idle`, keeping at least
+        `min_size` connections open.
+        """
+        with self.condition:
+            self.reap_idle()
+        self.top_up()
+
+    def fill(self):
+        """ Open connections until there are at least `min_size`.
+        """
+        with self.condition:
+            needed = self.reserve_missing()
+        for ii in range(needed):
+            try:
+                pooled = self.open()
+            except BaseException:
+                self.unreserve(needed - ii)
+                raise
+            with self.condition:
+                self.pending -= 1
+                self.add_idle(pooled)
+                self.condition.notify()
+
+    def top_up(self):
+        # Replaces connections closed below `min_size`. Should the
+        # database be unreachable, the next `getconn` reports it.
+        if len(self) < self.min_size and not self.closed:
+            try:
+                self.fill()
+            except psycopg2.Error:
+                pass
+
+    def close(self):
+        with self.condition:
+            self.close_idle()
+            self.condition.notify_all()
+
+
+async def wait(connection):
+    """ Drive an asynchronous psycopg2 connection until its current
+    operation completes, yielding to the event loop while the socket
+    is busy.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        state = connection.poll()
+        if state == POLL_OK:
+            return
+        elif state == POLL_READ:
+            await wait_for_fd(loop, connection.fileno(), loop.add_reader, loop.remove_reader)
+        elif state == POLL_WRITE:
+            await wait_for_fd(loop, connection.fileno(), loop.add_writer, loop.remove_writer)
+        else:
+            raise psycopg2.OperationalError(f'Bad poll state: {state}')
+
+
+def wait_for_fd(loop, fd, add, remove):
+    future = loop.create_future()
+    add(fd, lambda: future.done() or future.set_result(None))
+    future.add_done_callback(lambda f: remove(fd))
+    return future
+
+
+class AsyncCursor:
+    """ Wraps a cursor on an asynchronous connection so that
+    `execute` may be awaited. Results are held client-side, so
+    fetching and iterating remain synchronous.
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    async def execute(self, sql, args=None):
+        unit = getattr(self.cursor.connection, 'unit', None)
+        if unit is None or unit.lock is None:
+            self.cursor.execute(sql, args)
+            await wait(self.cursor.connection)
+            return
+        # Tasks sharing a unit's connection take turns.
+        async with unit.lock:
+            self.cursor.execute(sql, args)
+            await wait(self.cursor.connection)
+
+
+class AsyncConnectionPool(BasePool):
+    """ An asyncio equivalent of `ConnectionPool`, using psycopg2's
+    asynchronous connections. Waiting for a free connection,
+    connecting and querying all yield to the event loop instead of
+    blocking it.
+
+    Asynchronous connections are always in autocommit mode. A pool
+    may only be used from the event loop it was created on.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = asyncio.get_event_loop()
+        self.condition = asyncio.Condition()
+
+    async def getconn(self, timeout=None):
+        if len(self) < self.min_size:
+            # Pools are created outside of the event loop, so they're
+            # filled when first used.
+            await self.fill()
+        deadline = self.get_deadline(timeout)
+        while True:
+            pooled = await self.reserve(deadline)
+            try:
+                if pooled is None:
+                    pooled = await self.open()
+                elif not await self.check(pooled):
+                    self.discard(pooled)
+                    pooled = None
+            except BaseException:
+                await self.unreserve()
+                raise
+            if pooled is None:
+                await self.unreserve()
+                continue
+            async with self.condition:
+                self.pending -= 1
+                self.in_use[id(pooled.connection)] = pooled
+            return pooled.connection
+
+    async def putconn(self, connection, close=False):
+        async with self.condition:
+            pooled = self.in_use.pop(id(connection), None)
+            if pooled is None:
+                raise PoolError('Connection does not belong to this pool')
+            if close or self.closed or not self.reset(pooled) or self.is_expired(pooled):
+                self.discard(pooled)
+            else:
+                self.push_idle(pooled)
+            self.reap_idle()
+            self.condition.notify()
+        await self.top_up()
+
+    async def reserve(self, deadline=None):
+        async with self.condition:
+            while True:
+                if self.closed:
+                    raise PoolClosed(f'Pool for {self.url} is closed')
+                pooled = self.pop_idle()
+                if pooled or len(self) < self.max_size:
+                    self.pending += 1
+                    return pooled
+                try:
+                    await asyncio.wait_for(
+                        self.condition.wait(),
+                        self.check_timeout(deadline)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def unreserve(self, count=1):
+        async with self.condition:
+            self.pending -= count
+            self.condition.notify_all()
+
+    async def open(self):
+        connection = psycopg2.connect(
+            self.url, connection_factory=Connection, async_=True
+        )
+        try:
+            await wait(connection)
+        except BaseException:
+            connection.close()
+            raise
+        return PooledConnection(connection)
+
+    async def check(self, pooled):
+        connection = pooled.connection
+        if connection.closed or connection.isexecuting():
+            return False
+        if self.ping_after is not None and pooled.idle_time() >= self.ping_after:
+            try:
+                await AsyncCursor(connection.cursor()).execute('SELECT 1')
+            except psycopg2.Error:
+                return False
+        return True
+
+    def reset(self, pooled):
+        # A connection interrupted mid-query, usually by task
+        # cancellation, can't be reused.
+        connection = pooled.connection
+        return not connection.closed and not connection.isexecuting()
+
+    async def reap(self):
+        async with self.condition:
+            self.reap_idle()
+        await self.top_up()
+
+    async def fill(self):
+        async with self.condition:
+            needed = self.reserve_missing()
+        for ii in range(needed):
+            try:
+                pooled = await self.open()
+            except BaseException:
+                await self.unreserve(needed - ii)
+                raise
+            async with self.condition:
+                self.pending -= 1
+                self.add_idle(pooled)
+                self.condition.notify()
+
+    async def top_up(self):
+        if len(self) < self.min_size and not self.closed:
+            try:
+                await self.fill()
+            except psycopg2.Error:
+                pass
+
+    def close(self):
+        # Closing sockets doesn't need the event loop, which may
+        # already have gone away.
+        self.close_idle()
@@ -1,4 +1,5 @@
 from .builder import Q  # noqa
 from .helpers import print_query  # noqa
 from .selection import Selection as S  # noqa
+from . import aggregate as A  # noqa
 from .query import Count, Ref  # noqa
@@ -0,0 +1,38 @@
+class Aggregate:
+    """ An aggregate function over a column of the rows of a query, or
+    of each group of them.
+    """
+    function = None
+
+    def __init__(self, column, distinct=False):
+        self.column = column
+        self.distinct = distinct
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} column="{self.column}">'
+
+
+class Sum(Aggregate):
+    function = 'sum'
+
+
+class Avg(Aggregate):
+    function = 'avg'
+
+
+class Min(Aggregate):
+    function = 'min'
+
+
+class Max(Aggregate):
+    function = 'max'
+
+
+class Count(Aggregate):
+    """ Count rows, or the values in `column` that aren't null. """
+    function = 'count'
+
+    def __init__(self, column=None, distinct=False):
+        if distinct and column is None:
+            raise ValueError('Counting distinct values requires a column')
+        super().__init__(column, distinct)
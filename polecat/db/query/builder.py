@@ -1,15 +1,42 @@
 import logging
+from itertools import chain, count
 
 from polecat.core.config import default_config
+from polecat.utils.raw_json import RawJSON
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE, new_type,
+                                 register_type)
+from psycopg2.sql import Identifier
 
+from ..connection import async_cursor as async_cursor_context
 from ..connection import cursor as cursor_context  # TODO: Ugh.
+from ..connection import manager
+from ..connection import named_cursor as named_cursor_context
 from ..decorators import dbcursor
-from .query import (Common, Delete, Filter, Insert, InsertIfMissing, Join,
-                    Query, Select, Update, Values, Count, Max)
+from ..notify import async_publishing, publishing
+from ..schema.table import Table
+from ..unit import async_session_scope, session_scope
+from . import aggregate as A
+from .query import (TOTAL_COLUMN, Aggregate, BulkUpdate, Common, Count,
+                    Delete, Filter, Insert, InsertIfMissing, Join, Max, Merge,
+                    Query, Select, Update, Values)
 from .selection import Selection
 
 logger = logging.getLogger(__name__)
 
+stream_counter = count()
+
+# Leaves `json` and `jsonb` results as text, instead of decoding them.
+RAW_JSON = new_type((114, 3802), 'RAW_JSON', lambda value, cursor: value)
+
+# The planner's estimate of the rows in a table, scaling the row count
+# from its last analysis to the table's current size. Null if it's
+# never been analysed.
+ESTIMATE_TABLE_SQL = (
+    "SELECT (reltuples / relpages * (pg_relation_size(oid) /"
+    " current_setting('block_size')::int))::bigint FROM pg_class"
+    " WHERE oid = to_regclass(%s) AND relpages > 0 AND reltuples >= 0"
+)
+
 
 class Q:
     def __init__(self, queryable=None, branches=None, session=None):
@@ -19,54 +46,286 @@ class Q:
         self.row_count = 0
 
     def __iter__(self):
-        with cursor_context() as cursor:
+        with cursor_context(self.get_url()) as cursor:
             self.execute(cursor=cursor)
             for row in cursor:
                 yield row[0]
 
+    async def __aiter__(self):
+        async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+            await self.aexecute(cursor=cursor)
+            for row in cursor:
+                yield row[0]
+
+    def stream(self, batch_size=None):
+        """ Iterate over results using a server-side cursor, holding
+        at most `batch_size` rows in memory at a time.
+        """
+        from ..sql.cache import sql_cache
+        batch_size = batch_size or default_config.db_stream_batch_size
+        with named_cursor_context(self.get_url(), itersize=batch_size) as cursor:
+            with session_scope(self, cursor.connection) as query:
+                prefix, prefix_args, sql, args = sql_cache.split(query, cursor.connection)
+                if prefix:
+                    with cursor.connection.cursor() as prefix_cursor:
+                        prefix_cursor.execute(prefix, prefix_args)
+                self.log_sql(cursor, sql, args)
+                cursor.execute(sql, args)
+                for row in cursor:
+                    yield row[0]
+
+    async def astream(self, batch_size=None):
+        """ The asyncio equivalent of `stream`. Asynchronous
+        connections don't support named cursors, so the cursor is
+        declared and fetched from directly.
+        """
+        from ..sql.cache import sql_cache
+        batch_size = batch_size or default_config.db_stream_batch_size
+        async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+            connection = cursor.connection
+            async with async_session_scope(self, connection) as query:
+                prefix, prefix_args, sql, args = sql_cache.split(query, connection)
+                begin = connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+                name = f'polecat_stream_{next(stream_counter)}'
+                if begin:
+                    await cursor.execute('BEGIN')
+                try:
+                    if prefix:
+                        await cursor.execute(prefix, prefix_args)
+                    self.log_sql(cursor, sql, args)
+                    await cursor.execute(f'DECLARE {name} NO SCROLL CURSOR FOR {sql}', args)
+                    while True:
+                        await cursor.execute(f'FETCH FORWARD {int(batch_size)} FROM {name}')
+                        rows = cursor.fetchall()
+                        for row in rows:
+                            yield row[0]
+                        if len(rows) < batch_size:
+                            break
+                    await cursor.execute(f'CLOSE {name}')
+                    if begin:
+                        await cursor.execute('COMMIT')
+                except BaseException:
+                    if begin and not connection.closed and not connection.isexecuting():
+                        await cursor.execute('ROLLBACK')
+                    raise
+
+    def raw(self):
+        """ Fetch the results as a single JSON array, left as text
+        instead of being decoded, to be passed straight through to a
+        response.
+        """
+        with cursor_context(self.get_url()) as cursor:
+            register_type(RAW_JSON, cursor)
+            self.execute(cursor=cursor)
+            return RawJSON.array(row[0] for row in cursor)
+
+    async def araw(self):
+        async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+            register_type(RAW_JSON, cursor.cursor)
+            await self.aexecute(cursor=cursor)
+            return RawJSON.array(row[0] for row in cursor)
+
+    def get_raw(self):
+        """ The raw JSON equivalent of `get`. """
+        with cursor_context(self.get_url()) as cursor:
+            register_type(RAW_JSON, cursor)
+            self.execute(cursor=cursor)
+            return self.get_raw_result(cursor)
+
+    async def aget_raw(self):
+        async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+            register_type(RAW_JSON, cursor.cursor)
+            await self.aexecute(cursor=cursor)
+            return self.get_raw_result(cursor)
+
+    def get_raw_result(self, cursor):
+        text = self.get_result(cursor)
+        return RawJSON(text) if text is not None else None
+
     def __len__(self):
         # TODO: If we haven't executed, we probably should?
         return self.row_count
 
     def get(self):
-        with cursor_context() as cursor:
+        with cursor_context(self.get_url()) as cursor:
             self.execute(cursor=cursor)
-            if cursor.rowcount == 0:
+            return self.get_result(cursor)
+
+    async def aget(self):
+        async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+            await self.aexecute(cursor=cursor)
+            return self.get_result(cursor)
+
+    def get_result(self, cursor):
+        if cursor.rowcount == 0:
+            return None
+        elif cursor.rowcount > 1:
+            # TODO: Better exception.
+            raise Exception('Multiple results for get query.')
+        for row in cursor:
+            return row[0]
+
+    def get_page(self):
+        """ Fetch the rows of a query selected `with_total`, returning
+        them with the total number of rows, as `(rows, total)`.
+        """
+        rows = list(self)
+        total = split_total(rows)
+        if total is None and self.has_skipped_rows():
+            # Past the last row, so nothing held the total.
+            total = self.total_query().get()[TOTAL_COLUMN]
+        return rows, total or 0
+
+    async def aget_page(self):
+        rows = [row async for row in self]
+        total = split_total(rows)
+        if total is None and self.has_skipped_rows():
+            total = (await self.total_query().aget())[TOTAL_COLUMN]
+        return rows, total or 0
+
+    def has_skipped_rows(self):
+        return bool(self.queryable.offset) or self.queryable.seek is not None
+
+    def total_query(self):
+        """ A query counting the rows of this one's selection,
+        ignoring its limit, offset and seek.
+        """
+        return self.chain(
+            Aggregate(self.queryable.source, {TOTAL_COLUMN: A.Count()})
+        )
+
+    def estimate_count(self):
+        """ Estimate the number of rows the query returns, without
+        running it. Tables read whole are estimated from the catalog,
+        and anything else from the plan of the query. Much faster than
+        counting large tables, though only as accurate as their
+        statistics.
+        """
+        if isinstance(self.queryable, Table):
+            return self.select().estimate_count()
+        with cursor_context(self.get_url()) as cursor:
+            table = self.get_estimated_table()
+            if table is not None:
+                cursor.execute(ESTIMATE_TABLE_SQL, (get_regclass(table, cursor.connection),))
+                row = cursor.fetchone()
+                if row and row[0] is not None:
+                    return row[0]
+            with session_scope(self, cursor.connection) as query:
+                sql, args = query.get_explain_sql(cursor.connection)
+                cursor.execute(sql, args)
+                return parse_plan_rows(cursor.fetchone()[0])
+
+    async def aestimate_count(self):
+        if isinstance(self.queryable, Table):
+            return await self.select().aestimate_count()
+        async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+            table = self.get_estimated_table()
+            if table is not None:
+                await cursor.execute(ESTIMATE_TABLE_SQL, (get_regclass(table, cursor.connection),))
+                row = cursor.fetchone()
+                if row and row[0] is not None:
+                    return row[0]
+            async with async_session_scope(self, cursor.connection) as query:
+                sql, args = query.get_explain_sql(cursor.connection)
+                await cursor.execute(sql, args)
+                return parse_plan_rows(cursor.fetchone()[0])
+
+    def get_estimated_table(self):
+        # Only a table read whole, or a plain selection from one, is
+        # estimated from the catalog.
+        queryable = self.queryable
+        if isinstance(queryable, Select):
+            if (
+                queryable.limit is not None or queryable.offset or
+                queryable.seek is not None
+            ):
                 return None
-            elif cursor.rowcount > 1:
-                # TODO: Better exception.
-                raise Exception('Multiple results for get query.')
-            for row in cursor:
-                return row[0]
+            queryable = queryable.source
+        return queryable if isinstance(queryable, Table) else None
+
+    def get_explain_sql(self, connection):
+        from ..sql.cache import sql_cache
+        prefix, prefix_args, sql, args = sql_cache.split(self, connection)
+        sql = f'EXPLAIN (FORMAT JSON) {sql}'
+        if prefix:
+            return f'{prefix}; {sql}', tuple(prefix_args) + tuple(args)
+        return sql, args
 
     @classmethod
     def common(cls, *subqueries):
         return Q(Common(subqueries))
 
+    @classmethod
+    def merge(cls, session=None, **subqueries):
+        """ Run independent queries as one statement. The result is a
+        single object holding the rows of each query, as a list under
+        its name.
+        """
+        return Q(Merge(tuple(subqueries.items())), session=session)
+
     @dbcursor
     def to_sql(self, cursor):
-        # TODO: This is also technically outside of the scope of this
-        # class.
-        from ..sql.strategy import Strategy
-        strategy = Strategy()
-        expr = strategy.parse(self)
-        return cursor.mogrify(*expr.to_sql())
-
-    @dbcursor()
-    def execute(self, cursor):
+        return cursor.mogrify(*self.compile(cursor.connection))
+
+    def compile(self, context=None):
+        return self.lookup(context)[:2]
+
+    def lookup(self, context=None):
         # TODO: This is pretty bad. How to keep this purely as a
         # builder, but also inject strategy and execution knowledge
         # for convenience?
-        from ..sql.strategy import Strategy
-        strategy = Strategy()
-        expr = strategy.parse(self)
-        sql, args = expr.to_sql()
+        from ..sql.cache import sql_cache
+        return sql_cache.lookup(self, context)
+
+    def execute(self, cursor=None):
+        from ..sql import bulk, prepare
+        if cursor is None:
+            with cursor_context(self.get_url()) as cursor:
+                return self.execute(cursor=cursor)
+        if bulk.is_batched(self):
+            self.row_count = bulk.execute(self, cursor)
+            return
+        with publishing(cursor):
+            with session_scope(self, cursor.connection) as query:
+                sql, args, entry = query.lookup(cursor.connection)
+                self.log_sql(cursor, sql, args)
+                prepare.execute(cursor, sql, args, entry)
+            self.row_count = cursor.rowcount
+
+    async def aexecute(self, cursor=None):
+        from ..sql import bulk, prepare
+        if cursor is None:
+            async with async_cursor_context(self.get_url(is_async=True)) as cursor:
+                return await self.aexecute(cursor=cursor)
+        if bulk.is_batched(self):
+            self.row_count = await bulk.aexecute(self, cursor)
+            return
+        async with async_publishing(cursor):
+            async with async_session_scope(self, cursor.connection) as query:
+                sql, args, entry = query.lookup(cursor.connection)
+                self.log_sql(cursor, sql, args)
+                await prepare.aexecute(cursor, sql, args, entry)
+            self.row_count = cursor.rowcount
+
+    def get_url(self, is_async=False):
+        """ The database URL to run the query on, or None for the
+        primary. Queries that only read go to a replica, if there are
+        any, and those that write keep the rest of the request on the
+        primary.
+        """
+        from ..sql.strategy import is_read_only
+        if not manager.get_replica_urls():
+            return None
+        if not is_read_only(self):
+            manager.mark_written()
+            return None
+        return manager.get_read_url(is_async)
+
+    def log_sql(self, cursor, sql, args):
         if default_config.log_sql:
             # TODO: Get my logging sorted.
             # logger.debug(cursor.mogrify(sql, args))
             print(cursor.mogrify(sql, args))
-        cursor.execute(sql, args)
-        self.row_count = cursor.rowcount
 
     def select(self, *args, **kwargs):
         if len(args) == 1 and isinstance(args[0], Selection):
@@ -98,9 +357,20 @@ class Q:
             # TODO: Do I need to wrap insert in a select?
         return self.chain(insert)
 
-    def bulk_insert(self, columns, values):
+    def bulk_insert(self, rows, values=None, batch_size=None):
+        """ Insert many rows with multi-row statements. Rows are either
+        an iterable of dicts sharing the same keys, or a list of column
+        names followed by an iterable of value tuples. Without a
+        `batch_size` the rows are inserted by a single statement, and
+        may be selected from. With one, executing the query sends the
+        rows in batches, using COPY for large batches.
+        """
         source = self.get_mutation_source()
-        values = self.parse_bulk_values(columns, values)
+        if values is None:
+            columns, values = self.parse_bulk_rows(rows)
+        else:
+            columns = rows
+        values = self.parse_bulk_values(columns, values, batch_size)
         insert = Insert(source, values)
         if insert.reverse_queries:
             if self.branches is None:
@@ -110,6 +380,17 @@ class Q:
             # TODO: Do I need to wrap insert in a select?
         return self.chain(insert)
 
+    def bulk_update(self, rows, key='id'):
+        """ Update many rows with a single statement. Each row is a
+        dict holding the same keys, including `key`, which identifies
+        the row to update.
+        """
+        source = self.get_mutation_source()
+        columns, values = self.parse_bulk_rows(rows)
+        return self.chain(
+            BulkUpdate(source, Values(list(values), columns), key=key)
+        )
+
     def insert_into(self, source, **values):
         self.split_branch()
         return self.chain(
@@ -172,6 +453,34 @@ class Q:
     def max(self):
         return self.chain(Max(self.queryable))
 
+    def group_by(self, *columns):
+        """ Aggregate each group of rows sharing values of `columns`,
+        returning those values with the group's aggregates.
+        """
+        if isinstance(self.queryable, Aggregate):
+            return self.chain(self.queryable.copy(group_by=columns))
+        return self.chain(Aggregate(self.queryable, group_by=columns))
+
+    def aggregate(self, **aggregates):
+        """ Compute `aggregates`, a mapping of names to aggregate
+        functions, over all rows, or each group of them.
+        """
+        if isinstance(self.queryable, Aggregate):
+            return self.chain(self.queryable.copy(
+                aggregates={**self.queryable.aggregates, **aggregates}
+            ))
+        return self.chain(Aggregate(self.queryable, aggregates))
+
+    def having(self, **options):
+        """ Keep only the groups whose aggregates meet the conditions
+        in `options`, given as for `filter`.
+        """
+        if not isinstance(self.queryable, Aggregate):
+            raise ValueError('Only aggregates may be filtered with "having"')
+        return self.chain(self.queryable.copy(
+            having={**self.queryable.having, **options}
+        ))
+
     def recurse(self, column):
         # TODO: This is clearly wrong. It mutates the query, possibly
         # effecting other uses.
@@ -182,17 +491,43 @@ class Q:
     def limit(self, limit):
         # TODO: This is clearly wrong. It mutates the query, possibly
         # effecting other uses.
-        assert isinstance(self.queryable, Select)
+        assert isinstance(self.queryable, (Select, Aggregate))
         self.queryable.limit = limit
         return self
 
     def order(self, columns):
         # TODO: This is clearly wrong. It mutates the query, possibly
         # effecting other uses.
-        assert isinstance(self.queryable, Select)
+        assert isinstance(self.queryable, (Select, Aggregate))
         self.queryable.order = columns
         return self
 
+    def offset(self, offset):
+        # TODO: This is clearly wrong. It mutates the query, possibly
+        # effecting other uses.
+        assert isinstance(self.queryable, (Select, Aggregate))
+        self.queryable.offset = offset
+        return self
+
+    def with_total(self):
+        """ Return the number of rows selected, before any limit,
+        offset or seek, alongside each row. See `get_page`.
+        """
+        # TODO: This is clearly wrong. It mutates the query, possibly
+        # effecting other uses.
+        assert isinstance(self.queryable, Select)
+        self.queryable.total = True
+        return self
+
+    def seek(self, values):
+        """ Start after the row whose `order` columns hold `values`.
+        """
+        # TODO: This is clearly wrong. It mutates the query, possibly
+        # effecting other uses.
+        assert isinstance(self.queryable, Select)
+        self.queryable.seek = tuple(values)
+        return self
+
     def join(self, separator=' '):
         return self.chain(
             Join(self.queryable, separator)
@@ -213,8 +548,27 @@ class Q:
             parsed_values[column_name] = self.parse_value(queryable, column_name, value)
         return parsed_values
 
-    def parse_bulk_values(self, columns, values):
-        return Values(values, columns)
+    def parse_bulk_values(self, columns, values, batch_size=None):
+        if batch_size is None:
+            values = list(values)
+        return Values(values, columns, batch_size=batch_size)
+
+    def parse_bulk_rows(self, rows):
+        # Rows may be a generator, so only the first is read ahead of
+        # time to find the columns.
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return (), []
+        columns = tuple(first.keys())
+
+        def iter_values():
+            for row in chain((first,), rows):
+                if row.keys() != first.keys():
+                    raise ValueError('Bulk rows must all have the same columns')
+                yield tuple(row[c] for c in columns)
+        return columns, iter_values()
 
     def parse_value(self, queryable, column_name, value):
         return value
@@ -245,3 +599,21 @@ class Q:
         queryable = query.queryable
         self.branches = (self.branches or []) + (query.branches or [])
         return queryable
+
+
+def split_total(rows):
+    """ Take the total of a query selected `with_total` out of its
+    `rows`, returning None if there are no rows to take it from.
+    """
+    total = None
+    for row in rows:
+        total = row.pop(TOTAL_COLUMN, total)
+    return total
+
+
+def get_regclass(table, connection):
+    return Identifier(table.name).as_string(connection)
+
+
+def parse_plan_rows(plan):
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -4,6 +4,8 @@ from ..schema import RelatedColumn, ReverseColumn
 from ..schema.variable import SessionVariable
 from .selection import Selection
 
+TOTAL_COLUMN = '__total'
+
 
 class Queryable:
     selectable = True
@@ -31,12 +33,18 @@ class Query(Queryable):
 class Select(Query):
     mutatable = False
 
-    def __init__(self, source, selection, limit=None, order=None, **kwargs):
+    def __init__(self, source, selection, limit=None, order=None, offset=None,
+                 seek=None, total=False, **kwargs):
         super().__init__(source, **kwargs)
         self.assert_selectable(source)
         self.selection = selection
         self.limit = limit
         self.order = order
+        self.offset = offset
+        self.seek = seek
+        # Return the number of rows selected, ignoring the limit,
+        # offset and seek, with every row under `TOTAL_COLUMN`.
+        self.total = total
         self.recurse_column = None
 
     def iter_column_names(self):
@@ -182,10 +190,20 @@ class Common(Query):
         self.subqueries = subqueries
 
 
+class Merge(Query):
+    mutatable = False
+
+    def __init__(self, subqueries):
+        super().__init__()
+        # Pairs of a name and the query whose rows are listed under
+        # that name.
+        self.subqueries = tuple(subqueries)
+
+
 class Values(Query):
     mutatable = False
 
-    def __init__(self, values, columns=None, **kwargs):
+    def __init__(self, values, columns=None, batch_size=None, **kwargs):
         super().__init__(**kwargs)
         if isinstance(values, dict):
             self.columns = tuple(values.keys())
@@ -193,6 +211,9 @@ class Values(Query):
         else:
             self.columns = columns
             self.values = values
+        # When set, the rows are executed in batches of this size and
+        # `values` may be any iterable.
+        self.batch_size = batch_size
 
     def iter_rows(self):
         for values in self.values:
@@ -209,6 +230,31 @@ class Values(Query):
         return dict(zip(self.columns, self.values[0]))
 
 
+class BulkUpdate(Query):
+    mutatable = False
+
+    def __init__(self, source, values, key='id', **kwargs):
+        super().__init__(source, **kwargs)
+        if key not in values.columns:
+            raise ValueError(f'Bulk update rows are missing key "{key}"')
+        if len(values.columns) < 2:
+            raise ValueError('Bulk update rows have no columns to update')
+        for column_name in values.iter_column_names():
+            if not source.has_column(column_name):
+                raise ValueError(f'Invalid column "{column_name}" name in update')
+        self.values = values
+        self.key = key
+
+    def iter_column_names(self):
+        return iter(self.source.iter_column_names())
+
+    def has_column(self, name):
+        return self.source.has_column(name)
+
+    def get_column(self, name):
+        return self.source.get_column(name)
+
+
 class Count(Query):
     mutatable = False
 
@@ -225,6 +271,36 @@ class Max(Query):
         self.alias = alias
 
 
+class Aggregate(Query):
+    mutatable = False
+
+    def __init__(self, source, aggregates=None, group_by=None, having=None,
+                 limit=None, order=None, offset=None):
+        super().__init__(source)
+        self.assert_selectable(source)
+        # Names of the results, and the aggregate functions giving
+        # them.
+        self.aggregates = aggregates or {}
+        self.group_by = tuple(group_by or ())
+        # Conditions on the results, as for a filter.
+        self.having = having or {}
+        self.limit = limit
+        self.order = order
+        self.offset = offset
+
+    def copy(self, **kwargs):
+        return Aggregate(**{
+            'source': self.source,
+            'aggregates': self.aggregates,
+            'group_by': self.group_by,
+            'having': self.having,
+            'limit': self.limit,
+            'order': self.order,
+            'offset': self.offset,
+            **kwargs
+        })
+
+
 class Ref(Query):
     mutatable = False
 
@@ -1,7 +1,13 @@
+from polecat.utils import to_tuple
+
+
 class Selection:
     def __init__(self, *fields, **lookups):
         self.fields = fields
         self.lookups = lookups
+        # Conditions, order and bounds of the rows of a reverse
+        # lookup, applied as it's fetched.
+        self.options = {}
 
     def __repr__(self):
         return f'<Selector fields="{self.fields}" lookups="{self.lookups}">'
@@ -13,7 +19,9 @@ class Selection:
             yield field_name
 
     def copy(self):
-        return Selection(*self.fields, **self.lookups)
+        selection = Selection(*self.fields, **self.lookups)
+        selection.options = dict(self.options)
+        return selection
 
     def get(self, name, force=False):
         return self.lookups.get(name) or (Selection() if force else None)
@@ -24,6 +32,7 @@ class Selection:
             self.lookups = {**self.lookups}
             for name, sub in other.lookups.items():
                 self.lookups[name] = self.lookups.get(name, Selection()).merge(sub)
+            self.options = {**other.options, **self.options}
         return self
 
     def has_lookups(self):
@@ -31,3 +40,19 @@ class Selection:
 
     def all_fields(self):
         return self.fields + tuple(self.lookups.keys())
+
+    def filter(self, **options):
+        self.options['where'] = {**self.options.get('where', {}), **options}
+        return self
+
+    def order(self, columns):
+        self.options['order'] = to_tuple(columns)
+        return self
+
+    def limit(self, limit):
+        self.options['limit'] = limit
+        return self
+
+    def offset(self, offset):
+        self.options['offset'] = offset
+        return self
@@ -5,3 +5,10 @@ class Session:
 
     def is_empty(self):
         return not self.role and not self.variables
+
+    def matches(self, other):
+        return (
+            other is not None and
+            self.role == other.role and
+            self.variables == other.variables
+        )
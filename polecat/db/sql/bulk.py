@@ -0,0 +1,143 @@
+import io
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from itertools import islice
+from uuid import UUID
+
+from psycopg2.sql import SQL, Identifier
+
+from polecat.core.config import default_config
+
+from ..query import query as query_module
+from .. import tracking
+from ..notify import publishing
+from ..schema import Table
+from ..unit import get_unit
+
+# Values that can be written in COPY's text format. Anything else is
+# left to psycopg2 to adapt, by inserting the batch instead.
+COPY_TYPES = (
+    str, int, float, Decimal, bool, date, datetime, time, UUID, dict, list,
+    type(None)
+)
+
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r'
+})
+
+
+def is_batched(builder):
+    insert = builder.queryable
+    return (
+        type(insert) == query_module.Insert and
+        isinstance(insert.values, query_module.Values) and
+        insert.values.batch_size is not None
+    )
+
+
+def execute(builder, cursor):
+    """ Execute a batched bulk insert, returning the number of rows
+    inserted. Each batch is a separate statement, so callers wanting
+    all or nothing should run this inside a transaction.
+    """
+    insert = get_insert(builder)
+    values = insert.values
+    row_count = 0
+    # A unit of work's session applies to COPY as much as any other
+    # statement.
+    unit = get_unit(cursor.connection)
+    can_copy = unit is None or unit.session is None
+    for batch in iter_batches(values.values, values.batch_size):
+        if can_copy and should_copy(builder, insert, batch):
+            with publishing(cursor):
+                copy(cursor, insert.source, values.columns, batch)
+                tracking.add_tables((), (insert.source.name,))
+        else:
+            get_batch_query(builder, insert, batch).execute(cursor=cursor)
+        row_count += cursor.rowcount
+    return row_count
+
+
+async def aexecute(builder, cursor):
+    """ The asyncio equivalent of `execute`. Asynchronous connections
+    don't support COPY, so every batch is inserted.
+    """
+    insert = get_insert(builder)
+    values = insert.values
+    row_count = 0
+    for batch in iter_batches(values.values, values.batch_size):
+        await get_batch_query(builder, insert, batch).aexecute(cursor=cursor)
+        row_count += cursor.rowcount
+    return row_count
+
+
+def get_insert(builder):
+    if builder.branches:
+        raise ValueError('Batched bulk inserts cannot be branched')
+    return builder.queryable
+
+
+def get_batch_query(builder, insert, batch):
+    return builder.chain(
+        query_module.Insert(
+            insert.source,
+            query_module.Values(batch, insert.values.columns)
+        )
+    )
+
+
+def iter_batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
+def should_copy(builder, insert, batch):
+    threshold = default_config.db_bulk_copy_threshold
+    session = builder.session
+    return (
+        threshold and
+        len(batch) >= threshold and
+        # Session variables are set per transaction, and row level
+        # security rejects COPY outright.
+        (session is None or session.is_empty()) and
+        isinstance(insert.source, Table) and
+        all(isinstance(v, COPY_TYPES) for row in batch for v in row)
+    )
+
+
+def copy(cursor, table, columns, rows):
+    get_column = table.get_column
+    db_columns = [get_column(c) for c in columns]
+    data = io.StringIO()
+    for row in rows:
+        data.write('\t'.join(
+            to_copy_text(c.to_db_value(v))
+            for c, v in zip(db_columns, row)
+        ))
+        data.write('\n')
+    data.seek(0)
+    sql = SQL('COPY {} ({}) FROM STDIN').format(
+        Identifier(table.alias),
+        SQL(', ').join(map(Identifier, columns))
+    )
+    cursor.copy_expert(sql.as_string(cursor), data)
+
+
+def to_copy_text(value):
+    if value is None:
+        return '\\N'
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    else:
+        value = str(value)
+    return value.translate(COPY_ESCAPES)
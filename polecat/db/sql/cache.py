@@ -0,0 +1,421 @@
+import threading
+from itertools import count
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from polecat.core.config import default_config
+from polecat.utils import to_bool, to_tuple
+
+from ..query import Q
+from ..query import query as query_module
+from ..query.selection import Selection
+from ..schema.variable import SessionVariable
+from .. import tracking
+from .expression.expression import Expression
+from .expression.multi import Multi
+from .strategy import Strategy
+
+CacheInfo = namedtuple('CacheInfo', ('hits', 'misses', 'max_size', 'size'))
+
+# Values that are passed through to the database untouched, and can
+# therefore be lifted out of a query and bound separately.
+PARAMETER_TYPES = (
+    str, bytes, int, float, Decimal, date, datetime, time, timedelta,
+    UUID, list, dict, type(None), SessionVariable
+)
+
+UNCACHEABLE = object()
+
+statement_counter = count()
+
+
+class Uncacheable(Exception):
+    pass
+
+
+class Shape:
+    """ Describes the structure of a query, independent of the
+    parameter values it holds.
+
+    Walking a query produces a hashable `key`, identical for any two
+    queries that compile to the same SQL text, and the list of
+    parameter `values`, in walk order. Two values that are the same
+    object are recorded as such in the key, so that mapping compiled
+    arguments back to values by identity stays unambiguous.
+    """
+    def __init__(self, builder):
+        self.values = []
+        self.relations = []
+        self.identities = {}
+        self.queries = {}
+        self.key = self.walk(builder)
+
+    @classmethod
+    def from_query(cls, builder):
+        try:
+            return cls(builder)
+        except Uncacheable:
+            return None
+
+    def walk(self, query):
+        if isinstance(query, Q):
+            return (
+                Q,
+                self.walk(query.queryable),
+                tuple(self.walk(b) for b in query.iter_branches()),
+                self.walk_session(query.session)
+            )
+        elif isinstance(query, query_module.Query):
+            index = self.queries.get(id(query))
+            if index is not None:
+                return ('ref', index)
+            self.queries[id(query)] = len(self.queries)
+            return self.walk_query(query)
+        elif isinstance(query, Expression) or query is None:
+            raise Uncacheable
+        else:
+            # Tables don't hash, but they're held by the cache entry
+            # so their identity can't be reused.
+            self.relations.append(query)
+            return ('relation', id(query))
+
+    def walk_query(self, query):
+        cls = query.__class__
+        if isinstance(query, query_module.Select):
+            return (
+                cls,
+                self.walk(query.source),
+                self.walk_selection(query.selection),
+                self.walk_limit(query.limit),
+                self.walk_names(to_tuple(query.order)),
+                self.walk_offset(query.offset),
+                tuple(self.walk_value(v) for v in query.seek)
+                if query.seek is not None else None,
+                query.total,
+                query.recurse_column
+            )
+        elif isinstance(query, query_module.Filter):
+            if query.expression is not None:
+                raise Uncacheable
+            return (
+                cls,
+                self.walk(query.source),
+                tuple(
+                    (k, self.walk_option(k, v))
+                    for k, v in query.options.items()
+                )
+            )
+        elif isinstance(query, query_module.Insert):
+            key = (
+                cls,
+                self.walk(query.source),
+                self.walk(query.values),
+                tuple(
+                    (name, tuple(self.walk(q) for q in queries))
+                    for name, queries in query.reverse_queries.items()
+                )
+            )
+            if isinstance(query, query_module.InsertIfMissing):
+                key += (self.walk_dict(query.defaults),)
+            return key
+        elif isinstance(query, query_module.Values):
+            if not isinstance(query.values, (list, tuple)):
+                # Batched rows may be a one-shot iterator.
+                raise Uncacheable
+            return (
+                cls,
+                self.walk_names(query.columns),
+                tuple(
+                    tuple(self.walk_value(v) for v in row)
+                    for row in query.values
+                )
+            )
+        elif isinstance(query, query_module.Aggregate):
+            return (
+                cls,
+                self.walk(query.source),
+                tuple(
+                    (name, a.function, a.column, a.distinct)
+                    for name, a in query.aggregates.items()
+                ),
+                self.walk_names(query.group_by),
+                tuple(
+                    (k, self.walk_option(k, v))
+                    for k, v in query.having.items()
+                ),
+                self.walk_limit(query.limit),
+                self.walk_names(to_tuple(query.order)),
+                self.walk_offset(query.offset)
+            )
+        elif isinstance(query, (query_module.Delete, query_module.Count, query_module.Max)):
+            return (cls, self.walk(query.source), getattr(query, 'alias', None))
+        elif isinstance(query, query_module.Join):
+            return (cls, self.walk(query.source), query.separator)
+        elif isinstance(query, query_module.Common):
+            return (cls, tuple(self.walk(q) for q in query.subqueries))
+        elif isinstance(query, query_module.Merge):
+            return (
+                cls,
+                tuple((n, self.walk(q)) for n, q in query.subqueries)
+            )
+        elif isinstance(query, query_module.Ref):
+            return (cls, query.field)
+        raise Uncacheable
+
+    def walk_selection(self, selection):
+        if not isinstance(selection, Selection):
+            raise Uncacheable
+        lookups = []
+        for name, lookup in selection.lookups.items():
+            if isinstance(lookup, Selection):
+                lookups.append((name, self.walk_selection(lookup)))
+            elif isinstance(lookup, (Q, query_module.Query)):
+                lookups.append((name, self.walk(lookup)))
+            else:
+                raise Uncacheable
+        options = selection.options
+        return (
+            self.walk_names(selection.fields),
+            tuple(lookups),
+            tuple(
+                (k, self.walk_option(k, v))
+                for k, v in options.get('where', {}).items()
+            ),
+            self.walk_names(options.get('order', ())),
+            self.walk_limit(options.get('limit')),
+            self.walk_offset(options.get('offset'))
+        )
+
+    def walk_names(self, names):
+        if not all(isinstance(n, str) for n in names):
+            raise Uncacheable
+        return tuple(names)
+
+    def walk_session(self, session):
+        if session is None:
+            return None
+        return (
+            session.role.dbname if session.role else None,
+            self.walk_dict(session.variables)
+        )
+
+    def walk_dict(self, values):
+        return tuple((k, self.walk_value(v)) for k, v in values.items())
+
+    def walk_option(self, name, value):
+        # A null check renders its value into the SQL rather than
+        # passing it as an argument.
+        if name.endswith('__nu'):
+            return ('nu', to_bool(value))
+        return self.walk_value(value)
+
+    def walk_limit(self, value):
+        # Limits and offsets are bound as arguments, so only whether
+        # there is one shapes the SQL.
+        if value is None:
+            return None
+        return self.walk_value(value)
+
+    def walk_offset(self, value):
+        if not value:
+            return None
+        return self.walk_value(value)
+
+    def walk_value(self, value):
+        if isinstance(value, (Q, query_module.Query)):
+            return self.walk(value)
+        elif isinstance(value, bool):
+            return (bool, value, self.add_value(value))
+        elif isinstance(value, PARAMETER_TYPES):
+            return (type(value), self.add_value(value))
+        raise Uncacheable
+
+    def add_value(self, value):
+        index = self.identities.setdefault(id(value), len(self.values))
+        self.values.append(value)
+        return index
+
+    def make_plan(self, args):
+        """ Map each compiled argument back to the index of the value
+        it came from. Returns None if any argument can't be found,
+        meaning it was derived from a value rather than passed
+        through.
+        """
+        plan = []
+        for arg in args:
+            index = self.identities.get(id(arg))
+            if index is None:
+                return None
+            plan.append(index)
+        return tuple(plan)
+
+
+class CompiledQuery:
+    """ A cached compilation. Session settings, if any, are held
+    apart from the main statement in `prefix`, taking the first
+    `prefix_size` arguments, so that the statement may be prepared.
+    """
+    def __init__(self, sql, plan, relations, prefix=None, prefix_size=0):
+        self.sql = sql
+        self.plan = plan
+        self.relations = relations
+        self.prefix = prefix
+        self.prefix_size = prefix_size
+        self.tables = frozenset()
+        self.written_tables = frozenset()
+        self.statement = sql[len(prefix) + 2:] if prefix else sql
+        self.name = f'polecat_{next(statement_counter)}'
+        self.uses = 1
+        self.preparable = True
+        # Set once dropped from the cache, for its prepared statements
+        # to be deallocated.
+        self.evicted = False
+
+    def bind(self, values):
+        return tuple(values[i] for i in self.plan)
+
+
+class SQLCache:
+    """ A least-recently-used cache of compiled SQL, keyed on query
+    shape.
+
+    Queries that differ only in their parameter values share an entry
+    holding the SQL text and a plan for extracting arguments from the
+    query, letting them skip strategy parsing and SQL composition
+    entirely. Queries whose shape can't be determined, or whose
+    compiled arguments don't come straight from their values, are
+    always compiled.
+    """
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return default_config.db_sql_cache_size
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.max_size, len(self))
+
+    def clear(self):
+        with self.lock:
+            for entry in self.entries.values():
+                evict(entry)
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def compile(self, builder, context=None):
+        """ Compile `builder`, returning SQL and its arguments. SQL
+        text can only be rendered given a connection or cursor as
+        `context`; without one the cache is bypassed.
+        """
+        return self.lookup(builder, context)[:2]
+
+    def lookup(self, builder, context=None):
+        """ As `compile`, but also return the cache entry used, if
+        any.
+        """
+        return self.lookup_expression(builder, context)[:3]
+
+    def split(self, builder, context):
+        """ As `compile`, but with any session statements held apart
+        from the query itself, returning `(prefix, prefix_args, sql,
+        args)`. Useful where only a single statement is allowed, such
+        as when declaring a cursor.
+        """
+        sql, args, entry, expr = self.lookup_expression(builder, context)
+        if entry is not None:
+            size = entry.prefix_size
+            return entry.prefix, args[:size], entry.statement, args[size:]
+        prefix, size = self.get_prefix(expr, context)
+        if prefix is not None:
+            sql = expr.expressions[-1].to_sql()[0]
+            return prefix, args[:size], sql.as_string(context), args[size:]
+        return None, (), sql.as_string(context), args
+
+    def lookup_expression(self, builder, context=None):
+        # Returns the built expression as a fourth value, or None if
+        # SQL came from the cache.
+        if context is None or not self.max_size:
+            expr = self.build(builder, context)[0]
+            return expr.to_sql() + (None, expr)
+        shape = Shape.from_query(builder)
+        if shape is None:
+            expr = self.build(builder, context)[0]
+            return expr.to_sql() + (None, expr)
+        entry = self.get(shape.key)
+        if entry is not None and entry is not UNCACHEABLE:
+            entry.uses += 1
+            tracking.add_tables(entry.tables, entry.written_tables)
+            return entry.sql, entry.bind(shape.values), entry, None
+        expr, strategy = self.build(builder, context)
+        sql, args = expr.to_sql()
+        if entry is UNCACHEABLE:
+            return sql, args, None, expr
+        plan = shape.make_plan(args) if strategy.cacheable else None
+        if plan is None:
+            self.put(shape.key, UNCACHEABLE)
+            return sql, args, None, expr
+        entry = CompiledQuery(
+            sql.as_string(context), plan, shape.relations,
+            *self.get_prefix(expr, context)
+        )
+        entry.tables = frozenset(strategy.tables)
+        entry.written_tables = frozenset(strategy.written_tables)
+        self.put(shape.key, entry)
+        return entry.sql, args, entry, expr
+
+    def build(self, builder, context=None):
+        strategy = Strategy()
+        expr = strategy.parse(builder)
+        if context is not None:
+            # Only queries compiled to be run are tracked.
+            tracking.add_tables(strategy.tables, strategy.written_tables)
+        return expr, strategy
+
+    def get_prefix(self, expr, context):
+        # Sessions are applied with a run of "SET LOCAL" statements
+        # ahead of the query itself.
+        if not isinstance(expr, Multi):
+            return None, 0
+        sql, args = Multi(*expr.expressions[:-1]).to_sql()
+        return sql.as_string(context), len(args)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry is UNCACHEABLE:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                evict(self.entries.popitem(last=False)[1])
+
+
+def evict(entry):
+    if entry is not UNCACHEABLE:
+        entry.evicted = True
+
+
+sql_cache = SQLCache()
@@ -0,0 +1,18 @@
+from psycopg2.sql import SQL, Identifier
+
+from .expression import Expression
+
+
+class Aggregate(Expression):
+    def __init__(self, function, column=None, distinct=False):
+        self.function = function
+        self.column = column
+        self.distinct = distinct
+
+    def to_sql(self):
+        column = SQL('*') if self.column is None else Identifier(self.column)
+        return SQL('{}({}{})').format(
+            SQL(self.function),
+            SQL('DISTINCT ' if self.distinct else ''),
+            column
+        ), ()
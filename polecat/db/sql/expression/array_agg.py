@@ -4,13 +4,20 @@ from .expression import Expression
 
 
 class ArrayAgg(Expression):
-    def __init__(self, term):
+    def __init__(self, term, order=None):
         super().__init__(term)
         self.expression = self.term  # TODO: Deprecate
+        self.order = order
 
     def to_sql(self):
         expr_sql, expr_args = self.expression.to_sql()
+        if self.order is None:
+            return (
+                SQL('array_agg({})').format(expr_sql),
+                expr_args
+            )
+        order_sql, order_args = self.order.to_sql()
         return (
-            SQL('array_agg({})').format(expr_sql),
-            expr_args
+            SQL('array_agg({} ORDER BY {})').format(expr_sql, order_sql),
+            expr_args + order_args
         )
@@ -0,0 +1,64 @@
+import json
+from functools import partial
+
+from psycopg2.extras import Json
+from psycopg2.sql import SQL, Identifier, Placeholder
+
+from ..postgres import Point
+from .insert import Insert
+
+
+def json_default(value):
+    if isinstance(value, Point):
+        return f'({value.x}, {value.y})'
+    return str(value)
+
+
+class BulkUpdate(Insert):
+    """ Update many rows from one JSON parameter. Postgres expands the
+    rows into the table's own row type, so values don't need casting
+    to each column's type.
+    """
+
+    def __init__(self, relation, values, key='id', returning=None):
+        super().__init__(relation, values, returning=returning)
+        self.key = key
+
+    def to_sql(self):
+        alias = Identifier(self.relation.alias)
+        column_names = [c for c in self.values.columns if c != self.key]
+        sql = SQL(
+            'UPDATE {} SET ({}) = ROW ({}) FROM json_populate_recordset(NULL::{}, {}) AS {}'
+            ' WHERE {}.{} = {}.{} RETURNING {}'
+        ).format(
+            alias,
+            SQL(', ').join(map(Identifier, column_names)),
+            SQL(', ').join(
+                SQL('{}.{}').format(Identifier('v'), Identifier(c))
+                for c in column_names
+            ),
+            alias,
+            Placeholder(),
+            Identifier('v'),
+            alias,
+            Identifier(self.key),
+            Identifier('v'),
+            Identifier(self.key),
+            SQL(', ').join(
+                SQL('{}.{} AS {}').format(alias, Identifier(c), Identifier(c))
+                for c in self.returning
+            )
+        )
+        return sql, (self.get_rows_json(),)
+
+    def get_rows_json(self):
+        get_column = self.relation.get_column
+        columns = [get_column(c) for c in self.values.columns]
+        rows = [
+            {
+                c.name: c.to_db_value(v)
+                for c, v in zip(columns, row)
+            }
+            for row in self.values.values
+        ]
+        return Json(rows, dumps=partial(json.dumps, default=json_default))
@@ -4,8 +4,10 @@ from .expression import Expression
 
 
 class Count(Expression):
-    def __init__(self, expression=None):
+    def __init__(self, expression=None, over=False):
         self.expression = expression
+        # Count every row of the result, alongside each of them.
+        self.over = over
 
     def to_sql(self):
-        return SQL('COUNT(*)'), ()
+        return SQL('COUNT(*) OVER ()' if self.over else 'COUNT(*)'), ()
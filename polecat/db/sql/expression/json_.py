@@ -1,4 +1,4 @@
-from psycopg2.sql import SQL
+from psycopg2.sql import SQL, Literal
 
 from .expression import Expression
 
@@ -15,3 +15,30 @@ class JSON(Expression):
 
     def push_selection(self, selection=None):
         self.expression.push_selection(selection)
+
+
+class JSONObject(Expression):
+    """ Select a single JSON object holding, under each name, an array
+    of the rows of a relation.
+    """
+    returning = None
+
+    def __init__(self, relations):
+        self.relations = relations
+
+    def to_sql(self):
+        fields_sql = []
+        args = ()
+        for name, relation in self.relations:
+            relation_sql, relation_args = relation.to_sql()
+            fields_sql.append(SQL(
+                "{}, (SELECT coalesce(json_agg(row_to_json(__m)), '[]')"
+                " FROM {} AS __m)"
+            ).format(Literal(name), relation_sql))
+            args += relation_args
+        return SQL('SELECT json_build_object({})').format(
+            SQL(', ').join(fields_sql)
+        ), args
+
+    def push_selection(self, selection=None):
+        pass
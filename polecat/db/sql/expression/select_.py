@@ -3,12 +3,14 @@ from itertools import chain
 from polecat.utils import to_tuple
 from psycopg2.sql import SQL, Identifier
 
+from .as_ import As
 from .expression import Expression
 
 
 class Select(Expression):
     def __init__(self, relation, columns=None, subqueries=None, joins=None,
-                 where=None, limit=None, order=None):
+                 where=None, limit=None, order=None, offset=None, seek=None,
+                 group_by=None):
         self.relation = relation
         self.columns = columns or ()
         self.subqueries = subqueries or {}
@@ -16,6 +18,9 @@ class Select(Expression):
         self.where = where
         self.limit = limit
         self.order = to_tuple(order)
+        self.offset = offset
+        self.seek = seek
+        self.group_by = to_tuple(group_by)
 
     @property
     def root_relation(self):
@@ -27,17 +32,24 @@ class Select(Expression):
         rel_sql, rel_args = self.relation.to_sql()
         joins_sql, joins_args = self.get_all_joins_sql()
         where_sql, where_args = self.get_where_sql()
-        limit_sql = self.get_limit_sql()
+        group_by_sql = self.get_group_by_sql()
+        limit_sql, limit_args = self.get_limit_sql()
+        offset_sql, offset_args = self.get_offset_sql()
         order_sql = self.get_order_sql()
-        sql = SQL('SELECT {} FROM {}{}{}{}{}').format(
+        sql = SQL('SELECT {} FROM {}{}{}{}{}{}{}').format(
             SQL(', ').join(chain(columns_sql, all_subquery_sql)),
             rel_sql,
             joins_sql,
             where_sql,
+            group_by_sql,
             order_sql,
-            limit_sql
+            limit_sql,
+            offset_sql
+        )
+        return sql, (
+            columns_args + all_subquery_args + rel_args + joins_args +
+            where_args + limit_args + offset_args
         )
-        return sql, columns_args + all_subquery_args + rel_args + joins_args + where_args
 
     def get_subquery_sql(self):
         all_subquery_sql = []
@@ -92,18 +104,112 @@ class Select(Expression):
         return join.to_sql()
 
     def get_where_sql(self):
+        conditions = []
+        args = ()
         if self.where:
             sql, args = self.where.get_sql(self.relation)
-            return SQL(' WHERE {}').format(sql), args
+            conditions.append(sql)
+        if self.seek is not None:
+            sql, seek_args = self.get_seek_sql()
+            conditions.append(sql)
+            args += seek_args
+        if conditions:
+            return SQL(' WHERE {}').format(SQL(' AND ').join(conditions)), args
         else:
             return SQL(''), ()
 
+    def get_seek_sql(self):
+        # Keyset pagination: the rows after the last one seen, in the
+        # order of the query. Nulls sort last, or first when
+        # descending.
+        if len(self.seek) != len(self.order):
+            raise ValueError('Seek values must match the order columns')
+        names = [o.lstrip('-') for o in self.order]
+        columns = [
+            SQL('{}.{}').format(Identifier(self.relation.alias), Identifier(n))
+            for n in names
+        ]
+        descending = [o[0] == '-' for o in self.order]
+        nullable = [self.is_nullable(n) for n in names]
+        if len(set(descending)) == 1 and not any(nullable) and None not in self.seek:
+            # A row comparison, which an index on the order columns
+            # can satisfy directly.
+            sql = SQL('({}) {} ({})').format(
+                SQL(', ').join(columns),
+                SQL('<' if descending[0] else '>'),
+                SQL(', ').join(SQL('%s') for _ in self.seek)
+            )
+            return sql, tuple(self.seek)
+        # Otherwise, any column may be past its value, with those
+        # before it equal to theirs.
+        conditions = []
+        args = ()
+        equal = []
+        equal_args = ()
+        for column, desc, null, value in zip(
+            columns, descending, nullable, self.seek
+        ):
+            value_args = () if value is None else (value,)
+            if value is None:
+                past = SQL('{} IS NOT NULL').format(column) if desc else None
+            elif desc:
+                past = SQL('{} < %s').format(column)
+            elif null:
+                past = SQL('({} > %s OR {} IS NULL)').format(column, column)
+            else:
+                past = SQL('{} > %s').format(column)
+            if past is not None:
+                conditions.append(SQL(' AND ').join(equal + [past]))
+                args += equal_args + value_args
+            equal.append(
+                SQL('{} IS NULL' if value is None else '{} = %s').format(column)
+            )
+            equal_args += value_args
+        if not conditions:
+            return SQL('FALSE'), ()
+        sql = SQL('({})').format(SQL(' OR ').join(
+            SQL('({})').format(c) for c in conditions
+        ))
+        if not nullable[0] and self.seek[0] is not None:
+            # Bounds the first column, for an index to start from.
+            sql = SQL('{} {} %s AND {}').format(
+                columns[0], SQL('<=' if descending[0] else '>='), sql
+            )
+            args = (self.seek[0],) + args
+        return sql, args
+
+    def is_nullable(self, name):
+        try:
+            column = self.relation.get_column(name)
+        except (AttributeError, KeyError, NotImplementedError):
+            return True
+        return getattr(column, 'null', True)
+
+    def get_group_by_sql(self):
+        if self.group_by:
+            return SQL(' GROUP BY {}').format(SQL(', ').join(
+                SQL('{}.{}').format(
+                    Identifier(self.relation.alias),
+                    Identifier(name)
+                )
+                for name in self.group_by
+            ))
+        else:
+            return SQL('')
+
     def get_limit_sql(self):
+        # Bound rather than rendered, so every page shares the same
+        # SQL, and its cached compilation.
         if self.limit is not None:
-            # TODO: Is this risky?
-            return SQL(f' LIMIT {int(self.limit)}')
+            return SQL(' LIMIT %s'), (to_int(self.limit),)
         else:
-            return SQL('')
+            return SQL(''), ()
+
+    def get_offset_sql(self):
+        if self.offset:
+            return SQL(' OFFSET %s'), (to_int(self.offset),)
+        else:
+            return SQL(''), ()
 
     def get_order_sql(self):
         if self.order:
@@ -124,6 +230,11 @@ class Select(Expression):
         for name in self.subqueries.keys():
             yield name
 
+    def iter_selected_names(self):
+        for column in to_tuple(self.columns):
+            yield column.alias if isinstance(column, As) else column
+        yield from self.subqueries.keys()
+
     def get_column(self, name):
         # TODO: Not sure a select should be running "get_column".
         return self.relation.get_column(name)
@@ -135,12 +246,14 @@ class Select(Expression):
         from ...schema import ReverseColumn, QueryColumn
         # TODO: Efficiency. Everything.
         for column_name in selection or ():
-            if column_name not in self.columns and column_name not in self.subqueries:
+            if column_name not in self.iter_selected_names():
                 self.columns += (column_name,)
         # TODO: Forgot that columns can be a subquery. I'll need to
         # allow subqueries to return a list columns they require. For
         # now, skip it.
-        to_push = self.columns if isinstance(self.columns, (tuple, list)) else ()
+        to_push = tuple(
+            c for c in self.columns if isinstance(c, str)
+        ) if isinstance(self.columns, (tuple, list)) else ()
         for column_name in self.subqueries.keys():
             try:
                 column = self.relation.get_column(column_name)
@@ -150,6 +263,14 @@ class Select(Expression):
                 to_push += (column_name,)
         if self.where:
             to_push += self.where.get_primary_columns()
+        to_push += tuple(o.lstrip('-') for o in self.order)
+        to_push += self.group_by
         self.relation.push_selection(to_push)
         for join in self.joins:
             join.push_selection()
+
+
+def to_int(value):
+    # Integers are passed through as they are, so the cache can map
+    # them back to the query's values.
+    return value if isinstance(value, int) else int(value)
@@ -1,10 +1,12 @@
 import re
+from copy import copy
 
 import ujson
 from psycopg2.sql import SQL, Composable, Identifier
 
 from polecat.utils import to_bool, to_tuple
 from ...schema.column import ReverseColumn
+from .as_ import As
 from .expression import Expression
 
 
@@ -28,13 +30,15 @@ class Where:
 
     def parse_input(self, args, kwargs):
         root = None
+        filters = []
         for k, v in kwargs.items():
             m = self.FILTER_PROG.match(k)
             if not m:
                 raise ValueError(f'Unable to match filter condition: {k}')
             target = m.group(1)
             lookup, flt_cls = self.parse_target(target)
-            flt = flt_cls(self, lookup, v)
+            filters.append(flt_cls(self, lookup, v))
+        for flt in SemiJoin.group(filters):
             if root is None:
                 root = flt
             else:
@@ -74,9 +78,9 @@ class FilterType:
         self.parse_value(filter, value)
 
     def get_sql(self, filter):
-        sql, args = self.eval(filter)
-        sql = self.eval_joins(filter, sql)
-        return sql, args
+        if self.joins:
+            return SemiJoin.group([self])[0].get_sql(filter)
+        return self.eval(filter)
 
     def eval(self, filter):
         pass
@@ -85,39 +89,6 @@ class FilterType:
         #     val = val.format(**filter.context)
         # values.append(val)
 
-    def eval_joins(self, filter, condition):
-        if not self.joins:
-            return condition
-        sql = '%s'
-        relation = filter.relation
-        args = []
-        for i, joined_column_name in enumerate(self.joins):
-            # TODO: Handle m2m, reverse fk, reverse m2m.
-            column = relation.get_column(joined_column_name)
-            if isinstance(column, ReverseColumn):
-                prev_tbl_name = relation.alias
-                prev_col_name = 'id'
-                col_name = column.related_column.name
-            else:
-                prev_tbl_name = relation.alias
-                prev_col_name = column.name
-                col_name = 'id'
-            relation = column.related_table
-            tbl = relation.alias
-            # TODO: Use Identifier
-            # TODO: PK field other than 'id'.
-            next = 'EXISTS (SELECT 1 FROM {} WHERE {} = {} AND %s)'
-            args.extend([
-                Identifier(tbl),
-                SQL('{}.{}').format(Identifier(prev_tbl_name), Identifier(prev_col_name)),
-                SQL('{}.{}').format(Identifier(tbl), Identifier(col_name))
-            ])
-            sql = sql % next
-        sql = sql % '{}'
-        args.append(condition)
-        sql = SQL(sql).format(*args)
-        return sql
-
     def parse_lookup(self, lookup):
         lookup_parts = lookup.split('__')
         if len(lookup_parts) < 1:
@@ -226,28 +197,34 @@ class ContainsInsensitive(Contains):
         return 'ILIKE'
 
 
-class Less(FilterType):
+class Comparison(FilterType):
+    operator = None
+
     def eval(self, filter):
         super().eval(filter)
-        return self.format('{} < %s', self.field)
+        try:
+            tbl, col = self.get_table_column(filter)
+        except KeyError:
+            raise ValueError(f'invalid attribute: {self.field}')
+        return self.format(
+            '{}.{} {} %s', Identifier(tbl), Identifier(col), SQL(self.operator)
+        )
 
 
-class Greater(FilterType):
-    def eval(self, filter):
-        super().eval(filter)
-        return self.format('{} > %s', self.field)
+class Less(Comparison):
+    operator = '<'
 
 
-class LessEqual(FilterType):
-    def eval(self, filter):
-        super().eval(filter)
-        return self.format('{} <= %s', self.field)
+class Greater(Comparison):
+    operator = '>'
 
 
-class GreaterEqual(FilterType):
-    def eval(self, filter):
-        super().eval(filter)
-        return self.format('{} >= %s', self.field)
+class LessEqual(Comparison):
+    operator = '<='
+
+
+class GreaterEqual(Comparison):
+    operator = '>='
 
 
 class In(FilterType):
@@ -260,7 +237,11 @@ class In(FilterType):
         return self.format('{}.{} = ANY (%s)', Identifier(tbl), Identifier(col))
 
     def parse_value(self, filter, value):
-        if isinstance(value, (list, tuple, set)):
+        # Lists are kept as given so compiled arguments can be traced
+        # back to the query's values.
+        if isinstance(value, list):
+            self.value = value
+        elif isinstance(value, (tuple, set)):
             self.value = list(value)
         else:
             try:
@@ -269,7 +250,7 @@ class In(FilterType):
                 raise ValueError(f'Unable to parse "in" filter value: {value}')
 
     def get_value(self):
-        return ([self.value],)
+        return (self.value,)
 
 
 class NotIn(In):
@@ -338,6 +319,79 @@ class TrigramSimilar(FilterType):
         return self.format('{}.{} % %s', tbl, col)
 
 
+class SemiJoin:
+    """ Rows with a row related through `column_name` meeting all of
+    `filters`, found with a single `EXISTS` subquery. Filters through
+    the same relation are gathered into one semi-join, so the related
+    table is searched once, and conditions on a reverse relation hold
+    for the same related row.
+    """
+
+    def __init__(self, column_name):
+        self.column_name = column_name
+        self.filters = []
+
+    @classmethod
+    def group(cls, filters):
+        """ Replace the filters in `filters` through relations with
+        semi-joins, one for each relation, nested by the rest of their
+        path.
+        """
+        grouped = []
+        semi_joins = {}
+        for flt in filters:
+            if not flt.joins:
+                grouped.append(flt)
+                continue
+            name = flt.joins[0]
+            semi_join = semi_joins.get(name)
+            if semi_join is None:
+                semi_join = semi_joins[name] = cls(name)
+                grouped.append(semi_join)
+            flt = copy(flt)
+            flt.joins = flt.joins[1:]
+            semi_join.filters.append(flt)
+        for semi_join in semi_joins.values():
+            semi_join.filters = cls.group(semi_join.filters)
+        return grouped
+
+    def get_sql(self, filter):
+        relation = filter.relation
+        try:
+            column = relation.get_column(self.column_name)
+        except KeyError:
+            raise ValueError(f'invalid attribute: {self.column_name}')
+        # TODO: PK field other than 'id'.
+        if isinstance(column, ReverseColumn):
+            column_name = 'id'
+            related_column_name = column.related_column.name
+        else:
+            column_name = column.name
+            related_column_name = 'id'
+        # Named for the path, so tables related to themselves don't
+        # hide the rows they're related from.
+        related = As(
+            column.related_table,
+            f'{relation.alias}__{self.column_name}'
+        )
+        filter.relation = related
+        try:
+            conditions = [f.get_sql(filter) for f in self.filters]
+        finally:
+            filter.relation = relation
+        return SQL('EXISTS (SELECT 1 FROM {} WHERE {}.{} = {}.{} AND {})').format(
+            related.to_sql()[0],
+            Identifier(relation.alias),
+            Identifier(column_name),
+            Identifier(related.alias),
+            Identifier(related_column_name),
+            SQL(' AND ').join(sql for sql, _ in conditions)
+        ), tuple(a for _, args in conditions for a in args)
+
+    def get_primary_columns(self):
+        return (self.column_name,)
+
+
 class Operator:
     def __init__(self, left, right):
         self.left = left
@@ -0,0 +1,198 @@
+from ..schema.table import Table
+from .expression.as_ import As
+from .expression.cte import CTEAs
+from .expression.json_ import JSON
+from .expression.join import Join
+from .expression.select_ import Select
+from .expression.subquery import Subquery
+from .expression.union import Union
+from .expression.where import And, Where
+
+
+class Optimizer:
+    """ Rewrites the expression tree built by a `Strategy` into one
+    that's simpler for Postgres to plan, once selections have been
+    pushed down and before it's compiled.
+
+    Chained filters and selects are each built as a subquery of the
+    one before. Those that only filter and pick columns from a table
+    are collapsed into the query reading them, merging their
+    conditions. Conditions on the columns of any other subquery are
+    pushed down into it, where it's safe to. Identical read-only
+    common expressions are only evaluated once.
+
+    The rewrites depend only on the shape of the tree, so compiled SQL
+    remains cacheable on the shape of the query.
+    """
+
+    def optimize(self, cte):
+        for expression in cte.iter_expressions():
+            self.visit(expression)
+        self.dedupe_common_expressions(cte)
+
+    def visit(self, expression):
+        if isinstance(expression, Select):
+            self.visit(expression.relation)
+            for join in expression.joins:
+                self.visit(join)
+            for subquery in expression.subqueries.values():
+                self.visit(subquery)
+            self.optimize_select(expression)
+        elif isinstance(expression, CTEAs):
+            self.visit(expression.expression)
+            self.visit(expression.recursive_expression)
+        elif isinstance(expression, (As, Subquery, JSON, Join)):
+            self.visit(expression.expression)
+        elif isinstance(expression, Union):
+            for expr in expression.expressions:
+                self.visit(expr)
+
+    def optimize_select(self, select):
+        inner = get_subquery_select(select.relation)
+        if inner is None:
+            return
+        if is_trivial_select(inner) and self.can_collapse(select, inner):
+            self.collapse(select, inner)
+        elif self.can_push_down(select, inner):
+            inner.where = merge_wheres(inner.where, select.where)
+            select.where = None
+
+    def can_collapse(self, select, inner):
+        if select.where is not None and not isinstance(select.where, Where):
+            return False
+        columns = select.columns
+        if not isinstance(columns, (tuple, list)):
+            return False
+        if not inner.columns:
+            # Everything in the table was selected.
+            return True
+        return all(
+            c in inner.columns for c in columns if isinstance(c, str)
+        )
+
+    def collapse(self, select, inner):
+        """ Read straight from the table `inner` reads from, under the
+        name given to `inner`, which anything already built may refer
+        to.
+        """
+        table = inner.relation
+        if isinstance(table, As):
+            table = table.expression
+        if not select.columns and not select.subqueries:
+            # Not everything in the table was selected.
+            select.columns = tuple(inner.columns)
+        select.relation = As(table, select.relation.alias)
+        select.where = merge_wheres(inner.where, select.where)
+
+    def can_push_down(self, select, inner):
+        """ Whether the conditions of `select` may be applied by the
+        subquery it reads from instead. The subquery must return all
+        the rows it reads, and the conditions must only refer to its
+        columns read from its relation.
+        """
+        where = select.where
+        if (
+            not isinstance(where, Where) or
+            where.root is None or
+            not isinstance(inner.where, (Where, type(None))) or
+            not isinstance(inner.columns, (tuple, list)) or
+            inner.limit is not None or
+            inner.offset or
+            inner.seek is not None or
+            inner.group_by or
+            select.seek is not None
+        ):
+            return False
+        if not all(isinstance(c, str) for c in inner.columns):
+            # Aggregates change the rows returned.
+            return False
+        return all(
+            c in inner.columns and c not in inner.subqueries
+            for c in where.get_primary_columns()
+        )
+
+    def dedupe_common_expressions(self, cte):
+        """ Drop common expressions identical to one before them,
+        pointing anything referring to them at the first instead.
+        Only selects are considered, as anything else has effects.
+        """
+        kept = []
+        for expr in cte.common_expressions:
+            if isinstance(expr.expression, Select) and not expr.recursive_expression:
+                sql, args = get_comparable_sql(expr.expression)
+                for other, other_sql, other_args in kept:
+                    if sql == other_sql and is_same_args(args, other_args):
+                        # References are compiled from the alias.
+                        expr.alias = other.alias
+                        break
+                else:
+                    kept.append((expr, sql, args))
+        cte.common_expressions = [
+            e for e in cte.common_expressions
+            if not any(e is not k and e.alias == k.alias for k, _, _ in kept)
+        ]
+
+
+def get_subquery_select(relation):
+    if (
+        isinstance(relation, As) and
+        not isinstance(relation, CTEAs) and
+        isinstance(relation.expression, Subquery) and
+        isinstance(relation.expression.expression, Select)
+    ):
+        return relation.expression.expression
+    return None
+
+
+def is_trivial_select(select):
+    """ Whether `select` only filters a table and picks some, or all,
+    of its columns.
+    """
+    relation = select.relation
+    if isinstance(relation, As) and not isinstance(relation, CTEAs):
+        relation = relation.expression
+    return (
+        isinstance(relation, Table) and
+        isinstance(select.columns, (tuple, list)) and
+        all(isinstance(c, str) for c in select.columns) and
+        not select.subqueries and
+        not select.joins and
+        not select.group_by and
+        isinstance(select.where, (Where, type(None))) and
+        select.limit is None and
+        not select.offset and
+        not select.order and
+        select.seek is None
+    )
+
+
+def merge_wheres(first, second):
+    """ A new `Where` holding the conditions of both. """
+    roots = [w.root for w in (first, second) if w is not None and w.root]
+    where = Where()
+    if roots:
+        where.root = roots[0] if len(roots) == 1 else And(*roots)
+    return where
+
+
+def get_comparable_sql(select):
+    """ Compile `select` with the name given to its relation left out,
+    as it's only referred to within the select.
+    """
+    relation = select.relation
+    if not isinstance(relation, As) or isinstance(relation, CTEAs):
+        return select.to_sql()
+    alias = relation.alias
+    relation.alias = '__r'
+    try:
+        return select.to_sql()
+    finally:
+        relation.alias = alias
+
+
+def is_same_args(args, other_args):
+    # Arguments are only the same when they're the same objects, as
+    # any values may be bound to a cached query of the same shape.
+    return len(args) == len(other_args) and all(
+        a is b for a, b in zip(args, other_args)
+    )
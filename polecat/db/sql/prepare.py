@@ -0,0 +1,153 @@
+import re
+from itertools import count
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from polecat.core.config import default_config
+
+PLACEHOLDER_PROG = re.compile(r'%([%s])')
+
+# Bumped whenever the database schema changes, at which point any
+# statements prepared on existing connections are deallocated.
+generation = 0
+
+
+def invalidate():
+    """ Discard all prepared statements. Each connection deallocates
+    its statements the next time it's used to prepare one.
+    """
+    global generation
+    generation += 1
+
+
+def execute(cursor, sql, args, entry=None):
+    """ Execute a compiled query, using a prepared statement once its
+    cache `entry` has been seen often enough.
+    """
+    connection = cursor.connection
+    if not should_prepare(connection, entry):
+        cursor.execute(sql, args)
+        return
+    if connection.prepared_generation != generation:
+        if connection.prepared:
+            cursor.execute('DEALLOCATE ALL')
+        reset(connection)
+    if entry.name not in connection.prepared:
+        evicted = get_evicted(connection)
+        if evicted:
+            cursor.execute(get_deallocate_sql(evicted))
+            forget(connection, evicted)
+        savepoint = needs_savepoint(connection)
+        try:
+            if savepoint:
+                cursor.execute('SAVEPOINT polecat_prepare')
+            cursor.execute(get_prepare_sql(entry))
+            if savepoint:
+                cursor.execute('RELEASE SAVEPOINT polecat_prepare')
+        except psycopg2.Error:
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT polecat_prepare')
+            entry.preparable = False
+            cursor.execute(sql, args)
+            return
+        connection.prepared[entry.name] = entry
+    cursor.execute(get_execute_sql(entry, args), args)
+
+
+async def aexecute(cursor, sql, args, entry=None):
+    """ The asyncio equivalent of `execute`.
+    """
+    connection = cursor.connection
+    if not should_prepare(connection, entry):
+        await cursor.execute(sql, args)
+        return
+    if connection.prepared_generation != generation:
+        if connection.prepared:
+            await cursor.execute('DEALLOCATE ALL')
+        reset(connection)
+    if entry.name not in connection.prepared:
+        evicted = get_evicted(connection)
+        if evicted:
+            await cursor.execute(get_deallocate_sql(evicted))
+            forget(connection, evicted)
+        savepoint = needs_savepoint(connection)
+        try:
+            if savepoint:
+                await cursor.execute('SAVEPOINT polecat_prepare')
+            await cursor.execute(get_prepare_sql(entry))
+            if savepoint:
+                await cursor.execute('RELEASE SAVEPOINT polecat_prepare')
+        except psycopg2.Error:
+            if savepoint:
+                await cursor.execute('ROLLBACK TO SAVEPOINT polecat_prepare')
+            entry.preparable = False
+            await cursor.execute(sql, args)
+            return
+        connection.prepared[entry.name] = entry
+    await cursor.execute(get_execute_sql(entry, args), args)
+
+
+def should_prepare(connection, entry):
+    threshold = default_config.db_prepare_threshold
+    return (
+        threshold and
+        entry is not None and
+        entry.preparable and
+        entry.uses >= threshold and
+        # Only pooled connections track their prepared statements.
+        getattr(connection, 'prepared', None) is not None
+    )
+
+
+def needs_savepoint(connection):
+    # A failed PREPARE would otherwise abort the transaction it's in.
+    return (
+        not connection.autocommit or
+        connection.get_transaction_status() != TRANSACTION_STATUS_IDLE
+    )
+
+
+def reset(connection):
+    connection.prepared.clear()
+    connection.prepared_generation = generation
+
+
+def get_evicted(connection):
+    # Statements of entries evicted from the SQL cache are never
+    # executed again, so they're deallocated the next time the
+    # connection prepares one.
+    return [
+        name for name, entry in connection.prepared.items()
+        if entry.evicted
+    ]
+
+
+def forget(connection, names):
+    for name in names:
+        del connection.prepared[name]
+
+
+def get_deallocate_sql(names):
+    return '; '.join(f'DEALLOCATE {name}' for name in names)
+
+
+def get_prepare_sql(entry):
+    # Prepared statements use numbered parameters, and are executed
+    # without arguments, so escaped percentages are unescaped.
+    counter = count(1)
+    statement = PLACEHOLDER_PROG.sub(
+        lambda m: '%' if m.group(1) == '%' else f'${next(counter)}',
+        entry.statement
+    )
+    return f'PREPARE {entry.name} AS {statement}'
+
+
+def get_execute_sql(entry, args):
+    sql = f'EXECUTE {entry.name}'
+    if len(args) > entry.prefix_size:
+        placeholders = ', '.join(['%s'] * (len(args) - entry.prefix_size))
+        sql = f'{sql} ({placeholders})'
+    if entry.prefix:
+        sql = f'{entry.prefix}; {sql}'
+    return sql
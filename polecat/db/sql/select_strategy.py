@@ -3,17 +3,21 @@ from itertools import chain
 from polecat.utils import to_tuple
 from psycopg2.sql import SQL, Identifier
 
+from ..query.query import TOTAL_COLUMN
 from ..query.selection import Selection
 from ..schema import ReverseColumn, QueryColumn
 from .expression.alias import Alias
 from .expression.array_agg import ArrayAgg
 from .expression.as_ import As
+from .expression.count import Count
 from .expression.join import Join, LateralJoin
 from .expression.raw import RawSQL
 from .expression.select_ import Select
 from .expression.subquery import Subquery
 from .expression.where import Where
 
+ORDINAL_COLUMN = '__n'
+
 
 class SelectStrategy:
     def __init__(self, root_strategy):
@@ -64,13 +68,27 @@ class SelectStrategy:
         if selection.has_lookups():
             relation = self.create_alias_for_relation(relation)
         columns = list(self.iter_non_query_columns(relation, selection))
+        if queryable is not None and queryable.total:
+            columns.append(As(self.create_total(queryable), TOTAL_COLUMN))
         subqueries, joins = self.create_subqueries(relation, selection)
         return Select(
             relation, columns, subqueries, joins,
             limit=queryable.limit if queryable else None,
-            order=queryable.order if queryable else None
+            order=queryable.order if queryable else None,
+            offset=queryable.offset if queryable else None,
+            seek=queryable.seek if queryable else None
         )
 
+    def create_total(self, queryable):
+        if queryable.seek is None:
+            return Count(over=True)
+        # Seeking filters out the rows before the seek, which must be
+        # counted too, so the rows are counted on their own.
+        return Subquery(Select(
+            self.parse_relation(queryable.source),
+            columns=(Count(),)
+        ))
+
     def parse_relation(self, relation):
         return self.root.parse_chained_relation(relation)
 
@@ -91,6 +109,9 @@ class SelectStrategy:
         for name in selection.fields:
             column = relation.get_column(name)
             if isinstance(column, QueryColumn):
+                # Query columns are rebuilt on every access, so their
+                # values can't be traced back to the query.
+                self.root.cacheable = False
                 yield name, column.query
 
     def create_subqueries(self, relation, selection):
@@ -122,6 +143,7 @@ class SelectStrategy:
         subrelation = relation.get_subrelation(column_name)
         subquery = self.parse_query_from_components(subrelation, selection)
         self.add_where_clause_to_lateral_subquery(relation, column_name, subquery)
+        self.add_options_to_lateral_subquery(relation, column_name, subquery, selection)
         subquery = self.add_aggregation_to_lateral_subquery(relation, column_name, subquery)
         lateral_alias = self.create_alias_name_for_lateral()
         return LateralJoin(
@@ -151,16 +173,76 @@ class SelectStrategy:
                 )
             })
 
+    def add_options_to_lateral_subquery(self, relation, column_name, subquery, selection):
+        # Only the rows wanted are aggregated, so the database need
+        # not read every related row.
+        options = selection.options
+        if not options:
+            return
+        if not isinstance(relation.get_column(column_name), ReverseColumn):
+            raise ValueError(
+                f'Only reverse lookups may be filtered, ordered or limited: {column_name}'
+            )
+        where = options.get('where')
+        if where:
+            subquery.where.merge(Where(**where))
+            self.root.add_joined_tables(subquery.root_relation, where)
+        subquery.order = to_tuple(options.get('order'))
+        subquery.limit = options.get('limit')
+        subquery.offset = options.get('offset')
+
     def add_aggregation_to_lateral_subquery(self, relation, column_name, subquery):
         column = relation.get_column(column_name)
         if isinstance(column, ReverseColumn):
             agg_alias = self.create_alias_name_for_aggregate()
+            if subquery.order:
+                return self.create_ordered_aggregation(subquery, agg_alias)
             subquery = Select(
                 As(Subquery(subquery), agg_alias),
                 columns=ArrayAgg(Alias(agg_alias))
             )
         return subquery
 
+    def create_ordered_aggregation(self, subquery, agg_alias):
+        # Rows aren't guaranteed to reach the aggregate in the order of
+        # the subquery, so they're numbered there and aggregated in
+        # that order, leaving the number out of each row.
+        names = tuple(subquery.iter_selected_names())
+        if not names:
+            names = tuple(
+                c.name for c in subquery.root_relation.columns
+                if not isinstance(c, (ReverseColumn, QueryColumn))
+            )
+            subquery.columns = names
+        order_sql = SQL(', ').join(
+            SQL(subquery.parse_order_column(o)) for o in subquery.order
+        )
+        subquery.columns = to_tuple(subquery.columns) + (
+            RawSQL(SQL('row_number() OVER (ORDER BY {}) AS {}').format(
+                order_sql,
+                Identifier(ORDINAL_COLUMN)
+            )),
+        )
+        row_alias = self.create_alias_name_for_aggregate()
+        row_sql = SQL('(SELECT {} FROM (SELECT {}) AS {})').format(
+            Identifier(row_alias),
+            SQL(', ').join(
+                SQL('{}.{}').format(Identifier(agg_alias), Identifier(name))
+                for name in names
+            ),
+            Identifier(row_alias)
+        )
+        return Select(
+            As(Subquery(subquery), agg_alias),
+            columns=ArrayAgg(
+                RawSQL(row_sql),
+                order=RawSQL(SQL('{}.{}').format(
+                    Identifier(agg_alias),
+                    Identifier(ORDINAL_COLUMN)
+                ))
+            )
+        )
+
     def create_lateral_condition(self, relation, lateral_alias, column_name):
         # TODO: Replace this with something other than a raw sql string.
         column = relation.get_column(column_name)
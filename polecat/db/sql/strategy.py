@@ -1,14 +1,17 @@
+from polecat.core.config import default_config
 from psycopg2.sql import SQL, Identifier
 
 from ..query import Q
 from ..query import query as query_module
 from ..schema.role import Role
+from ..schema.table import Table
 from .delete_strategy import DeleteStrategy
+from .expression.aggregate import Aggregate
 from .expression.alias import Alias
 from .expression.as_ import As
 from .expression.cte import CTE
 from .expression.expression import Expression
-from .expression.json_ import JSON
+from .expression.json_ import JSON, JSONObject
 from .expression.multi import Multi
 from .expression.raw import RawSQL
 from .expression.select_ import Select
@@ -22,6 +25,7 @@ from .expression.max import Max
 from .expression.correlation import Correlation
 from .insert_if_missing_strategy import InsertIfMissingStrategy
 from .insert_strategy import InsertStrategy
+from .optimizer import Optimizer
 from .select_strategy import SelectStrategy
 from .update_strategy import UpdateStrategy
 
@@ -34,6 +38,12 @@ class Strategy:
         self.update_strategy = UpdateStrategy(self)
         self.delete_strategy = DeleteStrategy(self)
         self._parent_relations = []
+        # Cleared when the compiled SQL depends on more than the
+        # query's shape and values.
+        self.cacheable = True
+        # Names of the tables the query reads and writes.
+        self.tables = set()
+        self.written_tables = set()
 
     def parse(self, queryable_or_builder):
         self.cte = CTE()
@@ -43,6 +53,8 @@ class Strategy:
         expr = self.wrap_final_expression(expr)
         self.cte.set_final_expression(expr)
         self.push_selection_to_relations()
+        if default_config.db_optimize_sql:
+            Optimizer().optimize(self.cte)
         return self.wrap_with_session(queryable_or_builder)
 
     def parse_queryable_or_builder(self, queryable_or_builder, parent_relation=None):
@@ -94,6 +106,8 @@ class Strategy:
             # TODO: Update must come before Insert, as it's
             # inherited. Probably need a better way of deciding which is
             # which. Perhaps a visitor pattern?
+        elif isinstance(query, query_module.BulkUpdate):
+            expr = self.create_bulk_update(query)
         elif isinstance(query, query_module.Update):
             expr = self.create_update(query)
         elif isinstance(query, query_module.InsertIfMissing):
@@ -108,6 +122,10 @@ class Strategy:
             expr = self.create_join(query)
         elif isinstance(query, query_module.Common):
             expr = self.create_common(query)
+        elif isinstance(query, query_module.Merge):
+            expr = self.create_merge(query)
+        elif isinstance(query, query_module.Aggregate):
+            expr = self.create_aggregate(query)
         elif isinstance(query, query_module.Count):
             expr = self.create_count(query)
         elif isinstance(query, query_module.Max):
@@ -122,15 +140,23 @@ class Strategy:
         return self.select_strategy.parse_query(query)
 
     def create_insert(self, query):
+        self.add_written_table(query.source)
         return self.insert_strategy.parse_query(query)
 
     def create_insert_if_missing(self, query):
+        self.add_written_table(query.source)
         return self.insert_if_missing_strategy.parse_query(query)
 
     def create_update(self, query):
+        self.add_written_table(query.source)
         return self.update_strategy.parse_query(query)
 
+    def create_bulk_update(self, query):
+        self.add_written_table(query.source)
+        return self.update_strategy.parse_bulk_query(query)
+
     def create_delete(self, query):
+        self.add_written_table(query.source)
         return self.delete_strategy.parse_query(query)
 
     def create_filter(self, query):
@@ -142,6 +168,7 @@ class Strategy:
                 k: Correlation(self._parent_relations[-1], v.field) if isinstance(v, query_module.Ref) else v
                 for k, v in query.options.items()
             })
+        self.add_joined_tables(query.source, query.options)
         return Select(
             self.parse_chained_relation(query.source),
             where=expr
@@ -174,6 +201,43 @@ class Strategy:
             self.cte.append(expr)
         return self.parse_queryable_or_builder(query.subqueries[-1])
 
+    def create_merge(self, query):
+        relations = []
+        for name, subquery in query.subqueries:
+            expr = self.parse_queryable_or_builder(subquery)
+            if not isinstance(expr, Alias):
+                expr = self.create_alias(expr)
+            relations.append((name, expr))
+        return JSONObject(relations)
+
+    def create_aggregate(self, query):
+        rel = self.parse_chained_relation(query.source)
+        aggregates = query.aggregates.items()
+        rel.push_selection(query.group_by + tuple(
+            a.column for _, a in aggregates if a.column is not None
+        ))
+        expr = Select(
+            rel,
+            columns=query.group_by + tuple(
+                As(Aggregate(a.function, a.column, a.distinct), name)
+                for name, a in aggregates
+            ),
+            group_by=query.group_by
+        )
+        if query.having or query.order or query.limit is not None or query.offset:
+            # Conditions and order apply to the aggregates, so are
+            # applied once they've been computed.
+            counter = self.chained_relation_counter
+            self.chained_relation_counter += 1
+            expr = Select(
+                As(Subquery(expr), f'r{counter}'),
+                where=Where(**query.having) if query.having else None,
+                limit=query.limit,
+                order=query.order,
+                offset=query.offset
+            )
+        return expr
+
     def create_count(self, query):
         rel = self.parse_chained_relation(query.source)
         select = rel.expression.expression
@@ -188,7 +252,10 @@ class Strategy:
 
     def parse_chained_relation(self, relation):
         # TODO: I'm not too happy about the type conditional here.
-        if isinstance(relation, (query_module.Insert, query_module.Update)):
+        mutations = (
+            query_module.Insert, query_module.Update, query_module.BulkUpdate
+        )
+        if isinstance(relation, mutations):
             return self.get_or_create_query_alias(relation)
         elif isinstance(relation, query_module.Filter):
             counter = self.chained_relation_counter
@@ -209,8 +276,37 @@ class Strategy:
                 f'r{counter}'
             )
         else:
+            self.add_table(relation)
             return relation
 
+    def add_table(self, relation):
+        if isinstance(relation, Table):
+            self.tables.add(relation.name)
+
+    def add_written_table(self, relation):
+        if isinstance(relation, query_module.Filter):
+            self.add_joined_tables(relation.source, relation.options)
+            relation = relation.source
+        if isinstance(relation, Table):
+            self.tables.add(relation.name)
+            self.written_tables.add(relation.name)
+
+    def add_joined_tables(self, relation, options):
+        # Filters on related columns read the related tables too.
+        if not isinstance(relation, Table):
+            return
+        for lookup in options:
+            current = relation
+            for name in lookup.split('__')[:-1]:
+                try:
+                    column = current.get_column(name)
+                except KeyError:
+                    break
+                current = getattr(column, 'related_table', None)
+                if not isinstance(current, Table):
+                    break
+                self.tables.add(current.name)
+
     def wrap_final_expression(self, expression):
         if isinstance(expression, Select):
             expression = JSON(Subquery(expression))
@@ -237,3 +333,51 @@ class Strategy:
             local_expressions.append(LocalVariable(key, value))
         local_expressions.append(self.cte)
         return Multi(*local_expressions)
+
+
+MUTATIONS = (
+    query_module.Insert, query_module.Update, query_module.BulkUpdate,
+    query_module.Delete
+)
+
+
+def is_read_only(queryable_or_builder):
+    """ Whether a query only reads, and so may run on a replica.
+    Expressions may contain anything, so they're assumed to write.
+    """
+    query = queryable_or_builder
+    if isinstance(query, Q):
+        return (
+            is_read_only(query.queryable) and
+            all(is_read_only(b) for b in query.iter_branches())
+        )
+    elif isinstance(query, MUTATIONS) or isinstance(query, Expression):
+        return False
+    elif isinstance(query, (query_module.Common, query_module.Merge)):
+        subqueries = query.subqueries
+        if isinstance(query, query_module.Merge):
+            subqueries = (q for _, q in subqueries)
+        return all(is_read_only(q) for q in subqueries)
+    elif isinstance(query, query_module.Select):
+        return (
+            is_read_only(query.source) and
+            is_selection_read_only(query.selection)
+        )
+    elif isinstance(query, query_module.Filter):
+        return is_read_only(query.source) and all(
+            is_read_only(v)
+            for v in query.options.values()
+            if isinstance(v, (Q, query_module.Query))
+        )
+    elif isinstance(query, query_module.Query):
+        return is_read_only(getattr(query, 'source', None))
+    return True
+
+
+def is_selection_read_only(selection):
+    return all(
+        is_selection_read_only(lookup)
+        if isinstance(lookup, query_module.Selection) else
+        is_read_only(lookup)
+        for lookup in getattr(selection, 'lookups', {}).values()
+    )
@@ -1,4 +1,5 @@
 from ..query import query as query_module
+from .expression.bulk_update import BulkUpdate
 from .expression.update import Update
 from .expression.select_ import Select
 from .expression.where import Where
@@ -30,3 +31,6 @@ class UpdateStrategy(InsertStrategy):
         if query.reverse_queries:
             expr = SubrelationOverride(expr, query.reverse_queries, self.root)
         return expr
+
+    def parse_bulk_query(self, query):
+        return BulkUpdate(query.source, query.values, key=query.key)
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+# Called with the names of the tables each query run writes to, or
+# None when any table may have changed.
+write_listeners = []
+
+
+class TableRecorder:
+    """ The names of the tables read and written by the queries run
+    while recording.
+    """
+    def __init__(self):
+        self.tables = set()
+        self.written_tables = set()
+
+
+@contextmanager
+def record_tables():
+    """ Record the tables used within. Tables recorded are also added
+    to any recording already under way.
+    """
+    recorder = TableRecorder()
+    token = current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        current_recorder.reset(token)
+        add_to_recorder(recorder.tables, recorder.written_tables)
+
+
+def add_tables(tables, written_tables=()):
+    add_to_recorder(tables, written_tables)
+    if written_tables:
+        invalidate(written_tables)
+
+
+def add_to_recorder(tables, written_tables):
+    recorder = current_recorder.get()
+    if recorder is not None:
+        recorder.tables.update(tables)
+        recorder.written_tables.update(written_tables)
+
+
+def invalidate(tables=None):
+    for listener in write_listeners:
+        listener(tables)
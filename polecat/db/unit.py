@@ -0,0 +1,315 @@
+import asyncio
+import copy
+from contextlib import asynccontextmanager, contextmanager
+
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS
+)
+
+from .connection import AsyncCursor, manager
+
+RESET_ROLE_SQL = "SELECT set_config('role', 'none', true)"
+
+
+class UnitOfWork:
+    """ Work done on one connection, in one transaction, under one
+    session. The session is set up once when the unit begins, so
+    queries under the same session skip setting it up themselves.
+    """
+
+    def __init__(self, session=None):
+        if session is not None and session.is_empty():
+            session = None
+        self.session = session
+        self.lock = None
+        self.failed = False
+
+    def matches(self, session):
+        if session is None or session.is_empty():
+            return self.session is None
+        return self.session is not None and self.session.matches(session)
+
+    def get_session_sql(self):
+        """ The statement setting up the unit's session, with its
+        arguments. Every setting is made in one round trip.
+        """
+        if self.session is None:
+            return RESET_ROLE_SQL, ()
+        role = self.session.role
+        settings = ['set_config(\'role\', %s, true)']
+        args = [role.dbname if role else 'none']
+        for key, value in self.session.variables.items():
+            settings.append('set_config(%s, %s, true)')
+            args.extend((key, to_setting(value)))
+        return f'SELECT {", ".join(settings)}', tuple(args)
+
+    def get_reset_sql(self):
+        """ The statement clearing the unit's session, for a query run
+        under another. The query's own session is set up after it.
+        """
+        settings = ['set_config(\'role\', \'none\', true)']
+        args = []
+        for key in self.session.variables:
+            settings.append('set_config(%s, \'\', true)')
+            args.append(key)
+        return f'SELECT {", ".join(settings)}', tuple(args)
+
+    def fail(self):
+        """ Roll the unit back at the end, rather than commit it. This
+        is for errors handled within, such as by GraphQL.
+        """
+        self.failed = True
+
+    def get_end_sql(self, connection):
+        if (
+            self.failed or
+            connection.get_transaction_status() == TRANSACTION_STATUS_INERROR
+        ):
+            return 'ROLLBACK'
+        return 'COMMIT'
+
+    def begin(self, cursor):
+        cursor.execute('BEGIN')
+        if self.session is not None:
+            cursor.execute(*self.get_session_sql())
+
+    async def abegin(self, cursor):
+        await cursor.execute('BEGIN')
+        if self.session is not None:
+            await cursor.execute(*self.get_session_sql())
+
+    def restore(self, cursor):
+        cursor.execute(*self.get_session_sql())
+
+    async def arestore(self, cursor):
+        await cursor.execute(*self.get_session_sql())
+
+
+class TaskLock:
+    """ A lock the task holding it may take again.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.owner = None
+        self.depth = 0
+
+    async def __aenter__(self):
+        task = asyncio.current_task()
+        if self.owner is not task:
+            await self.lock.acquire()
+            self.owner = task
+        self.depth += 1
+
+    async def __aexit__(self, *exc_info):
+        self.depth -= 1
+        if not self.depth:
+            self.owner = None
+            self.lock.release()
+
+
+def get_unit(connection):
+    return getattr(connection, 'unit', None)
+
+
+def current_unit(url=None, is_async=False):
+    """ The unit of work of the connection checked out by the caller,
+    if any.
+    """
+    url = manager.get_url(url)
+    if is_async:
+        conn = manager.async_checkouts.get().get(url)
+    else:
+        checkout = manager.get_checkouts().get(url)
+        conn = checkout[0] if checkout else None
+    return get_unit(conn) if conn is not None else None
+
+
+def to_setting(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+@contextmanager
+def unit_of_work(session=None, url=None):
+    """ Run everything within on one connection and in one
+    transaction, committed at the end or rolled back on error. It's also
+    rolled back if it failed, or its transaction was aborted by an error
+    caught within. A unit begun within another joins it.
+    """
+    with manager.connection(url) as conn:
+        if get_unit(conn) is not None:
+            yield get_unit(conn)
+            return
+        unit = UnitOfWork(session)
+        with conn.cursor() as curs:
+            unit.begin(curs)
+            conn.unit = unit
+            try:
+                yield unit
+                curs.execute(unit.get_end_sql(conn))
+            except BaseException:
+                if not conn.closed:
+                    curs.execute('ROLLBACK')
+                raise
+            finally:
+                conn.unit = None
+
+
+@asynccontextmanager
+async def async_unit_of_work(session=None, url=None):
+    """ The asyncio equivalent of `unit_of_work`. Tasks started within
+    share the connection, so their statements take turns.
+    """
+    async with manager.async_connection(url) as conn:
+        if get_unit(conn) is not None:
+            yield get_unit(conn)
+            return
+        unit = UnitOfWork(session)
+        unit.lock = TaskLock()
+        curs = AsyncCursor(conn.cursor())
+        try:
+            await unit.abegin(curs)
+            conn.unit = unit
+            try:
+                yield unit
+                await curs.execute(unit.get_end_sql(conn))
+            except BaseException:
+                if not conn.closed and not conn.isexecuting():
+                    await curs.execute('ROLLBACK')
+                raise
+            finally:
+                conn.unit = None
+        finally:
+            curs.close()
+
+
+class Savepoint:
+    """ A savepoint within a unit's transaction. It's rolled back to at
+    the end if it failed, or an error caught within aborted the
+    transaction, and released otherwise.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.failed = False
+
+    def fail(self):
+        """ Roll back to the savepoint at the end, rather than release
+        it. This is for errors handled within, such as by GraphQL.
+        """
+        self.failed = True
+
+    def get_end_sql(self, connection):
+        if (
+            self.failed or
+            connection.get_transaction_status() == TRANSACTION_STATUS_INERROR
+        ):
+            return f'ROLLBACK TO SAVEPOINT {self.name}'
+        return f'RELEASE SAVEPOINT {self.name}'
+
+
+@contextmanager
+def savepoint(name, url=None):
+    """ Run everything within under a savepoint, when within a
+    transaction, so an error rolls back only the work done within and
+    leaves the transaction usable. The `Savepoint` is yielded.
+    """
+    point = Savepoint(name)
+    with manager.connection(url) as conn:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_INTRANS:
+            yield point
+            return
+        with conn.cursor() as curs:
+            curs.execute(f'SAVEPOINT {name}')
+            try:
+                yield point
+            except BaseException:
+                if not conn.closed:
+                    curs.execute(f'ROLLBACK TO SAVEPOINT {name}')
+                raise
+            curs.execute(point.get_end_sql(conn))
+
+
+@asynccontextmanager
+async def async_savepoint(name, url=None):
+    """ The asyncio equivalent of `savepoint`. Statements of tasks
+    started within land in the savepoint too, so savepoints on the
+    same connection must be run in turn, not concurrently.
+    """
+    point = Savepoint(name)
+    async with manager.async_connection(url) as conn:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_INTRANS:
+            yield point
+            return
+        curs = AsyncCursor(conn.cursor())
+        try:
+            await curs.execute(f'SAVEPOINT {name}')
+            try:
+                yield point
+            except BaseException:
+                if not conn.closed and not conn.isexecuting():
+                    await curs.execute(f'ROLLBACK TO SAVEPOINT {name}')
+                raise
+            await curs.execute(point.get_end_sql(conn))
+        finally:
+            curs.close()
+
+
+@contextmanager
+def session_scope(builder, connection):
+    """ Yield the builder to compile for running on `connection`. Under
+    the session of the connection's unit of work, that's the builder
+    without its session, which is already in place. Any other session,
+    or none, replaces the unit's for the one query.
+    """
+    unit = get_unit(connection)
+    if unit is None:
+        yield builder
+        return
+    if unit.matches(builder.session):
+        yield without_session(builder)
+        return
+    with connection.cursor() as curs:
+        if unit.session is not None:
+            curs.execute(*unit.get_reset_sql())
+        try:
+            yield builder
+        finally:
+            # An aborted transaction is rolled back with the unit.
+            if connection.get_transaction_status() == TRANSACTION_STATUS_INTRANS:
+                unit.restore(curs)
+
+
+@asynccontextmanager
+async def async_session_scope(builder, connection):
+    unit = get_unit(connection)
+    if unit is None:
+        yield builder
+        return
+    if unit.matches(builder.session):
+        yield without_session(builder)
+        return
+    curs = AsyncCursor(connection.cursor())
+    try:
+        # Other tasks mustn't run under the replaced session.
+        async with unit.lock:
+            if unit.session is not None:
+                await curs.execute(*unit.get_reset_sql())
+            try:
+                yield builder
+            finally:
+                if connection.get_transaction_status() == TRANSACTION_STATUS_INTRANS:
+                    await unit.arestore(curs)
+    finally:
+        curs.close()
+
+
+def without_session(builder):
+    if builder.session is None:
+        return builder
+    builder = copy.copy(builder)
+    builder.session = None
+    return builder
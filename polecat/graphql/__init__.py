@@ -1,2 +1,2 @@
-from .execute import execute_query  # noqa
+from .execute import aexecute_query, execute_query  # noqa
 from .schema import build_graphql_schema  # noqa
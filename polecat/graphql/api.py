@@ -1,13 +1,41 @@
-from graphql_server import (default_format_error, encode_execution_results,
-                            run_http_query)
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from inspect import isawaitable
+from itertools import chain
 
+import ujson as json
+from graphql import ExecutionResult, GraphQLError, execute
+from graphql.execution.execute import ExecutionContext
+from graphql.language import OperationType
+from graphql_server import default_format_error, encode_execution_results
+
+from ..core.config import default_config
+from ..db.unit import async_savepoint, current_unit, savepoint
 from ..project.handler import Handler
+from .document import DocumentCache, PersistedQueries
+from .plan import Plan, RawOperation, get_planned_fields, queue_loads
 from .schema import build_graphql_schema
 
 
+class NotCacheable(Exception):
+    pass
+
+
 class GraphqlAPI(Handler):
     def prepare(self):
         self.schema = build_graphql_schema()
+        self.documents = DocumentCache(self.schema)
+        self.persisted_queries = PersistedQueries.from_config()
+        threads = default_config.graphql_threads
+        if threads and not default_config.db_async:
+            self.executor = ThreadPoolExecutor(
+                max_workers=threads,
+                thread_name_prefix='graphql'
+            )
+        else:
+            self.executor = None
 
     def match(self, event):
         # TODO: Use regex
@@ -17,31 +45,245 @@ class GraphqlAPI(Handler):
             event.request.path == '/graphql/')
 
     async def handle_event(self, event):
-        # TODO: There's no sync version of this for some reason...
-        result = await run_http_query(
-            self.schema,
-            event.request.method.lower(),
-            event.request.json,
-            # query_data=None,
-            # batch_enabled=False,
-            # catch=False,
-            context_value={
-                'event': event,
-                'session': event.session
-            }
-        )
-        is_batch = False  # TODO: How to handle this?
+        data = event.request.json
+        is_batch = isinstance(data, list)
+        operations = [
+            Operation(self, event, d)
+            for d in (data if is_batch else [data or {}])
+        ]
+        if self.executor:
+            loop = asyncio.get_event_loop()
+            # The context carries the tables read by the request.
+            results = await loop.run_in_executor(
+                self.executor,
+                partial(
+                    copy_context().run,
+                    self.execute_in_thread,
+                    event,
+                    operations
+                )
+            )
+        else:
+            results = await self.execute(event, operations)
         result = encode_execution_results(
-            result[0],
+            results,
             default_format_error,
             is_batch,
             lambda d: d  # pass-through
         )
         # TODO: This is a little ugly.
-        if result[0]['errors']:
-            result[0]['errors'] = tuple(map(format_error, result[0]['errors']))
+        for response in (result[0] if is_batch else [result[0]]):
+            if response['errors']:
+                response['errors'] = tuple(map(format_error, response['errors']))
+        return result
+
+    def get_cache_key(self, event):
+        data = event.request.json
+        is_batch = isinstance(data, list)
+        try:
+            return (is_batch,) + tuple(
+                self.get_operation_key(d)
+                for d in (data if is_batch else [data or {}])
+            )
+        except (GraphQLError, NotCacheable):
+            return None
+
+    def get_operation_key(self, data):
+        query = self.persisted_queries.resolve(data)
+        document, errors = self.documents.get(query)
+        if errors:
+            raise NotCacheable
+        for definition in document.node.definitions:
+            operation = getattr(definition, 'operation', None)
+            if operation not in (None, OperationType.QUERY):
+                raise NotCacheable
+        variables = data.get('variables')
+        if not isinstance(variables, str):
+            variables = json.dumps(variables, sort_keys=True)
+        return document.key, variables, data.get('operationName')
+
+    def is_cacheable(self, response):
+        body, status = response[0], response[1]
+        return status == 200 and not any(
+            r.get('errors') for r in (body if isinstance(body, list) else [body])
+        )
+
+    async def execute(self, event, operations):
+        if default_config.db_async:
+            return await self.execute_async(operations)
+        return self.execute_in_thread(event, operations)
+
+    def execute_in_thread(self, event, operations):
+        # Every query of the request shares the one connection.
+        with self.unit_of_work(event):
+            self.plan_raw(operations)
+            plan = self.plan(operations)
+            if plan:
+                plan.execute()
+            if len(operations) == 1:
+                return [operations[0].execute()]
+            results = []
+            for operation in operations:
+                # An operation aborting the transaction leaves the rest
+                # of the batch to run.
+                with savepoint('polecat_operation'):
+                    results.append(operation.execute())
+            return results
+
+    async def execute_async(self, operations):
+        for operation in operations:
+            operation.context['is_async'] = True
+        self.plan_raw(operations)
+        plan = self.plan(operations)
+        if plan:
+            await plan.aexecute()
+        if len(operations) == 1 or current_unit(is_async=True) is None:
+            return await asyncio.gather(*(
+                resolve_result(o.execute()) for o in operations
+            ))
+        results = []
+        for operation in operations:
+            # Savepoints of operations sharing the connection can't
+            # interleave, so they take turns.
+            async with async_savepoint('polecat_operation'):
+                results.append(await resolve_result(operation.execute()))
+        return results
+
+    def plan(self, operations):
+        if not default_config.graphql_merge_root_fields:
+            return None
+        return Plan.from_fields(chain.from_iterable(
+            o.get_planned_fields() for o in operations
+        ))
+
+    def plan_raw(self, operations):
+        if not default_config.graphql_raw_json:
+            return
+        for operation in operations:
+            operation.plan_raw()
+
+
+class Operation:
+    """ A single operation of a request, which may be a batch of
+    them.
+    """
+    def __init__(self, api, event, data):
+        self.schema = api.schema
+        self.document = None
+        self.variables = data.get('variables')
+        if isinstance(self.variables, str):
+            self.variables = json.loads(self.variables)
+        self.operation_name = data.get('operationName')
+        self.raw = None
+        try:
+            query = api.persisted_queries.resolve(data)
+            self.document, self.errors = api.documents.get(query)
+        except GraphQLError as error:
+            self.errors = [error]
+        self.context = {
+            'event': event,
+            'session': event.session,
+            'is_async': False,
+            'selectors': self.document.selectors if self.document else {}
+        }
+
+    def get_planned_fields(self):
+        if self.errors or self.raw:
+            return []
+        return get_planned_fields(
+            self.schema,
+            self.document.node,
+            self.context,
+            self.variables,
+            self.operation_name
+        )
+
+    def plan_raw(self):
+        if self.errors:
+            return
+        self.raw = RawOperation.from_operation(
+            self.schema,
+            self.document.node,
+            self.context,
+            self.variables,
+            self.operation_name
+        )
+
+    def execute(self):
+        if self.errors:
+            return ExecutionResult(None, self.errors)
+        if self.raw:
+            if self.context['is_async']:
+                return self.execute_raw_async()
+            result = self.raw.execute()
+            if result is not None:
+                return result
+        return self.execute_document()
+
+    async def execute_raw_async(self):
+        result = await self.raw.aexecute()
+        if result is None:
+            result = await resolve_result(self.execute_document())
         return result
 
+    def execute_document(self):
+        if not self.context['is_async']:
+            queue_loads(
+                self.schema,
+                self.document.node,
+                self.context,
+                self.variables,
+                self.operation_name
+            )
+        return execute(
+            self.schema,
+            self.document.node,
+            variable_values=self.variables,
+            operation_name=self.operation_name,
+            context_value=self.context,
+            execution_context_class=SavepointExecutionContext
+        )
+
+
+class SavepointExecutionContext(ExecutionContext):
+    """ Resolves each root field of a mutation under a savepoint, so
+    one that fails rolls back only its own changes, and is reported as
+    null along with its errors.
+    """
+
+    def resolve_field(self, parent_type, source, field_nodes, path):
+        if (
+            path.prev is not None or
+            self.operation.operation != OperationType.MUTATION
+        ):
+            return super().resolve_field(parent_type, source, field_nodes, path)
+        if self.context_value.get('is_async'):
+            return self.aresolve_mutation(parent_type, source, field_nodes, path)
+        n_errors = len(self.errors)
+        with savepoint('polecat_mutation') as point:
+            result = super().resolve_field(parent_type, source, field_nodes, path)
+            if len(self.errors) > n_errors:
+                point.fail()
+                result = None
+        return result
+
+    async def aresolve_mutation(self, parent_type, source, field_nodes, path):
+        n_errors = len(self.errors)
+        async with async_savepoint('polecat_mutation') as point:
+            result = await resolve_result(
+                super().resolve_field(parent_type, source, field_nodes, path)
+            )
+            if len(self.errors) > n_errors:
+                point.fail()
+                result = None
+        return result
+
+
+async def resolve_result(result):
+    if isawaitable(result):
+        result = await result
+    return result
+
 
 def format_error(error):
     original_error = getattr(error, 'original_error', None)
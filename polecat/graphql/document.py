@@ -0,0 +1,123 @@
+import hashlib
+from collections import namedtuple
+
+import ujson as json
+from graphql import GraphQLError, parse, print_ast, validate
+
+from ..core.config import default_config
+from ..utils.lru import LRU
+
+PERSISTED_QUERY_NOT_FOUND = 'PersistedQueryNotFound'
+
+# Selectors are built once per field of a document, keyed on the
+# identity of the field's node, which the cached document keeps alive.
+# The key is a hash of the document's normalized text.
+Document = namedtuple('Document', ('node', 'selectors', 'key'))
+
+
+def get_query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    """ A least-recently-used cache of parsed and validated GraphQL
+    documents, keyed on query text, so repeated queries skip straight
+    to execution.
+    """
+    def __init__(self, schema, max_size=None):
+        self.schema = schema
+        self._max_size = max_size
+        self.documents = LRU(lambda: self.max_size)
+
+    def __len__(self):
+        return len(self.documents)
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return default_config.graphql_document_cache_size
+
+    def get(self, query):
+        """ Get the document for `query`, raising a `GraphQLError` if
+        it doesn't parse. Validation errors are returned alongside the
+        document, which is only cached when valid.
+        """
+        if not isinstance(query, str):
+            raise GraphQLError('Must provide query string.')
+        document = self.documents.get(query)
+        if document is not None:
+            return document, []
+        node = parse(query)
+        document = Document(node, {}, get_query_hash(print_ast(node)))
+        errors = validate(self.schema, document.node)
+        if not errors:
+            self.documents.set(query, document)
+        return document, errors
+
+
+class PersistedQueries:
+    """ Queries known by the SHA-256 hash of their text. Clients may
+    send just the hash of a known query. Automatic persisted queries
+    register new hashes by sending the query along with its hash
+    after a miss. With `only` set, queries that aren't already known
+    are rejected.
+    """
+    def __init__(self, queries=None, only=False, max_size=None):
+        self.queries = dict(queries or {})
+        self.only = only
+        self._max_size = max_size
+        self.registered = LRU(lambda: self.max_size)
+
+    @classmethod
+    def from_config(cls):
+        path = default_config.graphql_persisted_queries
+        queries = None
+        if path:
+            with open(path) as f:
+                queries = json.load(f)
+            if isinstance(queries, list):
+                queries = {get_query_hash(q): q for q in queries}
+        return cls(queries, only=default_config.graphql_persisted_only)
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return default_config.graphql_document_cache_size
+
+    def get(self, hash):
+        query = self.queries.get(hash)
+        if query is None:
+            query = self.registered.get(hash)
+        return query
+
+    def resolve(self, data):
+        """ Get the query text of the request `data`, raising a
+        `GraphQLError` if it can't be used.
+        """
+        query = data.get('query')
+        hash = get_hash(data)
+        if query is None:
+            if hash is None:
+                return None
+            query = self.get(hash)
+            if query is None:
+                raise GraphQLError(PERSISTED_QUERY_NOT_FOUND)
+        elif self.only:
+            if get_query_hash(query) not in self.queries:
+                raise GraphQLError('Only persisted queries may be run.')
+        elif hash is not None:
+            if get_query_hash(query) != hash:
+                raise GraphQLError('Provided sha does not match query.')
+            if hash not in self.queries:
+                self.registered.set(hash, query)
+        return query
+
+
+def get_hash(data):
+    extensions = data.get('extensions') or {}
+    if isinstance(extensions, str):
+        extensions = json.loads(extensions)
+    persisted_query = extensions.get('persistedQuery') or {}
+    return persisted_query.get('sha256Hash')
@@ -1,4 +1,4 @@
-from graphql import graphql_sync
+from graphql import graphql, graphql_sync
 
 
 def execute_query(schema, query, variables=None, reraise=False, context=None):
@@ -6,3 +6,13 @@ def execute_query(schema, query, variables=None, reraise=False, context=None):
     if reraise and result.errors:
         raise result.errors[0]
     return result
+
+
+async def aexecute_query(schema, query, variables=None, reraise=False, context=None):
+    """ The asyncio equivalent of `execute_query`, for resolvers that
+    return awaitables.
+    """
+    result = await graphql(schema, query, variable_values=variables, context_value=context)
+    if reraise and result.errors:
+        raise result.errors[0]
+    return result
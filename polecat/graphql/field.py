@@ -12,6 +12,7 @@ from graphql.type import (GraphQLArgument, GraphQLBoolean, GraphQLEnumType,
 from ..model import field, omit
 from ..utils import add_attribute, capitalize
 from .input import Input
+from .loader import Deferred
 from .registry import (FieldMetaclass, graphql_create_input_registry,
                        graphql_reverse_input_registry, graphql_type_registry,
                        graphql_update_input_registry)
@@ -62,8 +63,13 @@ class Field(metaclass=FieldMetaclass):
     def get_description(self):
         return ''
 
-    def default_resolver(self, obj, path):
-        return obj[self.model_field.name]
+    def default_resolver(self, obj, path, **kwargs):
+        # Any arguments have already been applied by the query.
+        value = obj[self.model_field.name]
+        # Query resolvers may leave values to be loaded in batches.
+        if isinstance(value, Deferred):
+            return value(path)
+        return value
 
     def from_input(self, input, graphql_type):
         name = self.model_field.cc_name
@@ -182,7 +188,22 @@ class ReverseField(RelatedField):
                 ), '_field', self
             )
         else:
-            return super().make_graphql_field()
+            graphql_field = super().make_graphql_field()
+            if graphql_field is not None:
+                graphql_field.args.update(self.build_arguments(builder))
+            return graphql_field
+
+    def build_arguments(self, builder):
+        # Applied by the database, so only the rows wanted are
+        # fetched.
+        return {
+            'filter': GraphQLArgument(
+                builder.build_filter_type(self.model_field.other)
+            ),
+            'order': GraphQLArgument(GraphQLList(GraphQLNonNull(GraphQLString))),
+            'limit': GraphQLArgument(GraphQLInt),
+            'offset': GraphQLArgument(GraphQLInt)
+        }
 
     def build_reverse_fields(self, builder):
         from .schema import ReverseModelInputBuilder
@@ -0,0 +1,165 @@
+import asyncio
+
+from polecat.model.db import Q, S
+
+
+class Loader:
+    """ Load rows of a model by id for the duration of a request. Ids
+    requested together are fetched with a single query the first time
+    any of their rows is needed, and rows are cached thereafter.
+    """
+
+    def __init__(self, model_class, selector, session=None):
+        self.model_class = model_class
+        if 'id' not in selector.fields:
+            selector = S('id', *selector.fields, **selector.lookups)
+        self.selector = selector
+        self.session = session
+        self.cache = {}
+        self.queue = set()
+        self.batch = None
+
+    def load(self, id):
+        """ Queue `id` to be fetched, returning a deferred row. Call it
+        (as GraphQL does for field values) or await it to get the row.
+        """
+        return self.load_many((id,), many=False)
+
+    def load_many(self, ids, many=True):
+        ids = tuple(ids)
+        self.queue.update(id for id in ids if id not in self.cache)
+        return Deferred(self, ids, many)
+
+    def get(self, id):
+        return self.get_many((id,))[0]
+
+    def get_many(self, ids):
+        if any(id not in self.cache for id in ids):
+            self.queue.update(ids)
+            self.dispatch()
+        return [self.cache[id] for id in ids]
+
+    async def aget(self, id):
+        return (await self.aget_many((id,)))[0]
+
+    async def aget_many(self, ids):
+        # Anything queued while a batch is in flight goes in the next
+        # one.
+        while any(id not in self.cache for id in ids):
+            self.queue.update(ids)
+            if self.batch is None:
+                self.batch = asyncio.ensure_future(self.adispatch())
+            await asyncio.shield(self.batch)
+        return [self.cache[id] for id in ids]
+
+    def prime(self, row):
+        self.cache.setdefault(row['id'], row)
+
+    def dispatch(self):
+        ids = self.take_queue()
+        if ids:
+            self.set_rows(ids, self.build_query(ids))
+
+    async def adispatch(self):
+        try:
+            ids = self.take_queue()
+            if ids:
+                self.set_rows(ids, [r async for r in self.build_query(ids)])
+        finally:
+            self.batch = None
+
+    def take_queue(self):
+        ids = [id for id in self.queue if id not in self.cache]
+        self.queue = set()
+        return ids
+
+    def build_query(self, ids):
+        return (
+            Q(self.model_class, session=self.session)
+            .filter(id__in=ids)
+            .select(self.selector)
+        )
+
+    def set_rows(self, ids, rows):
+        for row in rows:
+            self.cache[row['id']] = row
+        # Missing rows are remembered too, so they aren't asked for
+        # again.
+        for id in ids:
+            self.cache.setdefault(id, None)
+
+
+class Deferred:
+    def __init__(self, loader, ids, many):
+        self.loader = loader
+        self.ids = ids
+        self.many = many
+
+    def __call__(self, info=None, **kwargs):
+        if is_async_info(info):
+            return self.aresolve()
+        return self.resolve()
+
+    def __await__(self):
+        return self.aresolve().__await__()
+
+    def resolve(self):
+        rows = self.loader.get_many(self.ids)
+        return rows if self.many else rows[0]
+
+    async def aresolve(self):
+        rows = await self.loader.aget_many(self.ids)
+        return rows if self.many else rows[0]
+
+
+def is_async_info(info):
+    context = getattr(info, 'context', None)
+    return isinstance(context, dict) and context.get('is_async', False)
+
+
+def get_loader(context, model_class, selector, session=None):
+    """ Get the loader for `model_class` rows selected with `selector`,
+    shared by everything resolved with the same GraphQL `context`.
+    """
+    if not isinstance(context, dict):
+        return Loader(model_class, selector, session)
+    key = (model_class, get_selection_key(selector), id(session))
+    loaders = context.setdefault('loaders', {})
+    loader = loaders.get(key)
+    if loader is None:
+        loader = loaders[key] = Loader(model_class, selector, session)
+    return loader
+
+
+def get_selection_key(selection):
+    """ A key for what `selection` fetches, including the conditions,
+    order and bounds of its reverse lookups.
+    """
+    if not isinstance(selection, S):
+        return id(selection)
+    options = selection.options
+    return (
+        tuple(selection.fields),
+        tuple(
+            (name, get_selection_key(lookup))
+            for name, lookup in selection.lookups.items()
+        ),
+        tuple(sorted(
+            (name, get_value_key(value))
+            for name, value in options.get('where', {}).items()
+        )),
+        get_value_key(options.get('order', ())),
+        options.get('limit'),
+        options.get('offset')
+    )
+
+
+def get_value_key(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(get_value_key(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        # The loader holds on to its selection, so the id stays unique.
+        return id(value)
+    return value
@@ -0,0 +1,343 @@
+import logging
+
+import psycopg2
+from graphql import ExecutionResult
+from graphql.execution.execute import (ExecutionContext, add_path,
+                                       get_field_def)
+from graphql.execution.values import get_argument_values
+from graphql.language import FieldNode, OperationType
+from graphql.type import (GraphQLBoolean, GraphQLFloat, GraphQLInt,
+                          GraphQLString, get_named_type)
+from graphql.utilities import get_operation_root_type
+from polecat.db.query import Q
+from polecat.db.unit import async_savepoint, savepoint
+from polecat.model.resolver import ResolverContext
+from polecat.utils.raw_json import RawJSON
+
+from .field import Field, RelatedField, ReverseField
+from .resolve import (GraphQLAPIContext, resolve_all_connection,
+                      resolve_all_query, resolve_get_query)
+from .type import GraphQLDate, GraphQLDatetime, GraphQLUUID
+
+logger = logging.getLogger(__name__)
+
+
+def plan_root_fields(schema, document, context, variables=None,
+                     operation_name=None):
+    """ Find the root fields of a query operation that query models,
+    returning a `Plan` to fetch all of them with one statement, or
+    None if there's nothing to gain.
+    """
+    return Plan.from_fields(get_planned_fields(
+        schema, document, context, variables, operation_name
+    ))
+
+
+def get_planned_fields(schema, document, context, variables=None,
+                       operation_name=None):
+    planned_fields = []
+    root_fields = get_root_fields(
+        schema, document, context, variables, operation_name
+    )
+    for field_def, info, kwargs in root_fields or ():
+        if field_def.resolve not in PLANNED_RESOLVERS:
+            continue
+        planned_field = PlannedField.from_resolver(
+            field_def.resolve, info, kwargs
+        )
+        if planned_field is not None:
+            planned_fields.append(planned_field)
+    return planned_fields
+
+
+def queue_loads(schema, document, context, variables=None,
+                operation_name=None):
+    """ Queue the id of each root `get` field, not already fetched by a
+    plan, with its loader. Synchronous execution has no event loop
+    tick to batch them in, so each would otherwise be fetched alone.
+    """
+    plan = context.get('plan', {})
+    root_fields = get_root_fields(
+        schema, document, context, variables, operation_name
+    )
+    for field_def, info, kwargs in root_fields or ():
+        if field_def.resolve is not resolve_get_query or info.path.key in plan:
+            continue
+        api_context = GraphQLAPIContext(None, info, **kwargs)
+        api_context.get_loader().load(kwargs.get('id'))
+
+
+def get_root_fields(schema, document, context, variables=None,
+                    operation_name=None):
+    """ The definition, resolve info and arguments of each root field
+    of a query operation, or None if it isn't one.
+    """
+    exe_context = ExecutionContext.build(
+        schema, document, None, context, variables, operation_name
+    )
+    if isinstance(exe_context, list):
+        # Execution reports the errors.
+        return None
+    operation = exe_context.operation
+    if operation.operation != OperationType.QUERY:
+        return None
+    root_type = get_operation_root_type(schema, operation)
+    fields = exe_context.collect_fields(
+        root_type, operation.selection_set, {}, set()
+    )
+    root_fields = []
+    for key, field_nodes in fields.items():
+        field_def = get_field_def(schema, root_type, field_nodes[0].name.value)
+        if field_def is None:
+            continue
+        info = exe_context.build_resolve_info(
+            field_def, field_nodes, root_type, add_path(None, key)
+        )
+        kwargs = get_argument_values(
+            field_def, field_nodes[0], exe_context.variable_values
+        )
+        root_fields.append((field_def, info, kwargs))
+    return root_fields
+
+
+class Plan:
+    """ Root fields to be fetched together. Executing the plan leaves
+    each field's results in its GraphQL context, where its root
+    resolver picks them up instead of running its own query.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @classmethod
+    def from_fields(cls, fields):
+        """ Plan to fetch `fields`, which may come from several
+        operations, or return None if they can't share a statement.
+        """
+        fields = list(fields)
+        if len(fields) < 2:
+            return None
+        if len({id(f.query.session) for f in fields}) > 1:
+            return None
+        return cls(fields)
+
+    def build_query(self):
+        return Q.merge(
+            session=self.fields[0].query.session,
+            **{str(ii): f.query for ii, f in enumerate(self.fields)}
+        )
+
+    def execute(self):
+        try:
+            # Within a unit of work, the savepoint keeps its
+            # transaction usable by the fields' own queries.
+            with savepoint('polecat_plan'):
+                rows = self.build_query().get()
+        except Exception:
+            # Each field will run its own query, and report its own
+            # errors.
+            logger.warning('Plan: merged query failed', exc_info=True)
+            return
+        for ii, field in enumerate(self.fields):
+            try:
+                field.set_result(field.build_results(rows[str(ii)]))
+            except Exception:
+                continue
+
+    async def aexecute(self):
+        try:
+            async with async_savepoint('polecat_plan'):
+                rows = await self.build_query().aget()
+        except Exception:
+            logger.warning('Plan: merged query failed', exc_info=True)
+            return
+        for ii, field in enumerate(self.fields):
+            try:
+                field.set_result(await field.build_results(rows[str(ii)]))
+            except Exception:
+                continue
+
+
+class PlannedField:
+    def __init__(self, key, context, resolver_context, query):
+        self.key = key
+        self.context = context
+        self.resolver_context = resolver_context
+        self.query = query
+
+    @classmethod
+    def from_resolver(cls, resolver, info, kwargs, raw_json=False):
+        api_context = GraphQLAPIContext(None, info, **kwargs)
+        api_context.raw_json = raw_json
+        if resolver is resolve_get_query:
+            manager = api_context.model_class.Meta.get_resolver_manager
+        else:
+            api_context.is_connection = resolver is resolve_all_connection
+            manager = api_context.model_class.Meta.all_resolver_manager
+        resolver_context = ResolverContext(manager, api_context)
+        try:
+            query = resolver_context.cut_point(
+                'build_query', resolver_context, None
+            )
+        except Exception:
+            return None
+        if not isinstance(query, Q):
+            return None
+        return cls(info.path.key, info.context, resolver_context, query)
+
+    def build_results(self, rows):
+        return self.resolver_context.cut_point(
+            'build_results',
+            self.resolver_context,
+            Prefetched(self.query, rows)
+        )
+
+    def set_result(self, result):
+        self.context.setdefault('plan', {})[self.key] = result
+
+    def is_raw(self):
+        return self.resolver_context.cut_point(
+            'is_raw', self.resolver_context
+        )
+
+    def resolve(self):
+        return self.resolver_context.cut_point(
+            'build_results', self.resolver_context, self.query
+        )
+
+
+class RawOperation:
+    """ A query operation fetched as raw JSON, when nothing in it is
+    resolved in Python. The JSON built by Postgres for each root field
+    is then passed straight through to the response.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @classmethod
+    def from_operation(cls, schema, document, context, variables=None,
+                       operation_name=None):
+        root_fields = get_root_fields(
+            schema, document, context, variables, operation_name
+        )
+        if not root_fields:
+            return None
+        fields = []
+        for field_def, info, kwargs in root_fields:
+            if (
+                field_def.resolve not in RAW_RESOLVERS or
+                len(info.field_nodes) > 1 or
+                not is_raw_selection(info.return_type, info.field_nodes[0])
+            ):
+                return None
+            field = PlannedField.from_resolver(
+                field_def.resolve, info, kwargs, raw_json=True
+            )
+            if field is None or not field.is_raw():
+                return None
+            fields.append(field)
+        return cls(fields)
+
+    def execute(self):
+        """ Get the result of the operation, or None if it failed, to
+        be run as usual to report errors.
+        """
+        try:
+            with savepoint('polecat_raw'):
+                results = [(f.key, f.resolve()) for f in self.fields]
+        except psycopg2.Error:
+            logger.debug('RawOperation: query failed', exc_info=True)
+            return None
+        return ExecutionResult(RawJSON.object(results), None)
+
+    async def aexecute(self):
+        try:
+            async with async_savepoint('polecat_raw'):
+                results = [(f.key, await f.resolve()) for f in self.fields]
+        except psycopg2.Error:
+            logger.debug('RawOperation: query failed', exc_info=True)
+            return None
+        return ExecutionResult(RawJSON.object(results), None)
+
+
+def is_raw_selection(graphql_type, node):
+    """ Whether the JSON built by Postgres for the selection of `node`
+    matches what GraphQL would respond with. Each field must be named
+    as in the database, resolved as is, and be of a type serialized
+    unchanged.
+    """
+    graphql_type = get_named_type(graphql_type)
+    for selection in node.selection_set.selections:
+        if (
+            not isinstance(selection, FieldNode) or
+            selection.alias or
+            selection.directives
+        ):
+            return False
+        name = selection.name.value
+        graphql_field = graphql_type.fields.get(name)
+        field = getattr(graphql_field, '_field', None)
+        if (
+            field is None or
+            field.model_field.name != name or
+            getattr(graphql_field.resolve, '__func__', None) is not Field.default_resolver
+        ):
+            return False
+        if selection.arguments and not isinstance(field, ReverseField):
+            # Only those of reverse fields are applied by Postgres.
+            return False
+        if isinstance(field, RelatedField):
+            if not is_raw_selection(graphql_field.type, selection):
+                return False
+        elif get_named_type(graphql_field.type) not in RAW_SCALARS:
+            return False
+    return True
+
+
+class Prefetched:
+    """ Stands in for a query that's already been run, holding its
+    rows.
+    """
+
+    def __init__(self, query, rows):
+        self.queryable = query.queryable
+        self.rows = rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    async def __aiter__(self):
+        for row in self.rows:
+            yield row
+
+    def __len__(self):
+        return len(self.rows)
+
+    def stream(self, batch_size=None):
+        return iter(self.rows)
+
+    def astream(self, batch_size=None):
+        return self.__aiter__()
+
+    def get(self):
+        if len(self.rows) > 1:
+            # TODO: Better exception.
+            raise Exception('Multiple results for get query.')
+        return self.rows[0] if self.rows else None
+
+    async def aget(self):
+        return self.get()
+
+
+PLANNED_RESOLVERS = (
+    resolve_all_query, resolve_all_connection, resolve_get_query
+)
+
+RAW_RESOLVERS = (resolve_all_query, resolve_get_query)
+
+# Scalars whose values decoded from JSON are serialized unchanged.
+RAW_SCALARS = (
+    GraphQLBoolean, GraphQLDate, GraphQLDatetime, GraphQLFloat, GraphQLInt,
+    GraphQLString, GraphQLUUID
+)
@@ -1,11 +1,26 @@
-from graphql import GraphQLError
+from cached_property import cached_property
+from graphql import FieldNode, GraphQLError
+from graphql.execution.values import get_argument_values
 from graphql.type import GraphQLList
-from polecat.model.db import Q, S
+from polecat.db.query.selection import Selection
+from polecat.model.db import A, Q, S
+from polecat.model.pagination import ESTIMATED_TOTAL, EXACT_TOTAL, Pagination
 from polecat.model.resolver import APIContext
 
 from ..utils.exceptions import traceback
 from .field import RelatedField
 from .input import Input, parse_id
+from .loader import Loader, get_loader  # noqa
+
+
+NOT_PLANNED = object()
+
+AGGREGATE_FUNCTIONS = {
+    'sum': A.Sum,
+    'avg': A.Avg,
+    'min': A.Min,
+    'max': A.Max
+}
 
 
 class GraphQLAPIContext(APIContext):
@@ -16,6 +31,7 @@ class GraphQLAPIContext(APIContext):
         self.kwargs = kwargs
         self.event = self.graphql_context.get('event')
         self.session = self.graphql_context.get('session')
+        self.is_async = self.graphql_context.get('is_async', False)
 
     def parse_argument(self, name):
         return self.kwargs.get(name)
@@ -31,9 +47,8 @@ class GraphQLAPIContext(APIContext):
     def field_name(self):
         return self.info.field_name
 
-    @property
+    @cached_property
     def field(self):
-        # TODO: Cache.
         return self.info.parent_type.fields[self.field_name]
 
     @property
@@ -74,18 +89,119 @@ class GraphQLAPIContext(APIContext):
             id = None
         return id
 
+    def get_loader(self, model_class=None, selector=None):
+        """ Get the request's loader of `model_class` rows by id,
+        defaulting to the model and selection of this field.
+        """
+        return get_loader(
+            self.info.context,
+            model_class or self.model_class,
+            selector or self.selector,
+            self.session
+        )
+
     def get_selector(self):
-        return get_selector_from_node(self.return_type, self.root_node)
+        selectors = self.graphql_context.get('selectors')
+        if selectors is None:
+            return self.build_selector()
+        key = (id(self.root_node), self.is_connection)
+        selector = selectors.get(key)
+        if selector is None:
+            selector = self.build_selector()
+            uses_variables = bool(self.info.operation.variable_definitions)
+            if not (uses_variables and has_lookup_options(selector)):
+                # Otherwise it depends on the request's variables.
+                selectors[key] = selector
+        # Resolvers may alter the selector they're given.
+        return selector.copy()
+
+    def get_total(self):
+        if not self.is_connection:
+            return None
+        total = None
+        field = self.return_type.fields['totalCount']
+        for node in self.root_node.selection_set.selections:
+            if not isinstance(node, FieldNode) or node.name.value != 'totalCount':
+                continue
+            arguments = get_argument_values(field, node, self.info.variable_values)
+            if not arguments.get('estimated'):
+                return EXACT_TOTAL
+            total = ESTIMATED_TOTAL
+        return total
+
+    def get_aggregates(self):
+        return get_aggregates_from_node(self.model_class, self.root_node)
+
+    def build_selector(self):
+        if self.is_connection:
+            return get_selector_from_connection_node(
+                self.return_type,
+                self.root_node,
+                self.info.variable_values
+            )
+        return get_selector_from_node(
+            self.return_type,
+            self.root_node,
+            self.info.variable_values
+        )
+
+
+def pop_planned_result(info):
+    """ Take the result of a root field already fetched by a
+    `Plan`, if any.
+    """
+    context = info.context
+    plan = context.get('plan') if isinstance(context, dict) else None
+    if not plan or info.path.prev is not None:
+        return NOT_PLANNED
+    return plan.pop(info.path.key, NOT_PLANNED)
 
 
 def resolve_all_query(obj, info, **kwargs):
     with traceback():
+        result = pop_planned_result(info)
+        if result is not NOT_PLANNED:
+            return result
+        ctx = GraphQLAPIContext(obj, info, **kwargs)
+        return ctx.model_class.Meta.all_resolver_manager(ctx)
+
+
+def resolve_all_connection(obj, info, **kwargs):
+    with traceback():
+        result = pop_planned_result(info)
+        if result is not NOT_PLANNED:
+            return result
         ctx = GraphQLAPIContext(obj, info, **kwargs)
+        ctx.is_connection = True
         return ctx.model_class.Meta.all_resolver_manager(ctx)
 
 
+def resolve_aggregate_query(obj, info, **kwargs):
+    with traceback():
+        ctx = GraphQLAPIContext(obj, info, **kwargs)
+        return ctx.model_class.Meta.aggregate_resolver_manager(ctx)
+
+
+def resolve_aggregate_group(model_class, group, info):
+    fields = model_class.Meta.fields
+    return {fields[k].cc_name: v for k, v in group['group'].items()}
+
+
+def resolve_aggregate_values(model_class, function, group, info):
+    fields = model_class.Meta.fields
+    prefix = f'{function}__'
+    return {
+        fields[k[len(prefix):]].cc_name: v
+        for k, v in group.items()
+        if k.startswith(prefix)
+    }
+
+
 def resolve_get_query(obj, info, **kwargs):
     with traceback():
+        result = pop_planned_result(info)
+        if result is not NOT_PLANNED:
+            return result
         ctx = GraphQLAPIContext(obj, info, **kwargs)
         return ctx.model_class.Meta.get_resolver_manager(ctx)
 
@@ -130,7 +246,7 @@ def build_all_query(graphql_type, node, query=None, options=None):
     return query.select(get_selector_from_node(graphql_type, node))
 
 
-def get_selector_from_node(graphql_type, node):
+def get_selector_from_node(graphql_type, node, variables=None):
     # TODO: I'd like this to be bundled up in the GraphQL type itself,
     # as in we should call "graphql_type.polecat_fields" to get our
     # type. This means altering the instantiated GQLType during schema
@@ -147,15 +263,82 @@ def get_selector_from_node(graphql_type, node):
             raise GraphQLError(f'No field "{cc_field_name}" on type "{graphql_type}"')
         model_field = graphql_field._field.model_field
         if isinstance(graphql_field._field, RelatedField):
-            lookups[model_field.name] = get_selector_from_node(
+            lookup = get_selector_from_node(
                 graphql_field.type,
-                field_node
+                field_node,
+                variables
             )
+            if field_node.arguments:
+                apply_lookup_arguments(
+                    lookup,
+                    model_field.other,
+                    get_argument_values(graphql_field, field_node, variables)
+                )
+            lookups[model_field.name] = lookup
         else:
             fields.append(model_field.name)
     return S(*fields, **lookups)
 
 
+def apply_lookup_arguments(selection, model_class, arguments):
+    """ Filter, order and limit the rows of a reverse lookup, as given
+    by the arguments of its field.
+    """
+    where = arguments.get('filter')
+    if where:
+        cc_fields = model_class.Meta.cc_fields
+        selection.filter(**{cc_fields[k].name: v for k, v in where.items()})
+    names = ('order', 'limit', 'offset')
+    if any(arguments.get(n) is not None for n in names):
+        pagination = Pagination(model_class, **{
+            n: arguments.get(n) for n in names
+        })
+        pagination.apply_to_selection(selection)
+    return selection
+
+
+def has_lookup_options(selection):
+    return bool(selection.options) or any(
+        isinstance(lookup, Selection) and has_lookup_options(lookup)
+        for lookup in selection.lookups.values()
+    )
+
+
+def get_aggregates_from_node(model_class, node):
+    """ Aggregates selected by an aggregate query, each named by its
+    function and column, as in "sum__rating".
+    """
+    aggregates = {}
+    for field_node in node.selection_set.selections:
+        name = field_node.name.value
+        if name == 'count':
+            aggregates['count'] = A.Count()
+        elif name in AGGREGATE_FUNCTIONS:
+            for value_node in field_node.selection_set.selections:
+                cc_field_name = value_node.name.value
+                if cc_field_name == '__typename':
+                    continue
+                column = model_class.Meta.cc_fields[cc_field_name].name
+                aggregates[f'{name}__{column}'] = (
+                    AGGREGATE_FUNCTIONS[name](column)
+                )
+    return aggregates
+
+
+def get_selector_from_connection_node(graphql_type, node, variables=None):
+    # Only the nodes of a connection's edges are selected from the
+    # database.
+    edges_type = graphql_type.fields['edges'].type.of_type
+    node_type = edges_type.fields['node'].type
+    for edges_node in node.selection_set.selections:
+        if edges_node.name.value != 'edges':
+            continue
+        for node_node in edges_node.selection_set.selections:
+            if node_node.name.value == 'node':
+                return get_selector_from_node(node_type, node_node, variables)
+    return S('id')
+
+
 def resolve_query(obj, info, **kwargs):
     # graphql_field = info.parent_type.fields[info.field_name]
     # query = graphql_field._query
@@ -181,3 +364,4 @@ def resolve_mutation(obj, info, **kwargs):
     with traceback():
         ctx = GraphQLAPIContext(obj, info, **kwargs)
         return ctx.mutation.resolver_manager(ctx)
+
@@ -2,7 +2,8 @@ import inspect
 import logging
 from functools import partial
 
-from graphql.type import (GraphQLField, GraphQLInputField,
+from graphql.type import (GraphQLArgument, GraphQLBoolean, GraphQLField,
+                          GraphQLFloat, GraphQLInputField,
                           GraphQLInputObjectType, GraphQLInt, GraphQLList,
                           GraphQLNonNull, GraphQLObjectType, GraphQLSchema,
                           GraphQLString)
@@ -10,6 +11,7 @@ from polecat.model import default_blueprint
 
 from ..core.context import active_context
 from ..model import Model, omit
+from ..model.field import FloatField, IntField, QueryField, ReverseField
 from ..utils import add_attribute, capitalize, uncapitalize
 from ..utils.stringcase import camelcase
 # from .field import *  # noqa
@@ -17,7 +19,10 @@ from .registry import (add_graphql_create_input, add_graphql_type,
                        add_graphql_update_input, graphql_create_input_registry,
                        graphql_field_registry, graphql_reverse_input_registry,
                        graphql_type_registry, graphql_update_input_registry)
-from .resolve import (resolve_all_query, resolve_create_mutation,
+from .resolve import (AGGREGATE_FUNCTIONS, resolve_aggregate_group,
+                      resolve_aggregate_query, resolve_aggregate_values,
+                      resolve_all_connection, resolve_all_query,
+                      resolve_create_mutation,
                       resolve_delete_mutation, resolve_get_query,
                       resolve_mutation, resolve_query, resolve_update_mutation,
                       resolve_update_or_create_mutation)
@@ -77,6 +82,10 @@ class SchemaBuilder:
     def delete_output_type(self):
         return self.build_delete_output_type()
 
+    @property
+    def page_info_type(self):
+        return self.build_page_info_type()
+
     def build_models(self):
         logger.debug('Building GraphQL models')
         builders = []
@@ -144,6 +153,44 @@ class SchemaBuilder:
             self._delete_output_type = type
         return type
 
+    def build_page_info_type(self):
+        # TODO: Use a function cache.
+        type = getattr(self, '_page_info_type', None)
+        if not type:
+            type = GraphQLObjectType(
+                name='PageInfo',
+                fields={
+                    'hasNextPage': GraphQLField(
+                        GraphQLNonNull(GraphQLBoolean),
+                        resolve=lambda page, info: page.has_next_page
+                    ),
+                    'hasPreviousPage': GraphQLField(
+                        GraphQLNonNull(GraphQLBoolean),
+                        resolve=lambda page, info: page.has_previous_page
+                    ),
+                    'startCursor': GraphQLField(
+                        GraphQLString,
+                        resolve=lambda page, info: page.start_cursor
+                    ),
+                    'endCursor': GraphQLField(
+                        GraphQLString,
+                        resolve=lambda page, info: page.end_cursor
+                    )
+                }
+            )
+            self._page_info_type = type
+        return type
+
+    def build_filter_type(self, model):
+        # TODO: Use a function cache.
+        types = getattr(self, '_filter_types', None)
+        if types is None:
+            types = self._filter_types = {}
+        type = types.get(model)
+        if not type:
+            type = types[model] = FilterInputBuilder(self).build(model)
+        return type
+
     def run_post_build_hooks(self):
         for hook in self.post_build_hooks:
             hook()
@@ -231,10 +278,108 @@ class ModelBuilder:
         if not model.Meta.omit & omit.LIST:
             queries[self.all_query_inflection(model)] = GraphQLField(
                 GraphQLList(type),
+                self.build_pagination_arguments(),
                 resolve=resolve_all_query
             )
+            queries[self.all_connection_inflection(model)] = GraphQLField(
+                self.build_connection_type(model, type),
+                self.build_pagination_arguments(),
+                resolve=resolve_all_connection
+            )
+            queries[self.all_aggregate_inflection(model)] = GraphQLField(
+                GraphQLList(self.build_aggregate_type(model)),
+                {
+                    'groupBy': GraphQLArgument(
+                        GraphQLList(GraphQLNonNull(GraphQLString)),
+                        out_name='group_by'
+                    )
+                },
+                resolve=resolve_aggregate_query
+            )
         return queries
 
+    def build_pagination_arguments(self):
+        # Order by field names, prefixed with "-" for descending
+        # order. Cursors come from the connection edges.
+        return {
+            'order': GraphQLList(GraphQLNonNull(GraphQLString)),
+            'first': GraphQLInt,
+            'after': GraphQLString,
+            'last': GraphQLInt,
+            'before': GraphQLString,
+            'limit': GraphQLInt,
+            'offset': GraphQLInt
+        }
+
+    def build_connection_type(self, model, type):
+        edge_type = GraphQLObjectType(
+            name=f'{model.Meta.name}Edge',
+            fields={
+                'cursor': GraphQLField(GraphQLNonNull(GraphQLString)),
+                'node': GraphQLField(type)
+            }
+        )
+        return add_attribute(
+            GraphQLObjectType(
+                name=f'{model.Meta.name}Connection',
+                fields={
+                    'edges': GraphQLField(
+                        GraphQLList(edge_type),
+                        resolve=lambda page, info: page.edges
+                    ),
+                    'pageInfo': GraphQLField(
+                        GraphQLNonNull(self.schema_builder.page_info_type),
+                        resolve=lambda page, info: page
+                    ),
+                    # Rows on every page. Estimates are much quicker
+                    # for large tables, but may be off.
+                    'totalCount': GraphQLField(
+                        GraphQLInt,
+                        {
+                            'estimated': GraphQLArgument(
+                                GraphQLBoolean,
+                                default_value=False
+                            )
+                        },
+                        resolve=lambda page, info, **kwargs: page.total_count
+                    )
+                }
+            ),
+            '_model', model
+        )
+
+    def build_aggregate_type(self, model):
+        fields = {
+            'group': GraphQLField(
+                GraphQLJSON,
+                resolve=partial(resolve_aggregate_group, model)
+            ),
+            'count': GraphQLField(GraphQLInt)
+        }
+        # Only numbers are summed, averaged and compared.
+        values_fields = {
+            field.cc_name: GraphQLField(GraphQLFloat)
+            for field in model.Meta.fields.values()
+            if isinstance(field, (IntField, FloatField))
+        }
+        if values_fields:
+            values_type = GraphQLObjectType(
+                name=f'{model.Meta.name}AggregateValues',
+                fields=values_fields
+            )
+            for function in AGGREGATE_FUNCTIONS:
+                fields[function] = GraphQLField(
+                    values_type,
+                    resolve=partial(resolve_aggregate_values, model, function)
+                )
+        return add_attribute(
+            GraphQLObjectType(
+                name=f'{model.Meta.name}Aggregate',
+                fields=fields
+            ),
+            '_model', model
+        )
+
     def build_get_queries(self, model, type):
         queries = {}
         if not model.Meta.omit & omit.GET:
@@ -265,6 +410,12 @@ class ModelBuilder:
         # TODO: Not sure I need to capitalize?
         return f'all{model.Meta.plural}'
 
+    def all_connection_inflection(self, model):
+        return f'all{model.Meta.plural}Connection'
+
+    def all_aggregate_inflection(self, model):
+        return f'all{model.Meta.plural}Aggregate'
+
     def get_query_inflection(self, model, field):
         name = f'get{model.Meta.name}'
         if not field.primary_key:
@@ -467,6 +618,31 @@ class DeleteInputBuilder(InputBuilder):
             yield name, field
 
 
+class FilterInputBuilder(InputBuilder):
+    def get_type_name(self, model):
+        return f'{model.Meta.name}Filter'
+
+    def get_graphql_field(self, model, field, my_graphql_field):
+        # Related rows are filtered by ID.
+        return my_graphql_field(
+            model,
+            field,
+            input=True,
+            registry=graphql_update_input_registry  # TODO: Yuck
+        ).make_graphql_field(self.schema_builder)
+
+    def register_type(self, model, type):
+        pass
+
+    def iter_fields(self, model):
+        for name, field in model.Meta.cc_fields.items():
+            if field.omit & (omit.LIST | omit.GET):
+                continue
+            if isinstance(field, (ReverseField, QueryField)):
+                continue
+            yield name, field
+
+
 class ReverseModelInputBuilder(InputBuilder):
     def build(self, model, source_field):
         # TODO: Do I need to pass source_field around, or okay to
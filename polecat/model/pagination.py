@@ -0,0 +1,213 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from .exceptions import InvalidFieldError
+from .field import QueryField, ReverseField
+
+# Ways of counting every row of a paginated query.
+EXACT_TOTAL = 'exact'
+ESTIMATED_TOTAL = 'estimated'
+
+
+def encode_cursor(values):
+    """ Produce an opaque cursor from the order values of a row.
+    """
+    data = json.dumps(values, default=str, separators=(',', ':'))
+    return urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (AttributeError, TypeError, ValueError):
+        values = None
+    if not isinstance(values, list):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return values
+
+
+class Pagination:
+    """ Paginate an all-query, either by `limit` and `offset`, or by
+    seeking from a cursor with `first` and `after`, or `last` and
+    `before`. Cursors hold the values of the order columns, so each
+    page is found through the index on those columns rather than by
+    skipping every preceding row.
+    """
+
+    def __init__(self, model_class, order=None, first=None, after=None,
+                 last=None, before=None, limit=None, offset=None):
+        if sum(x is not None for x in (first, last, limit)) > 1:
+            raise ValueError('Only one of "first", "last" and "limit" may be used')
+        if (first is not None or after is not None) and (last is not None or before is not None):
+            raise ValueError('"first" and "after" cannot be used with "last" or "before"')
+        for name, value in (('first', first), ('last', last), ('limit', limit), ('offset', offset)):
+            if value is not None and value < 0:
+                raise ValueError(f'"{name}" must not be negative')
+        self.model_class = model_class
+        self.order = self.parse_order(order)
+        self.first = first
+        self.after = self.parse_cursor(after)
+        self.last = last
+        self.before = self.parse_cursor(before)
+        self.limit = limit
+        self.offset = offset
+
+    @classmethod
+    def from_context(cls, context):
+        return cls(context.model_class, **{
+            name: context.parse_argument(name)
+            for name in (
+                'order', 'first', 'after', 'last', 'before', 'limit', 'offset'
+            )
+        })
+
+    @property
+    def reverse(self):
+        # Pages counted from the end are fetched in reverse, then
+        # flipped back.
+        return self.last is not None or self.before is not None
+
+    def is_empty(self):
+        return all(
+            x is None for x in (
+                self.first, self.after, self.last, self.before, self.limit,
+                self.offset
+            )
+        ) and self.order_names == ('id',)
+
+    @property
+    def order_names(self):
+        return tuple(o.lstrip('-') for o in self.order)
+
+    def parse_order(self, order):
+        # The primary key breaks ties, so every row has a unique
+        # position, following the direction of the last column.
+        fields = self.model_class.Meta.fields
+        cc_fields = self.model_class.Meta.cc_fields
+        parsed = []
+        for name in order or ():
+            prefix = '-' if name[:1] == '-' else ''
+            field = cc_fields.get(name.lstrip('-')) or fields.get(name.lstrip('-'))
+            if field is None or isinstance(field, (ReverseField, QueryField)):
+                raise InvalidFieldError(self.model_class, name.lstrip('-'))
+            parsed.append(prefix + field.name)
+        if not any(o.lstrip('-') == 'id' for o in parsed):
+            prefix = '-' if parsed and parsed[-1][0] == '-' else ''
+            parsed.append(prefix + 'id')
+        return tuple(parsed)
+
+    def parse_cursor(self, cursor):
+        if cursor is None:
+            return None
+        values = decode_cursor(cursor)
+        if len(values) != len(self.order):
+            raise ValueError(f'Invalid cursor: {cursor}')
+        return values
+
+    def apply(self, query, fetch_extra=False):
+        """ Limit, order and seek the selection in `query`. With
+        `fetch_extra`, one more row than needed is fetched, so the
+        page can tell if there are more rows beyond it.
+        """
+        order = self.order
+        seek = self.after
+        if self.reverse:
+            order = tuple(o[1:] if o[0] == '-' else f'-{o}' for o in order)
+            seek = self.before
+        query = query.order(order)
+        if seek is not None:
+            query = query.seek(seek)
+        limit = next(
+            (x for x in (self.first, self.last, self.limit) if x is not None),
+            None
+        )
+        if limit is not None:
+            query = query.limit(limit + 1 if fetch_extra else limit)
+        if self.offset:
+            query = query.offset(self.offset)
+        return query
+
+    def apply_to_selection(self, selection):
+        """ Limit and order the rows of a reverse lookup selected by
+        `selection`. Cursors aren't supported.
+        """
+        selection.order(self.order)
+        if self.limit is not None:
+            selection.limit(self.limit)
+        if self.offset:
+            selection.offset(self.offset)
+        return selection
+
+    def skips_rows(self):
+        return (
+            bool(self.offset) or
+            self.after is not None or
+            self.before is not None
+        )
+
+    def page(self, rows, fetch_extra=False, total_count=None):
+        rows = list(rows)
+        limit = next(
+            (x for x in (self.first, self.last, self.limit) if x is not None),
+            None
+        )
+        more = fetch_extra and limit is not None and len(rows) > limit
+        if more:
+            rows = rows[:limit]
+        if self.reverse:
+            rows.reverse()
+            return Page(
+                self, rows,
+                has_next_page=self.before is not None,
+                has_previous_page=more,
+                total_count=total_count
+            )
+        return Page(
+            self, rows,
+            has_next_page=more,
+            has_previous_page=self.after is not None or bool(self.offset),
+            total_count=total_count
+        )
+
+    def get_cursor(self, row):
+        return encode_cursor([row[name] for name in self.order_names])
+
+
+class Page:
+    def __init__(self, pagination, rows, has_next_page=False,
+                 has_previous_page=False, total_count=None):
+        self.pagination = pagination
+        self.rows = rows
+        self.has_next_page = has_next_page
+        self.has_previous_page = has_previous_page
+        # Rows across every page, if they were counted.
+        self.total_count = total_count
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def edges(self):
+        return [
+            Edge(self.pagination.get_cursor(row), row)
+            for row in self.rows
+        ]
+
+    @property
+    def start_cursor(self):
+        if self.rows:
+            return self.pagination.get_cursor(self.rows[0])
+
+    @property
+    def end_cursor(self):
+        if self.rows:
+            return self.pagination.get_cursor(self.rows[-1])
+
+
+class Edge:
+    def __init__(self, cursor, node):
+        self.cursor = cursor
+        self.node = node
@@ -170,7 +170,8 @@ def make_model_meta(name, attrs, meta):
         CreateResolver, ResolverList, CreateResolverManager,
         UpdateResolverManager, UpdateResolver, UpdateOrCreateResolverManager,
         AllResolver, AllResolverManager, GetResolver, GetResolverManager,
-        DeleteResolver, DeleteResolverManager
+        AggregateResolver, AggregateResolverManager, DeleteResolver,
+        DeleteResolverManager
     )
     fields = {
         f.name: f
@@ -195,8 +196,10 @@ def make_model_meta(name, attrs, meta):
         'query_resolvers': ResolverList(query_resolvers),
         'all_resolvers': ResolverList(AllResolver()),
         'get_resolvers': ResolverList(GetResolver()),
+        'aggregate_resolvers': ResolverList(AggregateResolver()),
         'all_resolver_manager': AllResolverManager(),
         'get_resolver_manager': GetResolverManager(),
+        'aggregate_resolver_manager': AggregateResolverManager(),
         'mutation_resolvers': ResolverList(mutation_resolvers),
         'create_resolvers': ResolverList(create_resolvers + [CreateResolver()]),
         'update_resolvers': ResolverList(UpdateResolver()),
@@ -5,18 +5,30 @@ from itertools import chain
 
 from cached_property import cached_property
 
+from polecat.core.config import default_config
+from polecat.db.query.builder import split_total
+from polecat.db.query.query import TOTAL_COLUMN
 from polecat.utils import to_list
 
 from .defaults import default_blueprint
-from .db.query import Q
+from .db.query import A, Q, S
+from .exceptions import InvalidFieldError
 from .field import ReverseField
+from .pagination import ESTIMATED_TOTAL, EXACT_TOTAL, Pagination
 
 logger = logging.getLogger(__name__)
 
 
 class APIContext:
-    def __init__(self, event=None):
+    def __init__(self, event=None, is_async=False, is_connection=False):
         self.event = event
+        self.is_async = is_async
+        # Connections return a page of results with cursors, instead
+        # of a plain list.
+        self.is_connection = is_connection
+        # Results may be left as raw JSON when nothing is resolved in
+        # Python.
+        self.raw_json = False
         self.stack = []
 
     def parse_argument(self, name):
@@ -39,6 +51,28 @@ class APIContext:
     def get_selector(self):
         raise NotImplementedError
 
+    @cached_property
+    def total(self):
+        return self.get_total()
+
+    def get_total(self):
+        """ How every row of a connection is counted, if at all:
+        `EXACT_TOTAL`, `ESTIMATED_TOTAL` or None.
+        """
+        return None
+
+    @cached_property
+    def aggregates(self):
+        return self.get_aggregates()
+
+    def get_aggregates(self):
+        raise NotImplementedError
+
+    def get_loader(self, model_class=None, selector=None):
+        """ The request's loader of rows by id, if it has any.
+        """
+        return None
+
     def get_model(self, name):
         # TODO: This is no good. It should include the app name.
         return default_blueprint.models[name]
@@ -119,6 +153,15 @@ class AllResolverManager(ResolverManager):
         )
 
 
+class AggregateResolverManager(ResolverManager):
+    def iter_resolvers(self, context):
+        model_class = context.model_class
+        return chain(
+            model_class.Meta.query_resolvers,
+            model_class.Meta.aggregate_resolvers
+        )
+
+
 class GetResolverManager(ResolverManager):
     def iter_resolvers(self, context):
         model_class = context.model_class
@@ -249,32 +292,187 @@ class QueryResolver:
                 resolver(context, model=model, field=field, field_name=name)
         return model
 
+    def is_raw(self, context):
+        """ Whether to fetch results as raw JSON, to be passed straight
+        through to the response.
+        """
+        model_class = context.model_class
+        return (
+            context.raw_json and
+            not list(model_class.Meta.query_resolvers) and
+            not has_field_resolvers(model_class, context.selector)
+        )
+
 
 class AllResolver(QueryResolver):
     def build_query(self, context, query=None):
         query = super().build_query(context, query)
-        return query.select(context.selector)
+        context._pagination = Pagination.from_context(context)
+        # Rows are counted across every page.
+        context._unpaged = query
+        selector = context.selector
+        if context.is_connection:
+            # Cursors are made from the order columns, so they must
+            # be selected.
+            fields = tuple(selector.fields)
+            selector = S(
+                *fields,
+                *(n for n in context._pagination.order_names if n not in fields),
+                **selector.lookups
+            )
+        query = query.select(selector)
+        if context.is_connection and context.total == EXACT_TOTAL:
+            query = query.with_total()
+        if context.is_connection or not context._pagination.is_empty():
+            query = context._pagination.apply(
+                query,
+                fetch_extra=context.is_connection
+            )
+        return query
 
     def build_results(self, context, query):
-        return [
+        if self.is_raw(context):
+            return query.araw() if context.is_async else query.raw()
+        if context.is_async:
+            return self.build_results_async(context, query)
+        rows = query.stream() if self.should_stream(query) else query
+        results = [
+            context.cut_point('resolve_model_fields', context, m)
+            for m in rows
+        ]
+        total_count = None
+        if context.is_connection and context.total is not None:
+            total_count = self.build_total(context, results)
+        return self.build_page(context, results, total_count)
+
+    async def build_results_async(self, context, query):
+        rows = query.astream() if self.should_stream(query) else query
+        results = [
             context.cut_point('resolve_model_fields', context, m)
-            for m in query
+            async for m in rows
         ]
+        total_count = None
+        if context.is_connection and context.total is not None:
+            total_count = await self.build_total_async(context, results)
+        return self.build_page(context, results, total_count)
+
+    def build_page(self, context, results, total_count=None):
+        if not context.is_connection:
+            if context._pagination.reverse:
+                results.reverse()
+            return results
+        return context._pagination.page(
+            results,
+            fetch_extra=True,
+            total_count=total_count
+        )
+
+    def build_total(self, context, results):
+        if context.total == ESTIMATED_TOTAL:
+            return context._unpaged.estimate_count()
+        total = split_total(results)
+        if total is None and context._pagination.skips_rows():
+            # Past the last row, so nothing held the total.
+            total = self.count_query(context).get()[TOTAL_COLUMN]
+        return total or 0
+
+    async def build_total_async(self, context, results):
+        if context.total == ESTIMATED_TOTAL:
+            return await context._unpaged.aestimate_count()
+        total = split_total(results)
+        if total is None and context._pagination.skips_rows():
+            total = (await self.count_query(context).aget())[TOTAL_COLUMN]
+        return total or 0
+
+    def count_query(self, context):
+        return context._unpaged.aggregate(**{TOTAL_COLUMN: A.Count()})
+
+    def is_raw(self, context):
+        return (
+            super().is_raw(context) and
+            not context.is_connection and
+            not context._pagination.reverse
+        )
+
+    def should_stream(self, query):
+        # Streaming takes a round trip per batch, so it's left to
+        # projects expecting results larger than one.
+        if not default_config.db_stream_api_results:
+            return False
+        limit = getattr(query.queryable, 'limit', None)
+        return limit is None or limit > default_config.db_stream_batch_size
+
+
+class AggregateResolver(QueryResolver):
+    """ Aggregates the rows of a model, or of each group of them
+    sharing the values of the `group_by` fields. Each result holds
+    those values under "group", alongside the aggregates.
+    """
+    def build_query(self, context, query=None):
+        query = super().build_query(context, query)
+        context._group_by = parse_group_by(
+            context.model_class,
+            context.parse_argument('group_by') or ()
+        )
+        return (
+            query
+            .group_by(*context._group_by)
+            .aggregate(**context.aggregates)
+        )
+
+    def build_results(self, context, query):
+        if context.is_async:
+            return self.build_results_async(context, query)
+        return [self.build_group(context, r) for r in query]
+
+    async def build_results_async(self, context, query):
+        return [self.build_group(context, r) async for r in query]
+
+    def build_group(self, context, row):
+        return {
+            'group': {n: row.pop(n) for n in context._group_by},
+            **row
+        }
 
 
 class GetResolver(QueryResolver):
     def build_query(self, context, query=None):
         query = super().build_query(context, query)
         id = context.parse_argument('id')
-        return (
+        query = (
             query
             .filter(id=id)
             .select(context.selector)
         )
+        # Unless another resolver changes it, the row may be loaded
+        # along with others of the model.
+        context._by_id = query
+        return query
 
     def build_results(self, context, query):
+        if self.is_raw(context):
+            return query.aget_raw() if context.is_async else query.get_raw()
+        loader = self.get_loader(context, query)
+        if loader is not None:
+            row = loader.load(context.parse_argument('id'))
+            if context.is_async:
+                return self.load_async(context, row)
+            return self.resolve_model_fields(context, row())
+        if context.is_async:
+            return self.build_results_async(context, query)
         return self.resolve_model_fields(context, query.get())
 
+    async def build_results_async(self, context, query):
+        return self.resolve_model_fields(context, await query.aget())
+
+    async def load_async(self, context, row):
+        return self.resolve_model_fields(context, await row)
+
+    def get_loader(self, context, query):
+        if query is not getattr(context, '_by_id', None):
+            return None
+        return context.get_loader()
+
 
 class MutationResolver:
     def resolve(self, context):
@@ -296,6 +494,8 @@ class MutationResolver:
         )
 
     def build_results(self, context, query):
+        if context.is_async:
+            return query.aget()
         return query.get()
 
 
@@ -372,5 +572,43 @@ class DeleteResolver:
         return Q(model, session=context.session).delete()
 
     def build_results(self, context, query):
+        if context.is_async:
+            return self.build_results_async(context, query)
         query.execute()
         return {'id': context._id}
+
+    async def build_results_async(self, context, query):
+        await query.aexecute()
+        return {'id': context._id}
+
+
+def parse_group_by(model_class, names):
+    """ Column names of the fields named by `names`, which may be
+    given in camel-case.
+    """
+    group_by = []
+    for name in names:
+        field = (
+            model_class.Meta.fields.get(name) or
+            model_class.Meta.cc_fields.get(name)
+        )
+        if field is None or isinstance(field, ReverseField):
+            raise InvalidFieldError(model_class, name)
+        group_by.append(field.name)
+    return tuple(group_by)
+
+
+def has_field_resolvers(model_class, selector):
+    """ Whether any field `selector` picks from `model_class`, or from
+    the models it relates to, is resolved in Python. Selecting nothing
+    picks every field.
+    """
+    fields = model_class.Meta.fields
+    for name in tuple(selector) or tuple(fields):
+        field = fields.get(name)
+        if field is None or field.query_resolvers:
+            return True
+        lookup = selector.get(name)
+        if lookup is not None and has_field_resolvers(field.other, lookup):
+            return True
+    return False
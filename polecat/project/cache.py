@@ -0,0 +1,114 @@
+import threading
+import time
+
+import ujson as json
+
+from ..core.config import default_config
+from ..db import tracking
+from ..utils.lru import LRU
+
+# Claims that differ between tokens without changing what the bearer
+# may see.
+VOLATILE_VARIABLES = ('claims.exp', 'claims.iat', 'claims.nbf', 'claims.jti')
+
+
+class CachedResponse:
+    def __init__(self, response, tables, version, expires=None):
+        self.response = response
+        self.tables = tables
+        self.version = version
+        self.expires = expires
+
+
+class ResponseCache:
+    """ A least-recently-used cache of handler responses, keyed on the
+    request and the session it was made under. Each response is held
+    along with the tables read to produce it, and is dropped once any
+    of them are written to, or after `response_cache_ttl` seconds.
+    """
+    def __init__(self, max_size=None, ttl=None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self.entries = LRU(lambda: self.max_size)
+        self.lock = threading.Lock()
+        # Each invalidation bumps the version, and records it against
+        # the tables written.
+        self.version = 0
+        self.cleared = 0
+        self.invalidated = {}
+        tracking.write_listeners.append(self.invalidate)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return default_config.response_cache_size
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return default_config.response_cache_ttl
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if (
+            (entry.expires is not None and time.monotonic() >= entry.expires) or
+            self.is_stale(entry.tables, entry.version)
+        ):
+            self.entries.pop(key)
+            return None
+        return entry.response
+
+    def set(self, key, response, tables, version):
+        """ Cache `response`, read from `tables` by a request that
+        began at `version`. Responses that may have read a write made
+        since then are not cached.
+        """
+        if self.is_stale(tables, version):
+            return
+        ttl = self.ttl
+        expires = time.monotonic() + ttl if ttl else None
+        self.entries.set(
+            key, CachedResponse(response, frozenset(tables), version, expires)
+        )
+
+    def is_stale(self, tables, version):
+        if self.cleared > version:
+            return True
+        invalidated = self.invalidated
+        return any(invalidated.get(t, 0) > version for t in tables)
+
+    def invalidate(self, tables=None):
+        """ Drop responses read from `tables`, or every response if
+        None.
+        """
+        with self.lock:
+            self.version += 1
+            if tables is None:
+                self.cleared = self.version
+                self.entries.clear()
+                return
+            for table in tables:
+                self.invalidated[table] = self.version
+
+    def clear(self):
+        self.entries.clear()
+
+
+def get_session_key(session):
+    role = session.role.dbname if session.role else None
+    variables = {
+        k: v
+        for k, v in session.variables.items()
+        if k not in VOLATILE_VARIABLES
+    }
+    return role, json.dumps(variables, sort_keys=True)
+
+
+response_cache = ResponseCache()
@@ -1,3 +1,10 @@
+from ..core.config import default_config
+from ..db.connection import manager
+from ..db.tracking import record_tables
+from ..db.unit import async_unit_of_work, unit_of_work
+from .cache import get_session_key, response_cache
+
+
 class Handler:
     def __init__(self, project, middleware=None):
         self.project = project
@@ -12,7 +19,48 @@ class Handler:
     async def run(self, event):
         for mw in self.middleware:
             mw.run(event)
-        return await self.handle_event(event)
+        if not response_cache.max_size:
+            return await self.run_event(event)
+        key = self.get_cache_key(event)
+        if key is not None:
+            key = (type(self), get_session_key(event.session), key)
+            response = response_cache.get(key)
+            if response is not None:
+                return response
+        version = response_cache.version
+        with record_tables() as recorder:
+            response = await self.run_event(event)
+        if recorder.written_tables:
+            # Again now the writes are committed, in case a response
+            # was cached from before then.
+            response_cache.invalidate(recorder.written_tables)
+        elif key is not None and self.is_cacheable(response):
+            response_cache.set(key, response, recorder.tables, version)
+        return response
+
+    async def run_event(self, event):
+        with manager.read_your_writes():
+            if default_config.db_unit_of_work and default_config.db_async:
+                async with async_unit_of_work(event.session):
+                    return await self.handle_event(event)
+            return await self.handle_event(event)
+
+    def get_cache_key(self, event):
+        """ A key for the response to `event`, if it may be cached. The
+        event's session is added to it.
+        """
+        return None
+
+    def is_cacheable(self, response):
+        return True
+
+    def unit_of_work(self, event):
+        """ The scope for running an event's queries synchronously, on
+        one connection. Asynchronous units begin in `run`.
+        """
+        if default_config.db_unit_of_work and not default_config.db_async:
+            return unit_of_work(event.session)
+        return manager.connection()
 
     async def handle_event(self, event):
         raise NotImplementedError
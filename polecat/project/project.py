@@ -6,6 +6,8 @@ from graphql_server import HttpQueryError
 from polecat.admin.commands import *  # noqa
 from polecat.core.config import default_config
 from polecat.core.context import active_context
+from polecat.db.connection import manager
+from polecat.db.notify import handle_notification
 from polecat.db.role_prefix import set_role_prefix
 from polecat.model import default_blueprint
 from polecat.model.db.helpers import create_schema
@@ -214,6 +216,11 @@ class Project:
         pass
 
     async def handle_event(self, event):
+        channel = default_config.db_notify_channel
+        if channel:
+            # Listen from each process serving events, including those
+            # forked after preparing.
+            manager.listen(channel, handle_notification)
         for handler in self.handlers:
             if not handler.match(event):
                 continue
@@ -1,11 +1,36 @@
+import inspect
+
 from graphql_server.error import HttpQueryError
 
+from ..db.query import Q
+
 
 async def run_http_query(schema, request, context_value=None):
+    result = resolve_view(schema, request, context_value)
+    if inspect.isawaitable(result):
+        result = await result
+    if isinstance(result, Q):
+        # Views returning a query have its results passed through as
+        # raw JSON.
+        if (context_value or {}).get('is_async'):
+            result = await result.araw()
+        else:
+            result = result.raw()
+    return (result, 200)
+
+
+def run_http_query_sync(schema, request, context_value=None):
+    """ The synchronous equivalent of `run_http_query`, for running
+    within a unit of work.
+    """
+    result = resolve_view(schema, request, context_value)
+    if isinstance(result, Q):
+        result = result.raw()
+    return (result, 200)
+
+
+def resolve_view(schema, request, context_value=None):
     view = schema.match_view(request)
     if not view:
         raise HttpQueryError(404, 'Not found')
-    return (
-        view.resolve(request, context_value=context_value),
-        200
-    )
+    return view.resolve(request, context_value=context_value)
@@ -1,7 +1,8 @@
+from ..core.config import default_config
 from ..project.handler import Handler
 
 from .schema_builder import RestSchemaBuilder
-from .execute import run_http_query
+from .execute import run_http_query, run_http_query_sync
 
 
 class RestAPI(Handler):
@@ -18,15 +19,30 @@ class RestAPI(Handler):
              event.request.method == 'DELETE') and \
             event.request.path.startswith('/rest/')
 
+    def get_cache_key(self, event):
+        if event.request.method != 'GET':
+            return None
+        return event.request.path, get_query_key(event.request)
+
     async def handle_event(self, event):
-        result = await run_http_query(
-            self.schema,
-            event.request,
-            context_value={
-                'event': event,
-                'session': event.session
-            }
-        )
+        context_value = {
+            'event': event,
+            'session': event.session,
+            'is_async': default_config.db_async
+        }
+        if default_config.db_async:
+            result = await run_http_query(
+                self.schema,
+                event.request,
+                context_value=context_value
+            )
+        else:
+            with self.unit_of_work(event):
+                result = run_http_query_sync(
+                    self.schema,
+                    event.request,
+                    context_value=context_value
+                )
         # is_batch = False
         # result = encode_execution_results(
         #     result,
@@ -38,6 +54,19 @@ class RestAPI(Handler):
         return result
 
 
+def get_query_key(request):
+    """ The query parameters of `request`, sorted. Servers give them as
+    lists of values, and API Gateway as single values.
+    """
+    params = getattr(request, 'args', None)
+    if params is None:
+        params = getattr(request, 'query_parameters', None)
+    return tuple(sorted(
+        (k, tuple(v) if isinstance(v, list) else v)
+        for k, v in (params or {}).items()
+    ))
+
+
 def format_error(error):
     original_error = getattr(error, 'original_error', None)
     if original_error:
@@ -3,8 +3,8 @@ from polecat.model.resolver import APIContext
 
 
 class RestAPIContext(APIContext):
-    def __init__(self, field, event, session, **kwargs):
-        super().__init__()
+    def __init__(self, field, event, session, is_async=False, **kwargs):
+        super().__init__(is_async=is_async)
         self.field = field
         self.event = event
         self.session = session
@@ -33,7 +33,8 @@ class RestView:
         ctx = RestAPIContext(
             self.field,
             context_value.get('event'),
-            context_value.get('session')
+            context_value.get('session'),
+            is_async=context_value.get('is_async', False)
         )
         # TODO: Must unify this.
         try:
@@ -1,11 +1,18 @@
+from contextvars import ContextVar
+
 from factory import base
 from polecat.model import default_blueprint
 from polecat.model.db import Q
+from polecat.model.db.helpers import model_to_values, set_values_on_model
 
 from ...core.context import active_context
-from ...model.field import ReverseField
+from ...model.field import JSONField, ReverseField
 from .field import *  # noqa
 
+# The factory creating a batch, whose instances are inserted together
+# once they've all been created.
+batching = ContextVar('batching', default=None)
+
 
 class ModelFactory(base.Factory):
     # _options_class = FactoryOptions
@@ -13,9 +20,48 @@ class ModelFactory(base.Factory):
     @classmethod
     def _create(cls, model_class, *args, **kwargs):
         inst = model_class(*args, **kwargs)
-        Q(inst).insert().into(inst)
+        # Only instances of this exact factory are deferred; any
+        # created by sub-factories are inserted straight away.
+        if batching.get() is not cls:
+            Q(inst).insert().into(inst)
         return inst
 
+    @classmethod
+    def create_batch(cls, size, **kwargs):
+        token = batching.set(cls)
+        try:
+            instances = [cls.create(**kwargs) for _ in range(size)]
+        finally:
+            batching.reset(token)
+        insert_batch(cls._meta.model, instances)
+        return instances
+
+
+def insert_batch(model_class, instances):
+    """ Insert model instances with a single statement, falling back
+    to one at a time when they hold nested values.
+    """
+    rows = [get_batch_row(model_class, inst) for inst in instances]
+    if not rows or None in rows or any(r.keys() != rows[0].keys() for r in rows):
+        for inst in instances:
+            Q(inst).insert().into(inst)
+        return
+    for inst, values in zip(instances, Q(model_class).bulk_insert(rows)):
+        set_values_on_model(values, inst)
+
+
+def get_batch_row(model_class, inst):
+    row = model_to_values(inst)
+    for name, field in model_class.Meta.fields.items():
+        value = row.get(name)
+        if isinstance(field, ReverseField):
+            if value:
+                return None
+            row.pop(name, None)
+        elif isinstance(value, (dict, list)) and not isinstance(field, JSONField):
+            return None
+    return row
+
 
 class FactoryContainer:
     @classmethod
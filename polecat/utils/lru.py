@@ -0,0 +1,40 @@
+import threading
+from collections import OrderedDict
+
+
+class LRU:
+    """ A thread-safe least-recently-used mapping, holding at most
+    `get_max_size()` entries. A zero size holds nothing.
+    """
+    def __init__(self, get_max_size):
+        self.get_max_size = get_max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def pop(self, key):
+        with self.lock:
+            return self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def set(self, key, value):
+        max_size = self.get_max_size()
+        if not max_size:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
@@ -0,0 +1,42 @@
+import ujson as json
+
+
+class RawJSON:
+    """ Already encoded JSON text, spliced as is into anything encoded
+    with ujson, which calls `__json__` for it. Results fetched from
+    Postgres as JSON can then be passed straight through to a response
+    without decoding them only to encode them again.
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f'<RawJSON {self.text[:40]!r}>'
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __json__(self):
+        return self.text
+
+    @classmethod
+    def array(cls, texts):
+        return cls('[' + ','.join(texts) + ']')
+
+    @classmethod
+    def object(cls, items):
+        """ An object of the `(name, value)` pairs `items`. Values may
+        be `RawJSON`, or anything else ujson can encode.
+        """
+        return cls('{' + ','.join(
+            f'{json.dumps(str(name))}:{json.dumps(value)}'
+            for name, value in items
+        ) + '}')
+
+    def decode(self):
+        return json.loads(self.text)
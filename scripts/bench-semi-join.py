@@ -0,0 +1,105 @@
+# Compares several filters through the same relation given in one
+# `filter`, compiled to a single semi-join, with the same filters
+# chained, compiled to a semi-join each. Both find the same rows.
+#
+#   DATABASE_URL=postgres://... python scripts/bench-semi-join.py
+
+import time
+
+from polecat.db.connection import cursor
+from polecat.db.query import Q
+from polecat.db.schema import IntColumn, RelatedColumn, Schema, Table
+
+N_ARTISTS = 200000
+N_ALBUMS = 1000000
+RUNS = 10
+
+artist = Table('bench_artist', [
+    IntColumn('id', primary_key=True),
+    IntColumn('country'),
+    IntColumn('genre'),
+    IntColumn('decade')
+])
+album = Table('bench_album', [
+    IntColumn('id', primary_key=True),
+    IntColumn('year'),
+    RelatedColumn('artist', 'bench_artist', related_column='albums')
+])
+schema = Schema()
+schema.add_table(artist)
+schema.add_table(album)
+schema.bind()
+
+
+def create_tables():
+    with cursor() as curs:
+        curs.execute(
+            'DROP TABLE IF EXISTS bench_album;'
+            ' DROP TABLE IF EXISTS bench_artist;'
+            ' CREATE TABLE bench_artist (id serial PRIMARY KEY, country int,'
+            ' genre int, decade int);'
+            ' CREATE TABLE bench_album (id serial PRIMARY KEY, year int,'
+            ' artist int REFERENCES bench_artist);'
+            ' INSERT INTO bench_artist (country, genre, decade)'
+            f' SELECT ii % 50, ii % 20, ii % 7 FROM generate_series(1, {N_ARTISTS}) ii;'
+            ' INSERT INTO bench_album (year, artist)'
+            f' SELECT 1950 + ii % 70, 1 + ii % {N_ARTISTS}'
+            f' FROM generate_series(1, {N_ALBUMS}) ii;'
+            ' CREATE INDEX ON bench_album (artist);'
+            ' ANALYZE bench_artist; ANALYZE bench_album'
+        )
+
+
+def drop_tables():
+    with cursor() as curs:
+        curs.execute('DROP TABLE bench_album; DROP TABLE bench_artist')
+
+
+def explain(query):
+    with cursor() as curs:
+        curs.execute(b'EXPLAIN (ANALYZE, FORMAT JSON) ' + query.to_sql())
+        plan = curs.fetchone()[0][0]
+    return (
+        plan['Plan']['Plan Rows'],
+        plan['Plan']['Actual Rows'],
+        plan['Planning Time'],
+        plan['Execution Time']
+    )
+
+
+def timed(query):
+    start = time.perf_counter()
+    for ii in range(RUNS):
+        rows = list(query)
+    return len(rows), (time.perf_counter() - start) / RUNS * 1000
+
+
+def report(name, query):
+    estimated, actual, planning, execution = explain(query)
+    n_rows, elapsed = timed(query)
+    print(
+        f'{name:<10} rows {actual:>6} (estimated {estimated:>6})'
+        f'  planning {planning:6.2f} ms  execution {execution:8.2f} ms'
+        f'  round trip {elapsed:8.2f} ms'
+    )
+    return n_rows
+
+
+create_tables()
+try:
+    filters = {
+        'artist__country': 7,
+        'artist__genre': 7,
+        'artist__decade': 0
+    }
+    combined = Q(album).filter(**filters).select('id')
+    chained = Q(album)
+    for name, value in filters.items():
+        chained = chained.filter(**{name: value})
+    chained = chained.select('id')
+    print(f'{len(filters)} filters through bench_album.artist')
+    a = report('combined', combined)
+    b = report('chained', chained)
+    assert a == b
+finally:
+    drop_tables()
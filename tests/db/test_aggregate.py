@@ -0,0 +1,86 @@
+import pytest
+from polecat.db.query import A, Q
+from polecat.db.sql.cache import Shape
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2)'
+        ' SELECT ii % 3, ii FROM generate_series(1, 9) ii'
+    )
+    return create_table()
+
+
+def test_aggregate(table):
+    query = Q(table).aggregate(
+        n=A.Count(), total=A.Sum('col2'), low=A.Min('col2'),
+        high=A.Max('col2'), mean=A.Avg('col2')
+    )
+    assert list(query) == [
+        {'n': 9, 'total': 45, 'low': 1, 'high': 9, 'mean': 5}
+    ]
+
+
+def test_count_distinct(table):
+    query = Q(table).aggregate(n=A.Count('col1', distinct=True))
+    assert list(query) == [{'n': 3}]
+    with pytest.raises(ValueError):
+        A.Count(distinct=True)
+
+
+def test_group_by(table):
+    query = (
+        Q(table)
+        .filter(col2__gt=1)
+        .group_by('col1')
+        .aggregate(n=A.Count(), total=A.Sum('col2'))
+        .order(('col1',))
+    )
+    assert list(query) == [
+        {'col1': 0, 'n': 3, 'total': 18},
+        {'col1': 1, 'n': 2, 'total': 11},
+        {'col1': 2, 'n': 3, 'total': 15}
+    ]
+
+
+def test_group_by_sql(table):
+    sql = Q(table).group_by('col1').aggregate(n=A.Count()).to_sql()
+    assert sql == (
+        b'SELECT row_to_json(__tl) FROM (SELECT "a_table"."col1" AS "col1",'
+        b' count(*) AS "n" FROM "a_table" GROUP BY "a_table"."col1")'
+        b' AS __tl'
+    )
+
+
+def test_having(table):
+    query = (
+        Q(table)
+        .group_by('col1')
+        .aggregate(total=A.Sum('col2'))
+        .having(total__ge=15)
+        .order(('-total',))
+        .limit(1)
+    )
+    assert list(query) == [{'col1': 0, 'total': 18}]
+
+
+def test_having_requires_aggregate(table):
+    with pytest.raises(ValueError):
+        Q(table).select('col1').having(col1=1)
+
+
+def test_aggregate_shape(table):
+    a = Shape(Q(table).filter(col1=1).aggregate(n=A.Sum('col2')))
+    b = Shape(Q(table).filter(col1=2).aggregate(n=A.Sum('col2')))
+    c = Shape(Q(table).filter(col1=1).aggregate(n=A.Avg('col2')))
+    d = Shape(Q(table).filter(col1=1).aggregate(n=A.Sum('col2', distinct=True)))
+    assert a.key == b.key
+    assert a.values == [1]
+    assert a.key != c.key
+    assert a.key != d.key
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from polecat.db.connection import manager
+from polecat.db.query import Q
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2)'
+        ' SELECT ii, ii * 2 FROM generate_series(1, 5) ii'
+    )
+    return create_table()
+
+
+@pytest.mark.asyncio
+async def test_async_iteration(table):
+    rows = [row async for row in Q(table).select('col1', 'col2')]
+    assert len(rows) == 5
+    assert {r['col1'] for r in rows} == {1, 2, 3, 4, 5}
+
+
+@pytest.mark.asyncio
+async def test_async_get(table):
+    row = await Q(table).filter(col1=3).select('col2').aget()
+    assert row == {'col2': 6}
+    assert await Q(table).filter(col1=10).select('col2').aget() is None
+
+
+@pytest.mark.asyncio
+async def test_async_execute(table):
+    query = Q(table).insert(col1=6, col2=12)
+    await query.aexecute()
+    assert query.row_count == 1
+    assert len([row async for row in Q(table).select('id')]) == 6
+
+
+@pytest.mark.asyncio
+async def test_async_queries_run_concurrently(table):
+    async def sleep_query():
+        async with manager.async_cursor() as cursor:
+            await cursor.execute('SELECT pg_sleep(0.2)')
+
+    start = asyncio.get_event_loop().time()
+    await asyncio.gather(*(sleep_query() for ii in range(3)))
+    assert asyncio.get_event_loop().time() - start < 0.5
+    assert len(manager.get_async_pool()) == 3
+
+
+@pytest.mark.asyncio
+async def test_nested_async_checkout_shares_connection(table):
+    async with manager.async_connection() as conn:
+        async with manager.async_cursor() as cursor:
+            assert cursor.connection is conn
+
+
+@pytest.mark.asyncio
+async def test_async_page_and_estimate(table, testdb):
+    query = Q(table).select('col1').order(('col1',)).offset(3).with_total()
+    assert await query.aget_page() == ([{'col1': 4}, {'col1': 5}], 5)
+    query = Q(table).select('col1').order(('col1',)).offset(9).with_total()
+    assert await query.aget_page() == ([], 5)
+    testdb.execute('ANALYZE a_table')
+    assert await Q(table).aestimate_count() == 5
+    assert await Q(table).filter(col1=1).select('id').aestimate_count() == 1
@@ -0,0 +1,114 @@
+import pytest
+from polecat.db.query import Q
+from polecat.db.session import Session
+from polecat.db.sql import bulk
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb, push_config):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    return create_table()
+
+
+@pytest.fixture
+def copies(monkeypatch):
+    calls = []
+    copy = bulk.copy
+
+    def spy(cursor, table, columns, rows):
+        calls.append(len(rows))
+        return copy(cursor, table, columns, rows)
+    monkeypatch.setattr(bulk, 'copy', spy)
+    return calls
+
+
+def get_rows(table):
+    return [
+        (r['col1'], r['col2'])
+        for r in Q(table).select('col1', 'col2').order(('id',))
+    ]
+
+
+def test_bulk_insert_dicts(table):
+    rows = [{'col1': ii, 'col2': ii * 2} for ii in range(3)]
+    results = list(Q(table).bulk_insert(rows).select('id', 'col1'))
+    assert [r['col1'] for r in results] == [0, 1, 2]
+    assert get_rows(table) == [(0, 0), (1, 2), (2, 4)]
+
+
+def test_bulk_insert_batches(table, copies, push_config):
+    push_config.db_bulk_copy_threshold = 0
+    rows = ({'col1': ii, 'col2': None} for ii in range(25))
+    query = Q(table).bulk_insert(rows, batch_size=10)
+    query.execute()
+    assert len(query) == 25
+    assert get_rows(table) == [(ii, None) for ii in range(25)]
+    assert copies == []
+
+
+def test_bulk_insert_copies_large_batches(table, copies, push_config):
+    push_config.db_bulk_copy_threshold = 10
+    rows = [(ii, ii * 2) for ii in range(25)]
+    query = Q(table).bulk_insert(('col1', 'col2'), rows, batch_size=10)
+    query.execute()
+    assert len(query) == 25
+    assert get_rows(table) == rows
+    assert copies == [10, 10]
+
+
+def test_bulk_insert_with_session_skips_copy(table, copies, push_config):
+    push_config.db_bulk_copy_threshold = 1
+    session = Session(variables={'polecat.test': 'x'})
+    rows = [(ii, ii) for ii in range(5)]
+    Q(table, session=session).bulk_insert(('col1', 'col2'), rows, batch_size=2).execute()
+    assert get_rows(table) == rows
+    assert copies == []
+
+
+def test_copy_text():
+    assert bulk.to_copy_text(None) == '\\N'
+    assert bulk.to_copy_text(True) == 't'
+    assert bulk.to_copy_text('a\tb\\c\n') == 'a\\tb\\\\c\\n'
+    assert bulk.to_copy_text({'a': 1}) == '{"a": 1}'
+
+
+def test_bulk_insert_mismatched_rows(table):
+    rows = [{'col1': 1}, {'col2': 2}]
+    with pytest.raises(ValueError):
+        Q(table).bulk_insert(rows, batch_size=10).execute()
+
+
+@pytest.mark.asyncio
+async def test_abulk_insert(table):
+    rows = [(ii, ii * 2) for ii in range(5)]
+    query = Q(table).bulk_insert(('col1', 'col2'), rows, batch_size=2)
+    await query.aexecute()
+    assert len(query) == 5
+    assert get_rows(table) == rows
+
+
+def test_bulk_update(table):
+    Q(table).bulk_insert(('col1', 'col2'), [(ii, 0) for ii in range(3)]).execute()
+    rows = [{'id': 1, 'col2': 10}, {'id': 3, 'col2': None}]
+    results = list(Q(table).bulk_update(rows).select('id', 'col2'))
+    assert sorted((r['id'], r['col2']) for r in results) == [(1, 10), (3, None)]
+    assert get_rows(table) == [(0, 10), (1, 0), (2, None)]
+
+
+def test_bulk_update_after_mutation(table):
+    Q(table).bulk_insert(('col1', 'col2'), [(ii, 0) for ii in range(3)]).execute()
+    query = Q(table).insert(col1=3, col2=0).bulk_update([{'id': 1, 'col2': 7}])
+    query.execute()
+    assert get_rows(table) == [(0, 7), (1, 0), (2, 0), (3, 0)]
+
+
+def test_bulk_update_by_key(table):
+    Q(table).bulk_insert(('col1', 'col2'), [(ii, 0) for ii in range(3)]).execute()
+    Q(table).bulk_update([{'col1': 2, 'col2': 5}], key='col1').execute()
+    assert get_rows(table) == [(0, 0), (1, 0), (2, 5)]
+    with pytest.raises(ValueError):
+        Q(table).bulk_update([{'col2': 5}])
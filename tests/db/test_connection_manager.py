@@ -1,6 +1,8 @@
 import os
+from threading import Thread
 
 from polecat.db.connection import ConnectionManager
+from polecat.db.connection import manager as global_manager
 
 
 def test_uses_environment():
@@ -21,19 +23,60 @@ def test_push_and_pop_url():
     manager = ConnectionManager()
     with manager.push_url(os.environ['DATABASE_URL']):
         with manager.connection():
-            assert list(manager.connections.keys()) != []
+            assert list(manager.pools.keys()) != []
         assert manager.stack == 2*[os.environ['DATABASE_URL']]
     assert manager.stack == [os.environ['DATABASE_URL']]
-    assert list(manager.connections.keys()) == []
+    assert list(manager.pools.keys()) == []
 
 
 def test_connection_reuse():
     url = os.environ['DATABASE_URL']
     manager = ConnectionManager()
-    assert url not in manager.connections
+    assert url not in manager.pools
     with manager.connection() as conn:
         assert conn.status == 1
-    assert url in manager.connections
-    assert manager.connections[url].status == 1
+    assert url in manager.pools
+    with manager.connection() as other_conn:
+        assert other_conn is conn
     manager.close_all_connections()
-    assert url not in manager.connections
+    assert url not in manager.pools
+    assert conn.closed
+
+
+def test_nested_checkout_shares_connection():
+    manager = ConnectionManager()
+    with manager.connection() as conn:
+        with manager.cursor() as curs:
+            assert curs.connection is conn
+        assert len(manager.get_pool()) == 1
+    manager.close_all_connections()
+
+
+def test_threads_use_separate_connections():
+    manager = ConnectionManager()
+    connections = []
+
+    def checkout():
+        with manager.connection() as conn:
+            connections.append(conn)
+
+    with manager.connection() as conn:
+        thread = Thread(target=checkout)
+        thread.start()
+        thread.join()
+        assert connections[0] is not conn
+    assert len(manager.get_pool()) == 2
+    manager.close_all_connections()
+
+
+def test_autocommit_false_commits(testdb):
+    manager = ConnectionManager()
+    with manager.push_url(global_manager.get_url()):
+        with manager.cursor(autocommit=False) as curs:
+            assert not curs.connection.autocommit
+            curs.execute('CREATE TABLE test_commit (id integer)')
+        with manager.connection() as conn:
+            assert conn.autocommit
+        manager.close_all_connections()
+        with manager.cursor() as curs:
+            curs.execute('SELECT COUNT(*) FROM test_commit')
@@ -0,0 +1,116 @@
+import os
+import time
+from threading import Thread
+
+import pytest
+from polecat.db.pool import (AsyncConnectionPool, ConnectionPool, PoolClosed,
+                             PoolTimeout)
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool(os.environ['DATABASE_URL'], min_size=0, max_size=2)
+    yield pool
+    pool.close()
+
+
+def test_reuses_idle_connection(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(pool) == 1
+
+
+def test_bounded_size(pool):
+    pool.getconn()
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+
+
+def test_waits_for_returned_connection(pool):
+    first = pool.getconn()
+    pool.getconn()
+    thread = Thread(target=lambda: (time.sleep(0.05), pool.putconn(first)))
+    thread.start()
+    assert pool.getconn(timeout=5) is first
+    thread.join()
+
+
+def test_discards_broken_connection(pool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.close()
+    other = pool.getconn()
+    assert other is not conn
+    assert not other.closed
+
+
+def test_rolls_back_on_return(pool):
+    conn = pool.getconn()
+    conn.autocommit = False
+    with conn.cursor() as curs:
+        curs.execute('SELECT 1')
+    pool.putconn(conn)
+    conn = pool.getconn()
+    assert conn.autocommit
+    assert conn.get_transaction_status() == 0
+
+
+def test_max_age():
+    pool = ConnectionPool(os.environ['DATABASE_URL'], min_size=0, max_age=0.01)
+    conn = pool.getconn()
+    time.sleep(0.02)
+    pool.putconn(conn)
+    assert conn.closed
+    assert len(pool) == 0
+
+
+def test_reaps_idle_connections():
+    pool = ConnectionPool(
+        os.environ['DATABASE_URL'], min_size=1, max_size=3, max_idle=0.01
+    )
+    connections = [pool.getconn() for ii in range(3)]
+    for conn in connections:
+        pool.putconn(conn)
+    time.sleep(0.02)
+    pool.reap()
+    assert len(pool) == 1
+    pool.close()
+
+
+def test_fill():
+    pool = ConnectionPool(
+        os.environ['DATABASE_URL'], min_size=2, max_size=3, max_age=0.05
+    )
+    pool.fill()
+    assert len(pool.idle) == 2
+    conn = pool.getconn()
+    time.sleep(0.06)
+    pool.putconn(conn)
+    # Aged connections are replaced to keep the minimum open.
+    assert conn.closed
+    assert len(pool) == 2
+    assert not any(p.connection is conn for p in pool.idle)
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_async_fill():
+    pool = AsyncConnectionPool(
+        os.environ['DATABASE_URL'], min_size=2, max_size=3
+    )
+    conn = await pool.getconn()
+    assert len(pool) == 2
+    await pool.putconn(conn, close=True)
+    assert len(pool) == 2
+    pool.close()
+
+
+def test_closed_pool(pool):
+    conn = pool.getconn()
+    pool.close()
+    with pytest.raises(PoolClosed):
+        pool.getconn()
+    pool.putconn(conn)
+    assert conn.closed
@@ -0,0 +1,66 @@
+import gzip
+import os
+
+import pytest
+import ujson as json
+from polecat.admin.dump import Dump
+from polecat.admin.restore import Restore, get_dependencies
+from polecat.db.query import Q
+from polecat.db.schema import Schema
+from polecat.project.project import set_active_project
+
+from ..schema import create_table
+
+
+class DumpProject:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+@pytest.fixture
+def tables(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int);'
+        'CREATE TABLE b_table (id serial PRIMARY KEY, col1 int, col2 int,'
+        ' col3 int REFERENCES a_table (id));'
+    )
+    schema = Schema()
+    a_table = create_table(schema=schema)
+    b_table = create_table('b_table', related_table='a_table', schema=schema)
+    set_active_project(DumpProject(schema))
+    try:
+        yield a_table, b_table
+    finally:
+        set_active_project(None)
+
+
+def test_dump_and_restore(tables, tmpdir):
+    a_table, b_table = tables
+    Q(a_table).bulk_insert(('col1', 'col2'), [(ii, ii) for ii in range(5)]).execute()
+    Q(b_table).bulk_insert(('col1', 'col3'), [(1, 2), (2, 4)]).execute()
+    output = str(tmpdir.join('dump'))
+    Dump().run(output, jobs=1)
+    with open(os.path.join(output, 'manifest.json')) as f:
+        manifest = json.load(f)
+    assert [(t['name'], t['rows']) for t in manifest['tables']] == [
+        ('a_table', 5), ('b_table', 2)
+    ]
+    with gzip.open(os.path.join(output, 'b_table.ndjson.gz'), 'rt') as f:
+        assert json.loads(f.readline()) == {
+            'id': 1, 'col1': 1, 'col2': None, 'col3': 2
+        }
+    Q(b_table).delete().execute()
+    Q(a_table).delete().execute()
+    Restore().run(output, jobs=1)
+    assert len(list(Q(a_table).select('id'))) == 5
+    rows = Q(b_table).select('col1', 'col3').order(('id',))
+    assert [(r['col1'], r['col3']) for r in rows] == [(1, 2), (2, 4)]
+    # Sequences carry on from the restored rows.
+    assert Q(a_table).insert(col1=9).select('id').get()['id'] == 6
+
+
+def test_restore_dependencies(tables):
+    a_table, b_table = tables
+    assert get_dependencies([b_table, a_table]) == {
+        'a_table': set(), 'b_table': {'a_table'}
+    }
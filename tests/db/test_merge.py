@@ -0,0 +1,19 @@
+from polecat.db.query import Q
+
+from ..schema import create_table
+
+
+def test_merge(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    table = create_table()
+    Q(table).bulk_insert(('col1', 'col2'), [(1, 2), (3, 4)]).execute()
+    result = Q.merge(
+        all=Q(table).select('col1').order(('-col1',)),
+        one=Q(table).filter(id=2).select('col2'),
+        none=Q(table).filter(id=9).select('col2')
+    ).get()
+    assert [r['col1'] for r in result['all']] == [3, 1]
+    assert result['one'] == [{'col2': 4}]
+    assert result['none'] == []
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+import ujson as json
+from polecat.db import notify, tracking
+from polecat.db.connection import manager
+from polecat.db.query import Q
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb, push_config):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    push_config.db_notify_channel = 'polecat_test'
+    return create_table()
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tracking, 'write_listeners', [calls.append])
+    return calls
+
+
+def wait_for(payloads, count=1, timeout=5):
+    deadline = time.monotonic() + timeout
+    while len(payloads) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return payloads
+
+
+def test_writes_published(table):
+    payloads = []
+    listener = manager.listen('polecat_test', payloads.append)
+    assert listener.ready.wait(5)
+    assert manager.listen('polecat_test', payloads.append) is listener
+    Q(table).insert(col1=1).execute()
+    list(Q(table).select('id'))
+    data = json.loads(wait_for(payloads)[0])
+    assert data == {'origin': notify.get_origin(), 'tables': ['a_table']}
+    time.sleep(0.05)
+    assert len(payloads) == 1
+
+
+def test_handle_notification(invalidated):
+    notify.handle_notification(notify.get_payload({'a_table'}))
+    assert invalidated == []
+    other = json.dumps({'origin': 'other', 'tables': ['a_table']})
+    notify.handle_notification(other)
+    assert invalidated == [['a_table']]
+    notify.handle_notification(None)
+    assert invalidated == [['a_table'], None]
@@ -0,0 +1,206 @@
+import pytest
+from polecat.db.query import Q, S
+from polecat.db.schema import IntColumn, Schema, Table
+from polecat.db.sql.cache import Shape
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2)'
+        ' SELECT ii % 3, ii FROM generate_series(1, 9) ii'
+    )
+    return create_table()
+
+
+@pytest.fixture
+def tables(testdb):
+    testdb.execute(
+        'CREATE TABLE b_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int,'
+        ' col3 int REFERENCES b_table)'
+    )
+    testdb.execute('INSERT INTO b_table (col1) VALUES (1), (2)')
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2, col3)'
+        ' SELECT ii % 3, ii, ii % 2 + 1 FROM generate_series(1, 9) ii'
+    )
+    b_table = create_table('b_table')
+    return create_table('a_table', related_table=b_table), b_table
+
+
+def test_offset(table):
+    query = Q(table).select('col2').order(('col2',)).limit(3).offset(3)
+    assert [r['col2'] for r in query] == [4, 5, 6]
+
+
+def test_seek(table):
+    query = (
+        Q(table).select('col2')
+        .order(('col1', 'id'))
+        .seek((1, 4))
+        .limit(3)
+    )
+    assert [r['col2'] for r in query] == [7, 2, 5]
+
+
+def test_seek_descending(table):
+    query = Q(table).select('col2').order(('-col1', '-id')).seek((1, 4))
+    assert [r['col2'] for r in query] == [1, 9, 6, 3]
+
+
+def test_seek_filtered(table):
+    query = (
+        Q(table).filter(col1=0).select('col2')
+        .order(('col2',))
+        .seek((3,))
+    )
+    assert [r['col2'] for r in query] == [6, 9]
+
+
+def test_seek_mixed_directions(table):
+    query = Q(table).select('col2').order(('col1', '-id')).seek((1, 4))
+    assert [r['col2'] for r in query] == [1, 8, 5, 2]
+
+
+@pytest.mark.parametrize('order, seek, ids', (
+    (('col1', 'id'), (0, 4), [3, 2, 5]),
+    (('col1', 'id'), (1, 3), [2, 5]),
+    (('col1', 'id'), (None, 2), [5]),
+    (('-col1', '-id'), (None, 5), [2, 3, 4, 1]),
+    (('-col1', '-id'), (None, 2), [3, 4, 1]),
+    (('-col1', '-id'), (1, 3), [4, 1]),
+    (('col1', '-id'), (None, 5), [2])
+))
+def test_seek_nulls(testdb, order, seek, ids):
+    testdb.execute('CREATE TABLE a_table (id serial PRIMARY KEY, col1 int)')
+    testdb.execute(
+        'INSERT INTO a_table (col1) VALUES (0), (NULL), (1), (0), (NULL)'
+    )
+    table = Table('a_table', [
+        IntColumn('id', primary_key=True),
+        IntColumn('col1', null=True)
+    ])
+    schema = Schema()
+    schema.add_table(table)
+    schema.bind()
+    query = Q(table).select('id').order(order).seek(seek)
+    assert [r['id'] for r in query] == ids
+
+
+def test_shape_includes_pagination():
+    table = create_table()
+    a = Shape(Q(table).select('col1').order(('id',)).seek((1,)))
+    b = Shape(Q(table).select('col1').order(('id',)).seek((2,)))
+    c = Shape(Q(table).select('col1').order(('id',)).offset(2))
+    assert a.key == b.key
+    assert a.values == [1]
+    assert a.key != c.key
+
+
+def test_nested_limit_and_order(tables):
+    _, b_table = tables
+    query = Q(b_table).select(
+        'col1', a_tables=S('col2').order(('-col2',)).limit(2).offset(1)
+    ).order(('col1',))
+    assert list(query) == [
+        {'col1': 1, 'a_tables': [{'col2': 6}, {'col2': 4}]},
+        {'col1': 2, 'a_tables': [{'col2': 7}, {'col2': 5}]}
+    ]
+
+
+def test_nested_order_in_aggregate(tables):
+    _, b_table = tables
+    query = Q(b_table).select(
+        'col1', a_tables=S('col1').order(('-col2',))
+    ).order(('col1',))
+    sql = query.to_sql()
+    assert b'row_number() OVER (ORDER BY "col2" DESC)' in sql
+    assert list(query) == [
+        {'col1': 1, 'a_tables': [
+            {'col1': 2}, {'col1': 0}, {'col1': 1}, {'col1': 2}
+        ]},
+        {'col1': 2, 'a_tables': [
+            {'col1': 0}, {'col1': 1}, {'col1': 2}, {'col1': 0}, {'col1': 1}
+        ]}
+    ]
+
+
+def test_nested_filter(tables):
+    _, b_table = tables
+    query = Q(b_table).select(
+        'col1', a_tables=S('col2').filter(col1=0).order(('col2',))
+    ).order(('col1',))
+    assert list(query) == [
+        {'col1': 1, 'a_tables': [{'col2': 6}]},
+        {'col1': 2, 'a_tables': [{'col2': 3}, {'col2': 9}]}
+    ]
+
+
+def test_nested_options_on_related_lookup(immutabledb):
+    b_table = create_table('b_table')
+    a_table = create_table('a_table', related_table=b_table)
+    query = Q(a_table).select('col1', col3=S('col1').limit(1))
+    with pytest.raises(ValueError):
+        query.to_sql()
+
+
+def test_shape_includes_nested_options():
+    b_table = create_table('b_table')
+    create_table('a_table', related_table=b_table)
+    a = Shape(Q(b_table).select(a_tables=S('col1').filter(col2=1).limit(2)))
+    b = Shape(Q(b_table).select(a_tables=S('col1').filter(col2=3).limit(2)))
+    c = Shape(Q(b_table).select(a_tables=S('col1').filter(col2=1).limit(3)))
+    d = Shape(Q(b_table).select(a_tables=S('col1').filter(col2=1)))
+    assert a.key == b.key
+    assert a.values == [1, 2]
+    # Limits are bound like any other value.
+    assert a.key == c.key
+    assert c.values == [1, 3]
+    assert a.key != d.key
+
+
+def test_with_total(table):
+    query = Q(table).filter(col1=1).select('col2').order(('col2',)).limit(2)
+    sql = query.with_total().to_sql()
+    assert b'COUNT(*) OVER () AS "__total"' in sql
+    assert query.get_page() == ([{'col2': 1}, {'col2': 4}], 3)
+
+
+def test_with_total_seek(table):
+    query = (
+        Q(table)
+        .select('col2')
+        .order(('col2',))
+        .seek((7,))
+        .limit(1)
+        .with_total()
+    )
+    assert query.get_page() == ([{'col2': 8}], 9)
+
+
+def test_with_total_past_last_row(table):
+    query = Q(table).select('col2').order(('col2',)).offset(20).with_total()
+    assert query.get_page() == ([], 9)
+    query = Q(table).filter(col1=5).select('col2').with_total()
+    assert query.get_page() == ([], 0)
+
+
+def test_with_total_shape(table):
+    a = Shape(Q(table).select('col1').limit(2))
+    b = Shape(Q(table).select('col1').limit(2).with_total())
+    assert a.key != b.key
+
+
+def test_estimate_count(table, testdb):
+    testdb.execute('ANALYZE a_table')
+    assert Q(table).estimate_count() == 9
+    assert Q(table).select('col1').estimate_count() == 9
+    assert Q(table).filter(col1=1).select('col1').estimate_count() == 3
@@ -0,0 +1,108 @@
+import pytest
+from polecat.db.connection import connection, manager
+from polecat.db.query import Q
+from polecat.db.session import Session
+from polecat.db.sql import prepare
+from polecat.db.sql.cache import Shape, sql_cache
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb, push_config):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2)'
+        ' SELECT ii, ii * 2 FROM generate_series(1, 5) ii'
+    )
+    push_config.db_prepare_threshold = 1
+    sql_cache.clear()
+    return create_table()
+
+
+def get_prepared(conn):
+    with conn.cursor() as curs:
+        curs.execute('SELECT name FROM pg_prepared_statements')
+        return {r[0] for r in curs}
+
+
+def test_prepares_repeated_queries(table):
+    with connection() as conn:
+        for value in (1, 2, 3):
+            query = Q(table).filter(col1=value).select('col2')
+            assert query.get() == {'col2': value * 2}
+        entry = sql_cache.entries[Shape(query).key]
+        assert set(conn.prepared) == {entry.name}
+        assert get_prepared(conn) == {entry.name}
+
+
+def test_prepares_pages(table):
+    with connection() as conn:
+        for offset in (2, 3, 4):
+            query = Q(table).select('col1').order(('id',)).limit(1).offset(offset)
+            assert list(query) == [{'col1': offset + 1}]
+        assert len(get_prepared(conn)) == 1
+
+
+def test_prepares_with_session(table):
+    session = Session(variables={'polecat.test': 'x'})
+    with connection() as conn:
+        for value in (1, 2, 3):
+            query = Q(table, session=session).filter(col1=value).select('col2')
+            assert query.get() == {'col2': value * 2}
+        assert len(conn.prepared) == 1
+
+
+def test_falls_back_when_unpreparable(table):
+    Q(table).insert(col1=None, col2=20).execute()
+    with connection(autocommit=False) as conn:
+        for _ in range(2):
+            query = Q(table).filter(col1=None).select('col2')
+            assert query.get() == {'col2': 20}
+        entry = sql_cache.entries[Shape(query).key]
+        assert not entry.preparable
+        assert entry.name not in conn.prepared
+
+
+def test_invalidate(table):
+    with connection() as conn:
+        Q(table).filter(col1=1).select('col2').get()
+        assert len(get_prepared(conn)) == 1
+        prepare.invalidate()
+        Q(table).filter(col2=2).select('col1').get()
+        assert len(get_prepared(conn)) == 1
+        assert conn.prepared_generation == prepare.generation
+
+
+def test_threshold(table, push_config):
+    push_config.db_prepare_threshold = 3
+    with connection() as conn:
+        for value in (1, 2):
+            Q(table).filter(col1=value).select('col2').get()
+        assert not conn.prepared
+        Q(table).filter(col1=3).select('col2').get()
+        assert len(conn.prepared) == 1
+
+
+def test_deallocates_evicted(table, push_config):
+    push_config.db_sql_cache_size = 1
+    with connection() as conn:
+        Q(table).filter(col1=1).select('col2').get()
+        first = set(conn.prepared)
+        Q(table).filter(col2=2).select('col1').get()
+        assert len(sql_cache) == 1
+        assert len(get_prepared(conn)) == 1
+        assert set(conn.prepared) == get_prepared(conn)
+        assert not first & get_prepared(conn)
+
+
+@pytest.mark.asyncio
+async def test_async_prepare(table):
+    rows = []
+    for value in (1, 2, 3):
+        rows.append(await Q(table).filter(col1=value).select('col2').aget())
+    assert rows == [{'col2': 2}, {'col2': 4}, {'col2': 6}]
+    pool = manager.get_async_pool()
+    assert any(p.connection.prepared for p in pool.idle)
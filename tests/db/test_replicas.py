@@ -0,0 +1,91 @@
+import pytest
+from polecat.db.connection import manager
+from polecat.db.query import Q
+from polecat.db.sql.strategy import is_read_only
+from polecat.db.unit import unit_of_work
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb, push_config):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    return create_table()
+
+
+@pytest.fixture
+def replicas(table, push_config):
+    url = manager.get_url()
+    urls = [f'{url}?application_name=replica{i}' for i in range(2)]
+    push_config.db_replica_urls = ','.join(urls)
+    try:
+        yield urls
+    finally:
+        for url in urls:
+            manager.close_connection(url)
+
+
+@pytest.fixture
+def urls(monkeypatch):
+    used = []
+    get_url = Q.get_url
+
+    def record_url(self, is_async=False):
+        url = get_url(self, is_async)
+        used.append(url)
+        return url
+    monkeypatch.setattr(Q, 'get_url', record_url)
+    return used
+
+
+def test_is_read_only(table):
+    assert is_read_only(Q(table).select('id'))
+    assert is_read_only(Q(table).filter(col1=1).select('id'))
+    assert not is_read_only(Q(table).insert(col1=1))
+    assert not is_read_only(Q(table).filter(col1=1).update(col2=2))
+    assert not is_read_only(Q(table).filter(col1=1).delete())
+    assert not is_read_only(
+        Q(table).select('id', inserted=Q(table).insert(col1=1))
+    )
+    query = Q(table).select('id')
+    query.branches.append(Q(table).insert(col1=1))
+    assert not is_read_only(query)
+
+
+def test_reads_go_to_replicas(replicas, table, urls):
+    Q(table).insert(col1=1).execute()
+    assert len(list(Q(table).select('id'))) == 1
+    assert len(list(Q(table).select('id'))) == 1
+    assert urls == [None] + replicas
+
+
+def test_least_connections(replicas, push_config):
+    push_config.db_replica_policy = 'least_connections'
+    with manager.cursor(replicas[0]):
+        assert manager.get_read_url() == replicas[1]
+    with manager.cursor(replicas[1]):
+        assert manager.get_read_url() == replicas[0]
+
+
+def test_no_replicas(table, urls):
+    list(Q(table).select('id'))
+    assert urls == [None]
+
+
+def test_read_your_writes(replicas, table, urls):
+    with manager.read_your_writes():
+        list(Q(table).select('id'))
+        Q(table).insert(col1=1).execute()
+        assert len(list(Q(table).select('id'))) == 1
+    assert urls[0] in replicas
+    assert urls[1:] == [None, None]
+    list(Q(table).select('id'))
+    assert urls[-1] in replicas
+
+
+def test_unit_of_work_reads_primary(replicas, table, urls):
+    with unit_of_work():
+        list(Q(table).select('id'))
+    assert urls == [None]
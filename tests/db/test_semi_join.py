@@ -0,0 +1,83 @@
+import pytest
+from polecat.db.query import Q
+from polecat.db.schema import IntColumn, RelatedColumn, Schema, Table
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def tables(testdb):
+    testdb.execute(
+        'CREATE TABLE b_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int,'
+        ' col3 int REFERENCES b_table)'
+    )
+    testdb.execute(
+        'INSERT INTO b_table (col1, col2) VALUES (1, 1), (1, 2), (2, 2)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2, col3)'
+        ' VALUES (1, 2, 1), (2, 1, 1), (1, 1, 2), (2, 2, 3)'
+    )
+    b_table = create_table('b_table')
+    return create_table('a_table', related_table=b_table), b_table
+
+
+@pytest.fixture
+def tree(testdb):
+    testdb.execute(
+        'CREATE TABLE node (id serial PRIMARY KEY, col1 int,'
+        ' parent int REFERENCES node)'
+    )
+    testdb.execute(
+        'INSERT INTO node (col1, parent)'
+        ' VALUES (1, NULL), (2, 1), (3, 2), (4, 2)'
+    )
+    table = Table('node', [
+        IntColumn('id', primary_key=True),
+        IntColumn('col1'),
+        RelatedColumn('parent', 'node', related_column='children')
+    ])
+    schema = Schema()
+    schema.add_table(table)
+    schema.bind()
+    return table
+
+
+def ids(query):
+    return sorted(r['id'] for r in query.select('id'))
+
+
+def test_filters_through_same_relation(tables):
+    a_table, _ = tables
+    query = Q(a_table).filter(col3__col1=1, col3__col2=2)
+    assert query.select('id').to_sql().count(b'EXISTS') == 1
+    assert ids(query) == [3]
+    assert ids(Q(a_table).filter(col3__col1=1).filter(col3__col2=2)) == [3]
+
+
+def test_reverse_filters_match_same_row(tables):
+    _, b_table = tables
+    query = Q(b_table).filter(a_tables__col1=1, a_tables__col2=1)
+    assert ids(query) == [2]
+    # Chained filters may each match a different related row.
+    query = Q(b_table).filter(a_tables__col1=1).filter(a_tables__col2=1)
+    assert ids(query) == [1, 2]
+
+
+def test_nested_paths_share_semi_join(tables):
+    _, b_table = tables
+    query = Q(b_table).filter(
+        a_tables__col1=2,
+        a_tables__col3__col2=2
+    )
+    assert query.select('id').to_sql().count(b'EXISTS') == 2
+    assert ids(query) == [3]
+
+
+def test_self_relation(tree):
+    assert ids(Q(tree).filter(parent__col1=2)) == [3, 4]
+    assert ids(Q(tree).filter(children__col1=3)) == [2]
+    assert ids(Q(tree).filter(parent__parent__col1=1)) == [3, 4]
@@ -0,0 +1,143 @@
+import pytest
+from polecat.db.connection import cursor
+from polecat.db.query import Q, S
+from polecat.db.sql.cache import UNCACHEABLE, Shape, SQLCache, sql_cache
+from polecat.db.sql.expression.raw import RawSQL
+from polecat.db.sql.strategy import Strategy
+from psycopg2.sql import SQL
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2)'
+        ' SELECT ii, ii * 2 FROM generate_series(1, 5) ii'
+    )
+    return create_table()
+
+
+def uncached_sql(query):
+    with cursor() as curs:
+        return curs.mogrify(*Strategy().parse(query).to_sql())
+
+
+def cached_sql(cache, query):
+    with cursor() as curs:
+        return curs.mogrify(*cache.compile(query, curs.connection))
+
+
+def test_shape_ignores_values():
+    table = create_table()
+    a = Shape(Q(table).filter(col1=1, col2=2).select('col1'))
+    b = Shape(Q(table).filter(col1=3, col2=4).select('col1'))
+    assert a.key == b.key
+    assert a.values == [1, 2]
+    assert b.values == [3, 4]
+
+
+def test_shape_differs_on_structure():
+    table = create_table()
+    a = Shape(Q(table).filter(col1=1).select('col1'))
+    b = Shape(Q(table).filter(col2=1).select('col1'))
+    c = Shape(Q(table).filter(col1=1).select('col2'))
+    d = Shape(Q(table).filter(col1=None).select('col1'))
+    assert len({a.key, b.key, c.key, d.key}) == 4
+
+
+def test_shape_records_shared_values():
+    table = create_table()
+    a = Shape(Q(table).filter(col1=1, col2=1).select('col1'))
+    b = Shape(Q(table).filter(col1=1, col2=2).select('col1'))
+    assert a.key != b.key
+
+
+def test_pages_share_entry(table):
+    cache = SQLCache(8)
+    for limit, offset in ((2, None), (2, 3), (3, 4)):
+        page = Q(table).select('col1').order(('id',)).limit(limit)
+        if offset:
+            page = page.offset(offset)
+        assert cached_sql(cache, page) == uncached_sql(page)
+    # With and without an offset.
+    assert cache.info().size == 2
+    assert cache.info().hits == 1
+
+
+def test_shape_rejects_expressions():
+    table = create_table()
+    query = Q(table).filter(col1=RawSQL(SQL('1'))).select('col1')
+    assert Shape.from_query(query) is None
+
+
+def test_cache_hit(immutabledb):
+    cache = SQLCache(max_size=8)
+    table = create_table()
+    query = Q(table).filter(col1=1, col2=2).select('col1')
+    assert cached_sql(cache, query) == uncached_sql(query)
+    assert cache.info() == (0, 1, 8, 1)
+    query = Q(table).filter(col1=3, col2=4).select('col1')
+    assert cached_sql(cache, query) == uncached_sql(query)
+    assert cache.info() == (1, 1, 8, 1)
+
+
+def test_cache_nested_and_session(immutabledb):
+    cache = SQLCache(max_size=8)
+    b_table = create_table('b_table')
+    a_table = create_table('a_table', related_table=b_table)
+    for value in (1, 2):
+        query = (
+            Q(a_table)
+            .filter(col1=value, col3__col2=value + 10)
+            .select('col1', col3=S('col1', 'col2'))
+        )
+        assert cached_sql(cache, query) == uncached_sql(query)
+    assert cache.hits == 1
+
+
+def test_cache_evicts_least_recently_used(immutabledb):
+    cache = SQLCache(max_size=2)
+    table = create_table()
+    shapes = [
+        lambda: Q(table).filter(col1=1).select('col1'),
+        lambda: Q(table).filter(col2=1).select('col1'),
+        lambda: Q(table).filter(id=1).select('col1')
+    ]
+    cached_sql(cache, shapes[0]())
+    cached_sql(cache, shapes[1]())
+    cached_sql(cache, shapes[0]())
+    cached_sql(cache, shapes[2]())
+    assert len(cache) == 2
+    assert Shape(shapes[1]()).key not in cache.entries
+    assert Shape(shapes[0]()).key in cache.entries
+
+
+def test_cache_derived_values(immutabledb):
+    cache = SQLCache(max_size=8)
+    table = create_table()
+    for value in ('a', 'b'):
+        query = Q(table).filter(col1__ct=value).select('col1')
+        assert cached_sql(cache, query) == uncached_sql(query)
+    assert cache.entries[Shape(query).key] is UNCACHEABLE
+    assert cache.hits == 0
+
+
+def test_cache_disabled(immutabledb):
+    cache = SQLCache(max_size=0)
+    table = create_table()
+    query = Q(table).filter(col1=1).select('col1')
+    assert cached_sql(cache, query) == uncached_sql(query)
+    assert len(cache) == 0
+
+
+def test_cached_execution(table):
+    sql_cache.clear()
+    for value in (1, 2, 3):
+        query = Q(table).filter(col1__in=[value, value + 1]).select('col2')
+        rows = sorted(r['col2'] for r in query)
+        assert rows == [value * 2, (value + 1) * 2]
+    assert sql_cache.hits == 2
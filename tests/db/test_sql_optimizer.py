@@ -0,0 +1,112 @@
+import pytest
+from polecat.db.query import Q, S
+from polecat.db.sql.cache import sql_cache
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def tables(testdb, push_config):
+    testdb.execute(
+        'CREATE TABLE b_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int,'
+        ' col3 int REFERENCES b_table)'
+    )
+    testdb.execute(
+        'INSERT INTO b_table (col1, col2)'
+        ' SELECT ii, ii * 2 FROM generate_series(1, 3) ii'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2, col3)'
+        ' SELECT ii % 3, ii, ii % 3 + 1 FROM generate_series(1, 9) ii'
+    )
+    b_table = create_table('b_table')
+    a_table = create_table('a_table', related_table=b_table)
+    return a_table, b_table
+
+
+def unoptimized(push_config, make_query):
+    push_config.db_optimize_sql = False
+    sql_cache.clear()
+    try:
+        return make_query().to_sql(), list(make_query())
+    finally:
+        push_config.db_optimize_sql = True
+        sql_cache.clear()
+
+
+def test_collapse_filter(tables):
+    a_table, _ = tables
+    sql = Q(a_table).filter(col2=2).select('col1').to_sql()
+    assert sql == (
+        b'SELECT row_to_json(__tl) FROM (SELECT "r0"."col1" AS "col1" FROM'
+        b' "a_table" AS "r0" WHERE "r0"."col2" = 2) AS __tl'
+    )
+
+
+def test_merge_chained_filters(tables):
+    a_table, _ = tables
+    sql = Q(a_table).filter(col1=1).filter(col2=2).select('col1').to_sql()
+    assert sql == (
+        b'SELECT row_to_json(__tl) FROM (SELECT "r0"."col1" AS "col1" FROM'
+        b' "a_table" AS "r0" WHERE "r0"."col1" = 1 AND "r0"."col2" = 2)'
+        b' AS __tl'
+    )
+
+
+def test_collapse_with_lateral(tables):
+    _, b_table = tables
+    sql = Q(b_table).filter(col1=1).select(
+        'col1', a_tables=S('col1')
+    ).to_sql()
+    assert sql == (
+        b'SELECT row_to_json(__tl) FROM (SELECT "r0"."col1" AS "col1",'
+        b' "j0"."array_agg" AS "a_tables" FROM "b_table" AS "r0"'
+        b' LEFT JOIN LATERAL (SELECT array_agg("a0") FROM'
+        b' (SELECT "a_table"."col1" AS "col1" FROM "a_table"'
+        b' WHERE "a_table"."col3" = "r0".id) AS "a0")'
+        b' AS "j0" ON TRUE WHERE "r0"."col1" = 1) AS __tl'
+    )
+
+
+def test_dedupe_common_expressions(tables):
+    a_table, _ = tables
+    value = 1
+    sql = Q.merge(
+        x=Q(a_table).filter(col1=value).select('id'),
+        y=Q(a_table).filter(col1=value).select('id')
+    ).to_sql()
+    assert sql == (
+        b'WITH "c0" AS (SELECT "r0"."id" AS "id" FROM "a_table" AS "r0"'
+        b' WHERE "r0"."col1" = 1) SELECT json_build_object('
+        b'\'x\', (SELECT coalesce(json_agg(row_to_json(__m)), \'[]\')'
+        b' FROM "c0" AS __m), \'y\', (SELECT coalesce(json_agg('
+        b'row_to_json(__m)), \'[]\') FROM "c0" AS __m))'
+    )
+    sql = Q.merge(
+        x=Q(a_table).filter(col1=1).select('id'),
+        y=Q(a_table).filter(col1=2).select('id')
+    ).to_sql()
+    assert b'"c1"' in sql
+
+
+@pytest.mark.parametrize('make_query', (
+    lambda a, b: Q(a).filter(col1=1).select('id', 'col2'),
+    lambda a, b: Q(a).filter(col1=1).filter(col2=4).select('id'),
+    lambda a, b: Q(a).filter(col1=2).select('id', col3=S('col1')),
+    lambda a, b: Q(a).filter(col3__col1=2).select('id'),
+    lambda a, b: Q(b).filter(col1=1).select('id', a_tables=S('col2')),
+    lambda a, b: Q.merge(
+        x=Q(a).filter(col1=0).select('id'),
+        y=Q(a).filter(col1=0).select('id')
+    )
+))
+def test_optimized_results_unchanged(tables, push_config, make_query):
+    a_table, b_table = tables
+    def make(): return make_query(a_table, b_table)  # noqa
+    unoptimized_sql, expected = unoptimized(push_config, make)
+    assert make().to_sql() != unoptimized_sql
+    assert expected
+    assert list(make()) == expected
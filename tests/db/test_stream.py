@@ -0,0 +1,57 @@
+import pytest
+from polecat.db.connection import connection, cursor, transaction
+from polecat.db.query import Q
+from polecat.db.session import Session
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    testdb.execute(
+        'INSERT INTO a_table (col1, col2)'
+        ' SELECT ii, ii * 2 FROM generate_series(1, 25) ii'
+    )
+    return create_table()
+
+
+def test_stream(table):
+    rows = list(Q(table).select('col1', 'col2').stream(batch_size=10))
+    assert sorted(r['col1'] for r in rows) == list(range(1, 26))
+
+
+def test_stream_restores_connection(table):
+    with connection() as conn:
+        rows = Q(table).select('col1').stream(batch_size=10)
+        next(rows)
+        rows.close()
+        assert conn.autocommit
+        assert len(list(Q(table).select('col1'))) == 25
+
+
+def test_stream_in_transaction(table):
+    with cursor() as curs:
+        with transaction(curs):
+            Q(table).insert(col1=26, col2=52).execute()
+            rows = list(Q(table).select('col1').stream(batch_size=10))
+            assert len(rows) == 26
+            curs.execute('SELECT count(*) FROM a_table')
+            assert curs.fetchone()[0] == 26
+
+
+def test_stream_with_session(table):
+    session = Session(variables={'polecat.test': 'x'})
+    query = Q(table, session=session).filter(col1__in=[1, 2, 3]).select('col2')
+    assert sorted(r['col2'] for r in query.stream()) == [2, 4, 6]
+
+
+@pytest.mark.asyncio
+async def test_astream(table):
+    rows = [r async for r in Q(table).select('col1').astream(batch_size=10)]
+    assert sorted(r['col1'] for r in rows) == list(range(1, 26))
+    rows = [r async for r in Q(table).select('col1').astream(batch_size=5)]
+    assert len(rows) == 25
+
@@ -0,0 +1,117 @@
+import asyncio
+
+import psycopg2
+import pytest
+from polecat.db.connection import async_cursor, cursor
+from polecat.db.query import Q
+from polecat.db.session import Session
+from polecat.db.unit import async_unit_of_work, current_unit, unit_of_work
+
+from ..schema import create_table
+
+
+@pytest.fixture
+def table(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    return create_table()
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    sql = []
+    monkeypatch.setattr(Q, 'log_sql', lambda self, c, s, a: sql.append(str(s)))
+    return sql
+
+
+def get_setting(name):
+    with cursor() as curs:
+        curs.execute('SELECT current_setting(%s, true), txid_current()', (name,))
+        return curs.fetchone()
+
+
+def test_unit_of_work_commits(table):
+    with unit_of_work():
+        Q(table).insert(col1=1).execute()
+        Q(table).insert(col1=2).execute()
+        _, txid = get_setting('polecat.test')
+        assert get_setting('polecat.test')[1] == txid
+    assert len(list(Q(table).select('id'))) == 2
+    assert get_setting('polecat.test')[1] != txid
+
+
+def test_unit_of_work_rolls_back(table):
+    with pytest.raises(ValueError):
+        with unit_of_work():
+            Q(table).insert(col1=1).execute()
+            raise ValueError
+    assert list(Q(table).select('id')) == []
+
+
+def test_unit_of_work_rolls_back_failed(table):
+    with unit_of_work() as unit:
+        assert current_unit() is unit
+        Q(table).insert(col1=1).execute()
+        unit.fail()
+    assert current_unit() is None
+    assert list(Q(table).select('id')) == []
+
+
+def test_unit_of_work_rolls_back_aborted(table):
+    with unit_of_work():
+        Q(table).insert(col1=1).execute()
+        with pytest.raises(psycopg2.Error):
+            Q(table).insert(col1='x').execute()
+    assert list(Q(table).select('id')) == []
+
+
+def test_unit_of_work_session(table, statements):
+    session = Session(variables={'polecat.test': 'x'})
+    with unit_of_work(session):
+        assert get_setting('polecat.test')[0] == 'x'
+        Q(table, session=session).insert(col1=1).execute()
+        Q(table, session=session).select('col1').get()
+        assert not any('SET LOCAL' in s for s in statements)
+        other = Session(variables={'polecat.test': 'y'})
+        Q(table, session=other).select('col1').get()
+        assert 'SET LOCAL' in statements[-1]
+        assert get_setting('polecat.test')[0] == 'x'
+
+
+def test_unit_of_work_nested(table):
+    with unit_of_work() as unit:
+        with unit_of_work() as inner:
+            assert inner is unit
+            Q(table).insert(col1=1).execute()
+    assert len(list(Q(table).select('id'))) == 1
+
+
+def test_unit_of_work_resets_session(testdb):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int,'
+        ' col2 text DEFAULT current_setting(\'polecat.test\', true))'
+    )
+    table = create_table()
+    session = Session(variables={'polecat.test': 'x'})
+    with unit_of_work(session):
+        Q(table).insert(col1=1).execute()
+        assert get_setting('polecat.test')[0] == 'x'
+    assert list(Q(table).select('col2')) == [{'col2': ''}]
+
+
+@pytest.mark.asyncio
+async def test_async_unit_of_work(table):
+    session = Session(variables={'polecat.test': 'x'})
+
+    async def get_txid():
+        await Q(table, session=session).select('col1').aexecute()
+        async with async_cursor() as curs:
+            await curs.execute('SELECT txid_current()')
+            return curs.fetchone()[0]
+    async with async_unit_of_work(session):
+        await Q(table, session=session).insert(col1=1).aexecute()
+        txids = await asyncio.gather(*(get_txid() for _ in range(5)))
+        assert len(set(txids)) == 1
+    rows = [r async for r in Q(table).select('col1')]
+    assert rows == [{'col1': 1}]
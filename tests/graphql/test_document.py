@@ -0,0 +1,54 @@
+import pytest
+from graphql import GraphQLError, build_schema
+from polecat.graphql.document import (PERSISTED_QUERY_NOT_FOUND, DocumentCache,
+                                      PersistedQueries, get_query_hash)
+
+schema = build_schema('type Query { a: Int, b: Int }')
+
+
+def with_hash(hash, **data):
+    return {
+        'extensions': {'persistedQuery': {'version': 1, 'sha256Hash': hash}},
+        **data
+    }
+
+
+def test_document_cache():
+    documents = DocumentCache(schema, max_size=1)
+    document, errors = documents.get('{ a }')
+    assert errors == []
+    assert documents.get('{ a }')[0] is document
+    documents.get('{ b }')
+    assert documents.get('{ a }')[0] is not document
+    assert document.node.definitions
+    document, errors = documents.get('{ c }')
+    assert len(errors) == 1
+    assert len(documents) == 1
+    with pytest.raises(GraphQLError):
+        documents.get('{ a')
+
+
+def test_automatic_persisted_queries():
+    queries = PersistedQueries(max_size=10)
+    hash = get_query_hash('{ a }')
+    with pytest.raises(GraphQLError, match=PERSISTED_QUERY_NOT_FOUND):
+        queries.resolve(with_hash(hash))
+    assert queries.resolve(with_hash(hash, query='{ a }')) == '{ a }'
+    assert queries.resolve(with_hash(hash)) == '{ a }'
+    with pytest.raises(GraphQLError):
+        queries.resolve(with_hash(hash, query='{ b }'))
+    assert queries.resolve({'query': '{ b }'}) == '{ b }'
+
+
+def test_persisted_queries_only():
+    hash = get_query_hash('{ a }')
+    queries = PersistedQueries({hash: '{ a }'}, only=True)
+    assert queries.resolve(with_hash(hash)) == '{ a }'
+    assert queries.resolve({'query': '{ a }'}) == '{ a }'
+    with pytest.raises(GraphQLError):
+        queries.resolve({'query': '{ b }'})
+    other = get_query_hash('{ b }')
+    with pytest.raises(GraphQLError):
+        queries.resolve(with_hash(other, query='{ b }'))
+    with pytest.raises(GraphQLError, match=PERSISTED_QUERY_NOT_FOUND):
+        queries.resolve(with_hash(other))
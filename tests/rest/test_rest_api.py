@@ -32,6 +32,22 @@ def test_rest_api_match():
     assert api.match(event) == False
 
 
+def test_rest_api_cache_key():
+    api = RestAPI(None)
+
+    def get_key(method='GET', **kwargs):
+        request = type('Request', (), dict(
+            method=method, path='/rest/a', **kwargs
+        ))
+        return api.get_cache_key(type('Event', (), {'request': request}))
+    key = get_key(args={'b': ['1'], 'a': ['2']})
+    assert key == get_key(args={'a': ['2'], 'b': ['1']})
+    assert key != get_key(args={'a': ['2'], 'b': ['3']})
+    assert key != get_key()
+    assert get_key(query_parameters={'a': '1'}) != get_key()
+    assert get_key(method='POST') is None
+
+
 @pytest.mark.asyncio
 async def test_rest_api_handle_event(db, factory):
     user = factory.User.create()
@@ -1,3 +1,9 @@
+import time
+
+import pytest
+from jwt import InvalidTokenError, decode
+from polecat.auth import middleware
+from polecat.auth.claims import ClaimsCache
 from polecat.auth.jwt import jwt
 from polecat.auth.middleware import RoleMiddleware
 from polecat.deploy.event import HttpEvent
@@ -20,3 +26,81 @@ def test_role_middleware():
     RoleMiddleware().run(event)
     assert event.claims is not None
     assert event.role == DefaultRole  # noqa
+
+
+def make_event(token):
+    return HttpEvent({}, Request({'authorization': f'Bearer {token}'}))
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    calls = []
+
+    def spy(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+    monkeypatch.setattr(middleware, 'decode', spy)
+    return calls
+
+
+def test_role_middleware_caches_claims(decodes):
+    token = jwt({'role': 'default', 'user_id': 1})
+    mw = RoleMiddleware()
+    for ii in range(3):
+        event = make_event(token)
+        mw.run(event)
+        assert event.claims == {'role': 'default', 'user_id': 1}
+        assert event.session.variables['claims.user_id'] == 1
+        assert event.role == DefaultRole  # noqa
+    assert len(decodes) == 1
+
+
+def test_claims_cache_expiry(decodes):
+    token = jwt({'role': 'default', 'exp': int(time.time()) + 60})
+    mw = RoleMiddleware()
+    mw.run(make_event(token))
+    entry = mw.claims_cache.get(token)
+    entry.expires = time.time() - 1
+    mw.run(make_event(token))
+    assert len(decodes) == 2
+
+
+def test_claims_cache_revocation(decodes):
+    revoked = set()
+    token = jwt({'role': 'default', 'jti': 'a'})
+    mw = RoleMiddleware(
+        claims_cache=ClaimsCache(is_revoked=lambda c: c.get('jti') in revoked)
+    )
+    mw.run(make_event(token))
+    revoked.add('a')
+    with pytest.raises(InvalidTokenError):
+        mw.run(make_event(token))
+    assert len(decodes) == 2
+
+
+def test_revoke_until_expiry(decodes):
+    token = jwt({'role': 'default', 'exp': int(time.time()) + 60})
+    other = jwt({'role': 'default', 'exp': int(time.time()) + 60, 'n': 1})
+    mw = RoleMiddleware()
+    mw.run(make_event(token))
+    mw.revoke(token)
+    with pytest.raises(InvalidTokenError):
+        mw.run(make_event(token))
+    mw.run(make_event(other))
+    assert mw.claims_cache.has_revoked(token)
+    assert not mw.claims_cache.has_revoked(token, now=time.time() + 61)
+    assert not mw.claims_cache.revoked
+
+
+def test_claims_cache_bounded():
+    mw = RoleMiddleware(claims_cache=ClaimsCache(max_size=2))
+    for ii in range(5):
+        mw.run(make_event(jwt({'role': 'default', 'n': ii})))
+    assert len(mw.claims_cache) == 2
+
+
+def test_invalid_token_not_cached():
+    mw = RoleMiddleware()
+    with pytest.raises(InvalidTokenError):
+        mw.run(make_event('not.a.token'))
+    assert len(mw.claims_cache) == 0
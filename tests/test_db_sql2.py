@@ -157,8 +157,22 @@ def test_where_expression_with_lookups(immutabledb):
     where = Where(col1=1, col3__col2=2)
     sql = immutabledb.mogrify(*where.get_sql(a_table))
     assert sql == (
-        b'"a_table"."col1" = 1 AND EXISTS (SELECT 1 FROM "b_table" WHERE'
-        b' "a_table"."col3" = "b_table"."id" AND "b_table"."col2" = 2)'
+        b'"a_table"."col1" = 1 AND EXISTS (SELECT 1 FROM "b_table" AS'
+        b' "a_table__col3" WHERE "a_table"."col3" = "a_table__col3"."id"'
+        b' AND "a_table__col3"."col2" = 2)'
+    )
+
+
+def test_where_expression_groups_lookups(immutabledb):
+    b_table = create_table('b_table')
+    a_table = create_table('a_table', related_table=b_table)
+    where = Where(col3__col2=2, col1=1, col3__col1__gt=1)
+    sql = immutabledb.mogrify(*where.get_sql(a_table))
+    assert sql == (
+        b'EXISTS (SELECT 1 FROM "b_table" AS "a_table__col3" WHERE'
+        b' "a_table"."col3" = "a_table__col3"."id" AND'
+        b' "a_table__col3"."col2" = 2 AND "a_table__col3"."col1" > 1)'
+        b' AND "a_table"."col1" = 1'
     )
 
 
@@ -308,8 +308,7 @@ def test_filter_and_select(immutabledb):
     sql = query.to_sql()
     assert sql == (
         b'SELECT row_to_json(__tl) FROM (SELECT "r0"."col1" AS "col1" FROM'
-        b' (SELECT "a_table"."col1" AS "col1" FROM "a_table" WHERE'
-        b' "a_table"."col2" = 2) AS "r0") AS __tl'
+        b' "a_table" AS "r0" WHERE "r0"."col2" = 2) AS __tl'
     )
 
 
@@ -340,8 +339,9 @@ def test_reverse_filter(immutabledb):
     sql = query.to_sql()
     assert sql == (
         b'SELECT row_to_json(__tl) FROM (SELECT * FROM "b_table" WHERE EXISTS'
-        b' (SELECT 1 FROM "a_table" WHERE "b_table"."id" = "a_table"."col3"'
-        b' AND "a_table"."col1" = 1)) AS __tl'
+        b' (SELECT 1 FROM "a_table" AS "b_table__a_tables" WHERE'
+        b' "b_table"."id" = "b_table__a_tables"."col3" AND'
+        b' "b_table__a_tables"."col1" = 1)) AS __tl'
     )
 
 
@@ -0,0 +1,129 @@
+import pytest
+from polecat.db.tracking import record_tables
+from polecat.deploy.event import HttpEvent
+from polecat.graphql.api import GraphqlAPI
+from polecat.model.db import Q
+from polecat.test.fixture import config
+
+from .models import *  # noqa
+
+
+@pytest.fixture
+def movies(testdb):
+    testdb.execute(
+        'CREATE TABLE address (id serial PRIMARY KEY, country text)'
+    )
+    testdb.execute(
+        'CREATE TABLE actor (id serial PRIMARY KEY, first_name text,'
+        ' last_name text, age int, address int, "user" int)'
+    )
+    testdb.execute(
+        'CREATE TABLE movie (id serial PRIMARY KEY, title text UNIQUE,'
+        ' star int)'
+    )
+    actor = Q(Actor).insert(first_name='a', last_name='b').select('id').get()
+    Q(Movie).insert(title='one', star=actor['id']).execute()
+
+
+async def run(data, **options):
+    request = type('Request', (), {
+        'method': 'POST',
+        'path': '/graphql',
+        'json': data
+    })
+    with config(**options):
+        api = GraphqlAPI(None)
+        api.prepare()
+        try:
+            return await api.run(HttpEvent({}, request))
+        finally:
+            if api.executor:
+                api.executor.shutdown()
+
+
+def titles():
+    return sorted(r['title'] for r in Q(Movie).select('title'))
+
+
+def create_movie(title):
+    return f'createMovie(input: {{title: "{title}", star: 1}}) {{ title }}'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('options', (
+    {'graphql_threads': 2},
+    {'db_async': True}
+))
+async def test_execution(movies, options):
+    with record_tables() as recorder:
+        body, status = await run({'query': '{ allMovies { title } }'}, **options)
+    assert status == 200
+    assert body == {'data': {'allMovies': [{'title': 'one'}]}, 'errors': None}
+    # Tables read on another thread are still recorded.
+    assert recorder.tables == {'movie'}
+    body, status = await run({
+        'query': f'mutation {{ {create_movie("one")} }}'
+    }, **options)
+    assert body['data'] == {'createMovie': None}
+    assert len(body['errors']) == 1
+    assert 'duplicate key' in body['errors'][0]
+
+
+@pytest.mark.asyncio
+async def test_batch(movies):
+    request = type('Request', (), {
+        'method': 'POST',
+        'path': '/graphql',
+        'json': [
+            {'query': '{ allMovies { title } }'},
+            {'query': f'mutation {{ {create_movie("one")} }}'},
+            {'query': '{ allMovies { name } }'}
+        ]
+    })
+    api = GraphqlAPI(None)
+    api.prepare()
+    body, _ = await api.handle_event(HttpEvent({}, request))
+    assert len(body) == 3
+    assert body[0] == {'data': {'allMovies': [{'title': 'one'}]}, 'errors': None}
+    assert body[1]['data'] == {'createMovie': None}
+    assert isinstance(body[1]['errors'], tuple)
+    assert len(body[1]['errors']) == 1
+    assert body[1]['errors'][0].startswith('duplicate key value')
+    assert body[2].get('data') is None
+    assert body[2]['errors'] == (
+        "Cannot query field 'name' on type 'Movie'.",
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('db_async', (False, True))
+async def test_mutation_failure_in_unit(movies, db_async):
+    body, _ = await run({
+        'query': f'mutation {{ a: {create_movie("two")}'
+                 f' b: {create_movie("one")} c: {create_movie("three")} }}'
+    }, db_unit_of_work=True, db_async=db_async)
+    assert body['data'] == {
+        'a': {'title': 'two'},
+        'b': None,
+        'c': {'title': 'three'}
+    }
+    assert len(body['errors']) == 1
+    # Only the failed field's changes are rolled back.
+    assert titles() == ['one', 'three', 'two']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('db_async', (False, True))
+async def test_batch_failure_in_unit(movies, db_async):
+    body, _ = await run([
+        {'query': f'mutation {{ {create_movie("one")} }}'},
+        {'query': f'mutation {{ {create_movie("two")} }}'},
+        {'query': '{ allMovies { title } }'}
+    ], db_unit_of_work=True, db_async=db_async)
+    assert body[0]['data'] == {'createMovie': None}
+    assert body[0]['errors']
+    assert body[1] == {'data': {'createMovie': {'title': 'two'}}, 'errors': None}
+    assert body[2]['data'] == {
+        'allMovies': [{'title': 'one'}, {'title': 'two'}]
+    }
+    assert titles() == ['one', 'two']
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+from graphql import execute, parse
+from polecat.graphql import build_graphql_schema
+from polecat.graphql.loader import Loader, get_loader
+from polecat.graphql.plan import queue_loads
+from polecat.model.db import S
+
+from .models import *  # noqa
+
+
+@pytest.fixture
+def addresses(testdb):
+    testdb.execute(
+        'CREATE TABLE address (id serial PRIMARY KEY, country text)'
+    )
+    testdb.execute(
+        'INSERT INTO address (country)'
+        ' SELECT chr(96 + ii) FROM generate_series(1, 5) ii'
+    )
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    calls = []
+    build_query = Loader.build_query
+
+    def spy(self, ids):
+        calls.append(sorted(ids))
+        return build_query(self, ids)
+    monkeypatch.setattr(Loader, 'build_query', spy)
+    return calls
+
+
+def test_loader_batches_ids(addresses, queries):
+    loader = Loader(Address, S('country'))
+    deferred = [loader.load(id) for id in (1, 3, 9)]
+    assert [(r or {}).get('country') for r in (d() for d in deferred)] == ['a', 'c', None]
+    assert loader.get(3) == {'id': 3, 'country': 'c'}
+    assert loader.load_many((1, 3))() == [
+        {'id': 1, 'country': 'a'}, {'id': 3, 'country': 'c'}
+    ]
+    assert queries == [[1, 3, 9]]
+
+
+@pytest.mark.asyncio
+async def test_loader_batches_ids_async(addresses, queries):
+    loader = Loader(Address, S('country'))
+    rows = await asyncio.gather(*(loader.aget(id) for id in (2, 4)))
+    assert [r['country'] for r in rows] == ['b', 'd']
+    assert (await loader.load(5))['country'] == 'e'
+    assert queries == [[2, 4], [5]]
+
+
+siblings = '''
+{
+  a: getAddress(id: 1) { country }
+  b: getAddress(id: 3) { country }
+  c: getAddress(id: 9) { country }
+  d: getAddress(id: 3) { id }
+}
+'''
+
+
+def check_siblings(result):
+    assert result.errors is None
+    assert result.data == {
+        'a': {'country': 'a'},
+        'b': {'country': 'c'},
+        'c': None,
+        'd': {'id': 3}
+    }
+
+
+def test_sibling_gets_loaded_together(addresses, queries):
+    schema = build_graphql_schema()
+    document = parse(siblings)
+    context = {}
+    queue_loads(schema, document, context)
+    check_siblings(execute(schema, document, context_value=context))
+    assert queries == [[1, 3, 9], [3]]
+
+
+@pytest.mark.asyncio
+async def test_sibling_gets_loaded_together_async(addresses, queries):
+    schema = build_graphql_schema()
+    document = parse(siblings)
+    result = await execute(
+        schema, document, context_value={'is_async': True}
+    )
+    check_siblings(result)
+    assert queries == [[1, 3, 9], [3]]
+
+
+def test_get_loader_per_request():
+    context = {}
+    loader = get_loader(context, Address, S('country'))
+    assert get_loader(context, Address, S('country')) is loader
+    assert get_loader(context, Address, S('id')) is not loader
+    assert get_loader({}, Address, S('country')) is not loader
+
+
+def test_get_loader_lookup_options():
+    context = {}
+
+    def get(**options):
+        lookup = S('id').filter(**options).order('-id').limit(2)
+        return get_loader(context, Address, S('country', actors=lookup))
+    loader = get(age__gt=30)
+    assert get(age__gt=30) is loader
+    assert get(age__gt=40) is not loader
+    assert get(id__in=[1, 2]) is get(id__in=[1, 2])
+    lookup = S('id').filter(age__gt=30).order('id').limit(2)
+    assert get_loader(
+        context, Address, S('country', actors=lookup)
+    ) is not loader
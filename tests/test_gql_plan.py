@@ -0,0 +1,111 @@
+import pytest
+from graphql import execute, parse
+from polecat.db.connection import cursor
+from polecat.db.sql import prepare
+from polecat.db.unit import unit_of_work
+from polecat.graphql import build_graphql_schema
+from polecat.graphql.plan import Plan, get_planned_fields, plan_root_fields
+
+from .models import *  # noqa
+
+operation = '''
+{
+  a: allAddresss(order: ["country"]) { country }
+  b: getAddress(id: 2) { country }
+  c: allAddresss(limit: 1, offset: 2) { id }
+}
+'''
+
+
+@pytest.fixture
+def addresses(testdb):
+    testdb.execute(
+        'CREATE TABLE address (id serial PRIMARY KEY, country text)'
+    )
+    testdb.execute("INSERT INTO address (country) VALUES ('c'), ('b'), ('a')")
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    calls = []
+    execute = prepare.execute
+
+    def spy(cursor, sql, *args, **kwargs):
+        calls.append(sql)
+        return execute(cursor, sql, *args, **kwargs)
+    monkeypatch.setattr(prepare, 'execute', spy)
+    return calls
+
+
+def check_result(result):
+    assert result.errors is None
+    assert result.data == {
+        'a': [{'country': 'a'}, {'country': 'b'}, {'country': 'c'}],
+        'b': {'country': 'b'},
+        'c': [{'id': 3}]
+    }
+
+
+def test_root_fields_merged(addresses, statements):
+    schema = build_graphql_schema()
+    document = parse(operation)
+    context = {}
+    plan = plan_root_fields(schema, document, context)
+    plan.execute()
+    check_result(execute(schema, document, context_value=context))
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_root_fields_merged_async(addresses):
+    schema = build_graphql_schema()
+    document = parse(operation)
+    context = {'is_async': True}
+    plan = plan_root_fields(schema, document, context)
+    await plan.aexecute()
+    assert len(context['plan']) == 3
+    # Everything was fetched, so nothing is left to await.
+    check_result(execute(schema, document, context_value=context))
+
+
+def test_merged_query_failure_in_unit(addresses, monkeypatch):
+    def build_query(self):
+        with cursor() as curs:
+            curs.execute('SELECT 1 / 0')
+    monkeypatch.setattr(Plan, 'build_query', build_query)
+    schema = build_graphql_schema()
+    document = parse(operation)
+    context = {}
+    with unit_of_work():
+        plan = plan_root_fields(schema, document, context)
+        plan.execute()
+        assert 'plan' not in context
+        # The fields fall back to their own queries.
+        check_result(execute(schema, document, context_value=context))
+
+
+def test_single_field_not_planned(addresses):
+    schema = build_graphql_schema()
+    document = parse('{ allAddresss { country } }')
+    assert plan_root_fields(schema, document, {}) is None
+
+
+def test_batched_operations_merged(addresses, statements):
+    schema = build_graphql_schema()
+    operations = [
+        (parse('{ getAddress(id: 1) { country } }'), {}),
+        (parse('{ allAddresss(limit: 1) { id } }'), {})
+    ]
+    plan = Plan.from_fields(
+        field
+        for document, context in operations
+        for field in get_planned_fields(schema, document, context)
+    )
+    plan.execute()
+    results = [
+        execute(schema, document, context_value=context)
+        for document, context in operations
+    ]
+    assert results[0].data == {'getAddress': {'country': 'c'}}
+    assert results[1].data == {'allAddresss': [{'id': 1}]}
+    assert len(statements) == 1
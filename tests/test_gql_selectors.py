@@ -0,0 +1,129 @@
+import pytest
+from graphql import execute, parse
+from polecat.graphql import build_graphql_schema, resolve
+from polecat.graphql.document import DocumentCache
+
+from .models import *  # noqa
+
+
+@pytest.fixture
+def addresses(testdb):
+    testdb.execute(
+        'CREATE TABLE address (id serial PRIMARY KEY, country text)'
+    )
+    testdb.execute("INSERT INTO address (country) VALUES ('a'), ('b')")
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    calls = []
+    get_selector_from_node = resolve.get_selector_from_node
+
+    def spy(graphql_type, node, variables=None):
+        calls.append(node)
+        return get_selector_from_node(graphql_type, node, variables)
+    monkeypatch.setattr(resolve, 'get_selector_from_node', spy)
+    return calls
+
+
+def test_selectors_built_once_per_document(addresses, builds):
+    schema = build_graphql_schema()
+    documents = DocumentCache(schema)
+    for ii in range(3):
+        document, errors = documents.get('{ allAddresss { country } }')
+        assert errors == []
+        result = execute(
+            schema,
+            document.node,
+            context_value={'selectors': document.selectors}
+        )
+        assert result.errors is None
+        assert [r['country'] for r in result.data['allAddresss']] == ['a', 'b']
+    assert len(builds) == 1
+    assert len(document.selectors) == 1
+
+
+@pytest.fixture
+def movies(testdb):
+    testdb.execute(
+        'CREATE TABLE actor (id serial PRIMARY KEY, first_name text,'
+        ' last_name text, age int, address int, "user" int)'
+    )
+    testdb.execute(
+        'CREATE TABLE movie (id serial PRIMARY KEY, title text, star int)'
+    )
+    testdb.execute("INSERT INTO actor (first_name) VALUES ('a')")
+    testdb.execute(
+        "INSERT INTO movie (title, star) VALUES ('x', 1), ('z', 1), ('y', 1)"
+    )
+
+
+def test_reverse_field_arguments(movies):
+    schema = build_graphql_schema()
+    documents = DocumentCache(schema)
+    document, errors = documents.get('''
+    query ($title: String) {
+      allActors {
+        moviesByStar(order: ["-title"], limit: 2, filter: {title: $title}) {
+          title
+        }
+      }
+    }
+    ''')
+    assert errors == []
+    for title, expected in ((None, ['z', 'y']), ('x', ['x'])):
+        result = execute(
+            schema,
+            document.node,
+            context_value={'selectors': document.selectors},
+            variable_values={'title': title} if title else {}
+        )
+        assert result.errors is None
+        movies = result.data['allActors'][0]['moviesByStar']
+        assert [m['title'] for m in movies] == expected
+    # Selectors using variables depend on the request.
+    assert len(document.selectors) == 0
+
+
+def test_aggregate_query(movies, testdb):
+    testdb.execute(
+        "INSERT INTO actor (first_name, age) VALUES ('a', 30), ('b', 40)"
+    )
+    schema = build_graphql_schema()
+    result = execute(schema, parse('''
+    {
+      allActorsAggregate(groupBy: ["firstName"]) {
+        group
+        count
+        sum { age }
+        max { age }
+      }
+    }
+    '''))
+    assert result.errors is None
+    groups = sorted(
+        result.data['allActorsAggregate'],
+        key=lambda g: g['group']
+    )
+    assert groups == [
+        {'group': '{"firstName":"a"}', 'count': 2,
+         'sum': {'age': 30}, 'max': {'age': 30}},
+        {'group': '{"firstName":"b"}', 'count': 1,
+         'sum': {'age': 40}, 'max': {'age': 40}}
+    ]
+
+
+def test_connection_total_count(addresses):
+    schema = build_graphql_schema()
+    result = execute(schema, parse('''
+    {
+      allAddresssConnection(first: 1) {
+        totalCount
+        edges { node { country } }
+      }
+    }
+    '''))
+    assert result.errors is None
+    connection = result.data['allAddresssConnection']
+    assert connection['totalCount'] == 2
+    assert len(connection['edges']) == 1
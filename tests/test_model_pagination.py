@@ -0,0 +1,180 @@
+import pytest
+from polecat.model.db import S
+from polecat.model.exceptions import InvalidFieldError
+from polecat.model.pagination import (ESTIMATED_TOTAL, EXACT_TOTAL, Pagination,
+                                      decode_cursor, encode_cursor)
+from polecat.model.db import Q
+from polecat.model.resolver import AllResolver, APIContext
+
+from .models import Actor, Address
+
+
+class PaginationAPIContext(APIContext):
+    def __init__(self, is_connection=False, total=None, **kwargs):
+        super().__init__(is_connection=is_connection)
+        self.kwargs = kwargs
+        self.session = None
+        self._total = total
+
+    def parse_argument(self, name):
+        return self.kwargs.get(name)
+
+    def get_model_class(self):
+        return Address
+
+    def get_selector(self):
+        return S('country')
+
+    def get_total(self):
+        return self._total
+
+
+class ActorAPIContext(PaginationAPIContext):
+    def get_model_class(self):
+        return Actor
+
+    def get_selector(self):
+        return S('first_name', 'age')
+
+
+@pytest.fixture
+def actors(testdb):
+    testdb.execute(
+        'CREATE TABLE actor (id serial PRIMARY KEY, first_name text,'
+        ' last_name text, age int, address int, "user" int)'
+    )
+    testdb.execute(
+        'INSERT INTO actor (first_name, age) VALUES'
+        " ('a', 30), ('b', NULL), ('c', 20), ('d', NULL), ('e', 30)"
+    )
+
+
+@pytest.fixture
+def addresses(testdb):
+    testdb.execute(
+        'CREATE TABLE address (id serial PRIMARY KEY, country text)'
+    )
+    testdb.execute(
+        'INSERT INTO address (country)'
+        ' SELECT chr(96 + ii) FROM generate_series(1, 5) ii'
+    )
+
+
+def resolve(**kwargs):
+    return Address.Meta.all_resolver_manager(PaginationAPIContext(**kwargs))
+
+
+def test_stream_large_results(addresses, push_config, monkeypatch):
+    push_config.db_stream_batch_size = 2
+    streams = []
+    monkeypatch.setattr(Q, 'stream', lambda self: streams.append(self) or [])
+    assert len(resolve()) == 5
+    assert streams == []
+    push_config.db_stream_api_results = True
+    resolver = AllResolver()
+    assert not resolver.should_stream(Q(Address).select('id').limit(2))
+    assert resolver.should_stream(Q(Address).select('id').limit(3))
+    assert resolver.should_stream(Q(Address).select('id'))
+    assert len(resolve(limit=2)) == 2
+    assert resolve() == []
+    assert len(streams) == 1
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(['a', 1])) == ['a', 1]
+    with pytest.raises(ValueError):
+        decode_cursor('invalid')
+
+
+def test_order_appends_id():
+    assert Pagination(Address, order=['-country']).order == ('-country', '-id')
+    assert Pagination(Address, order=['id', 'country']).order == ('id', 'country')
+    with pytest.raises(InvalidFieldError):
+        Pagination(Address, order=['missing'])
+    with pytest.raises(InvalidFieldError):
+        Pagination(Address, order=['actorsByAddress'])
+
+
+def test_conflicting_arguments():
+    with pytest.raises(ValueError):
+        Pagination(Address, first=1, last=1)
+    with pytest.raises(ValueError):
+        Pagination(Address, first=1, before=encode_cursor([1]))
+
+
+def test_limit_and_offset(addresses):
+    rows = resolve(order=['-country'], limit=2, offset=1)
+    assert [r['country'] for r in rows] == ['d', 'c']
+
+
+def test_last(addresses):
+    rows = resolve(last=2)
+    assert [r['country'] for r in rows] == ['d', 'e']
+
+
+def test_connection_pages(addresses):
+    page = resolve(is_connection=True, first=2)
+    assert [r['country'] for r in page] == ['a', 'b']
+    assert page.has_next_page and not page.has_previous_page
+    page = resolve(is_connection=True, first=2, after=page.end_cursor)
+    assert [r['country'] for r in page] == ['c', 'd']
+    page = resolve(is_connection=True, first=2, after=page.end_cursor)
+    assert [r['country'] for r in page] == ['e']
+    assert not page.has_next_page and page.has_previous_page
+    page = resolve(is_connection=True, last=2, before=page.start_cursor)
+    assert [r['country'] for r in page] == ['c', 'd']
+    assert page.has_next_page and page.has_previous_page
+    assert [e.node['country'] for e in page.edges] == ['c', 'd']
+
+
+def test_connection_order(addresses):
+    page = resolve(is_connection=True, order=['-country'], first=3)
+    assert [r['country'] for r in page] == ['e', 'd', 'c']
+    page = resolve(
+        is_connection=True, order=['-country'], first=3, after=page.end_cursor
+    )
+    assert [r['country'] for r in page] == ['b', 'a']
+
+
+@pytest.mark.parametrize('order, names', (
+    (['age'], ['c', 'a', 'e', 'b', 'd']),
+    (['-age', '-firstName'], ['d', 'b', 'e', 'a', 'c']),
+    (['-age', 'firstName'], ['b', 'd', 'a', 'e', 'c'])
+))
+def test_connection_pages_nullable_order(actors, order, names):
+    def get_page(**kwargs):
+        context = ActorAPIContext(is_connection=True, order=order, **kwargs)
+        return Actor.Meta.all_resolver_manager(context)
+    seen = []
+    page = get_page(first=2)
+    while True:
+        seen.extend(r['first_name'] for r in page)
+        if not page.has_next_page:
+            break
+        page = get_page(first=2, after=page.end_cursor)
+    assert seen == names
+    page = get_page(last=2, before=page.start_cursor)
+    assert [r['first_name'] for r in page] == names[2:4]
+
+
+def test_connection_total_count(addresses):
+    page = resolve(is_connection=True, first=2)
+    assert page.total_count is None
+    page = resolve(is_connection=True, total=EXACT_TOTAL, first=2)
+    assert [r for r in page] == [{'country': 'a', 'id': 1}, {'country': 'b', 'id': 2}]
+    assert page.total_count == 5
+    page = resolve(
+        is_connection=True, total=EXACT_TOTAL, first=2, after=page.end_cursor
+    )
+    assert [r['country'] for r in page] == ['c', 'd']
+    assert page.total_count == 5
+    page = resolve(is_connection=True, total=EXACT_TOTAL, offset=10)
+    assert len(page) == 0
+    assert page.total_count == 5
+
+
+def test_connection_estimated_total_count(addresses, testdb):
+    testdb.execute('ANALYZE address')
+    page = resolve(is_connection=True, total=ESTIMATED_TOTAL, first=2)
+    assert len(page) == 2
+    assert page.total_count == 5
@@ -0,0 +1,125 @@
+import pytest
+import ujson as json
+from graphql import execute, parse
+from polecat.db.connection import cursor
+from polecat.db.unit import unit_of_work
+from polecat.graphql import build_graphql_schema
+from polecat.graphql.plan import PlannedField, RawOperation
+from polecat.model.db import Q
+from polecat.utils.raw_json import RawJSON
+
+from .models import *  # noqa
+
+
+@pytest.fixture
+def movies(testdb):
+    testdb.execute(
+        'CREATE TABLE address (id serial PRIMARY KEY, country text)'
+    )
+    testdb.execute(
+        'CREATE TABLE actor (id serial PRIMARY KEY, first_name text,'
+        ' last_name text, age int, address int, "user" int)'
+    )
+    testdb.execute(
+        'CREATE TABLE movie (id serial PRIMARY KEY, title text, star int)'
+    )
+    address = Q(Address).insert(country='nz').select('id').get()
+    actor = Q(Actor).insert(
+        first_name='a', last_name='b', age=30, address=address['id']
+    ).select('id').get()
+    Q(Movie).insert(title='one', star=actor['id']).execute()
+    Q(Movie).insert(title='two', star=actor['id']).execute()
+
+
+def run_raw(query, context=None):
+    schema = build_graphql_schema()
+    document = parse(query)
+    context = context if context is not None else {}
+    operation = RawOperation.from_operation(schema, document, context)
+    return schema, document, context, operation
+
+
+def test_raw_json_encoding():
+    body = {'data': RawJSON('{"a":[1,2]}'), 'errors': None}
+    assert json.dumps(body) == '{"data":{"a":[1,2]},"errors":null}'
+    raw = RawJSON.object([('a', RawJSON('[1]')), ('b', None)])
+    assert raw.decode() == {'a': [1], 'b': None}
+
+
+def test_query_raw(movies):
+    raw = Q(Movie).select('title').raw()
+    assert isinstance(raw, RawJSON)
+    assert raw.decode() == [{'title': 'one'}, {'title': 'two'}]
+    raw = Q(Movie).filter(title='one').select('title').get_raw()
+    assert raw.decode() == {'title': 'one'}
+    assert Q(Movie).filter(title='three').get_raw() is None
+
+
+@pytest.mark.asyncio
+async def test_query_raw_async(movies):
+    raw = await Q(Movie).select('title').araw()
+    assert raw.decode() == [{'title': 'one'}, {'title': 'two'}]
+    raw = await Q(Movie).filter(title='two').select('title').aget_raw()
+    assert raw.decode() == {'title': 'two'}
+
+
+def test_operation_passed_through(movies):
+    query = '''
+    {
+      movies: allMovies { title star { age address { country } } }
+      movie: getMovie(id: 1) { title }
+    }
+    '''
+    schema, document, context, operation = run_raw(query)
+    assert operation is not None
+    result = operation.execute()
+    assert isinstance(result.data, RawJSON)
+    expected = execute(schema, document, context_value={})
+    assert result.data.decode() == expected.data
+
+
+@pytest.mark.asyncio
+async def test_operation_passed_through_async(movies):
+    _, _, _, operation = run_raw(
+        '{ allMovies { title } }', {'is_async': True}
+    )
+    result = await operation.aexecute()
+    assert result.data.decode() == {
+        'allMovies': [{'title': 'one'}, {'title': 'two'}]
+    }
+
+
+def test_operation_failure_in_unit(movies, monkeypatch):
+    def resolve(self):
+        with cursor() as curs:
+            curs.execute('SELECT 1 / 0')
+    schema, document, context, operation = run_raw('{ allMovies { title } }')
+    monkeypatch.setattr(PlannedField, 'resolve', resolve)
+    with unit_of_work():
+        assert operation.execute() is None
+        # The operation is then run as usual, in the same transaction.
+        result = execute(schema, document, context_value=context)
+        assert result.data == {'allMovies': [{'title': 'one'}, {'title': 'two'}]}
+
+
+def test_operation_unexpected_error(movies, monkeypatch):
+    def resolve(self):
+        raise KeyError
+    _, _, _, operation = run_raw('{ allMovies { title } }')
+    monkeypatch.setattr(PlannedField, 'resolve', resolve)
+    with pytest.raises(KeyError):
+        operation.execute()
+
+
+@pytest.mark.parametrize('query', (
+    # Names that differ from the database.
+    '{ allActors { firstName } }',
+    '{ allMovies { name: title } }',
+    '{ allMovies { __typename title } }',
+    '{ allMovies { ... on Movie { title } } }',
+    # Results flipped in Python.
+    '{ allMovies(last: 1) { title } }',
+    'mutation { deleteMovie(input: {id: 1}) { id } }'
+))
+def test_operation_not_passed_through(movies, query):
+    assert run_raw(query)[3] is None
@@ -0,0 +1,92 @@
+import pytest
+from polecat.db.query import Q, S
+from polecat.db.tracking import record_tables
+from polecat.deploy.event import Event
+from polecat.project.cache import response_cache
+from polecat.project.handler import Handler
+
+from .schema import create_table
+
+
+@pytest.fixture
+def table(testdb, push_config):
+    testdb.execute(
+        'CREATE TABLE a_table (id serial PRIMARY KEY, col1 int, col2 int)'
+    )
+    push_config.response_cache_size = 16
+    response_cache.clear()
+    try:
+        yield create_table()
+    finally:
+        response_cache.clear()
+
+
+class CountHandler(Handler):
+    def __init__(self, table, insert=False):
+        super().__init__(None)
+        self.table = table
+        self.insert = insert
+        self.runs = 0
+
+    def get_cache_key(self, event):
+        return 'count'
+
+    async def handle_event(self, event):
+        self.runs += 1
+        if self.insert:
+            Q(self.table).insert(col1=1).execute()
+        return (len(list(Q(self.table).select('id'))), 200)
+
+
+def make_event(**variables):
+    event = Event({})
+    event.session.variables.update(variables)
+    return event
+
+
+@pytest.mark.asyncio
+async def test_response_cached(table):
+    handler = CountHandler(table)
+    assert await handler.run(make_event()) == (0, 200)
+    assert await handler.run(make_event()) == (0, 200)
+    assert handler.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_response_invalidated_by_write(table):
+    handler = CountHandler(table)
+    await handler.run(make_event())
+    Q(table).insert(col1=1).execute()
+    assert await handler.run(make_event()) == (1, 200)
+    assert handler.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_response_keyed_on_session(table):
+    handler = CountHandler(table)
+    await handler.run(make_event(**{'claims.user_id': 1, 'claims.exp': 1}))
+    await handler.run(make_event(**{'claims.user_id': 1, 'claims.exp': 2}))
+    assert handler.runs == 1
+    await handler.run(make_event(**{'claims.user_id': 2}))
+    assert handler.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_response_with_writes_not_cached(table):
+    handler = CountHandler(table, insert=True)
+    assert await handler.run(make_event()) == (1, 200)
+    assert await handler.run(make_event()) == (2, 200)
+    assert len(response_cache) == 0
+
+
+def test_record_tables(testdb):
+    other = create_table('b_table')
+    table = create_table(related_table=other)
+    query = Q(table).filter(col3__col1=1).select('id', col3=S('col2'))
+    with record_tables() as recorder:
+        query.to_sql()
+    assert recorder.tables == {'a_table', 'b_table'}
+    assert recorder.written_tables == set()
+    with record_tables() as recorder:
+        Q(other).insert(col1=1).to_sql()
+    assert recorder.written_tables == {'b_table'}